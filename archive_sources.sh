@@ -5,18 +5,15 @@
 # Ensure the script exits on errors
 set -euo pipefail
 
-# Check if the correct number of arguments is provided (2 or 3 with --batch)
-if [ "$#" -lt 2 ] || [ "$#" -gt 3 ]; then
-    echo "Usage: $0 <source_directory> <destination_directory> [--batch]"
+# Check if at least the source and destination are provided
+if [ "$#" -lt 2 ]; then
+    echo "Usage: $0 <source_directory> <destination_directory> [--batch] [--jobs N] [--link hard|reflink|copy]"
     exit 1
 fi
 
 SOURCE_DIR="$1"
 DESTINATION_DIR="$2"
+shift 2
 
-# Handle optional --batch argument
-if [ "$#" -eq 3 ] && [ "$3" == "--batch" ]; then
-    python3 "$(dirname "$0")/python/archive_sources.py" "$SOURCE_DIR" "$DESTINATION_DIR" --batch
-else
-    python3 "$(dirname "$0")/python/archive_sources.py" "$SOURCE_DIR" "$DESTINATION_DIR"
-fi
+# Pass optional arguments (--batch, --jobs, --link) through to the Python script
+python3 "$(dirname "$0")/python/archive_sources.py" "$SOURCE_DIR" "$DESTINATION_DIR" "$@"
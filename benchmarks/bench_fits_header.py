@@ -0,0 +1,96 @@
+"""
+Benchmark for fits_header.py startup and per-file cost.
+
+Generates small FITS files in a temporary directory and times, in fresh
+interpreters, reading one keyword with fits_header.py, the same lookup with
+astropy (if installed) for comparison, and a single fits_header.py -k run
+over many files.
+
+Usage: python benchmarks/bench_fits_header.py [--files N] [--repeat R]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+SCRIPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python")
+sys.path.append(SCRIPT_DIR)
+
+from header_io import BLOCK_SIZE, format_card  # noqa: E402
+
+FITS_HEADER = os.path.join(SCRIPT_DIR, "fits_header.py")
+
+ASTROPY_GETVAL = (
+    "import sys; from astropy.io import fits; "
+    "print(fits.getval(sys.argv[1], sys.argv[2]))"
+)
+
+
+def write_fits(path: str, index: int) -> None:
+    """Writes a FITS file with a camera-like header and a tiny image."""
+    cards = [
+        format_card("SIMPLE", True),
+        format_card("BITPIX", 16),
+        format_card("NAXIS", 2),
+        format_card("NAXIS1", 8),
+        format_card("NAXIS2", 8),
+        format_card("IMAGETYP", "Light Frame"),
+        format_card("EXPTIME", 300.0),
+        format_card("GAIN", 100),
+        format_card("CCD-TEMP", -10.0 + index % 5 / 10),
+        format_card("FILTER", "Ha"),
+    ]
+    cards += [format_card(f"KEY{i}", i, "padding") for i in range(40)]
+    header = "".join(cards) + "END".ljust(80)
+    header = header.ljust(-(-len(header) // BLOCK_SIZE) * BLOCK_SIZE)
+    with open(path, "wb") as f:
+        f.write(header.encode("ascii"))
+        f.write(b"\0" * BLOCK_SIZE)
+
+
+def time_command(command: List[str], repeat: int) -> float:
+    """Returns the median wall time of running command, in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        files = [os.path.join(tmp, f"frame_{i:05d}.fits") for i in range(args.files)]
+        for i, path in enumerate(files):
+            write_fits(path, i)
+
+        python = sys.executable
+        baseline = time_command([python, "-c", "pass"], args.repeat)
+        single = time_command([python, FITS_HEADER, files[0], "GAIN"], args.repeat)
+        batch = time_command([python, FITS_HEADER, "-k", "GAIN"] + files, args.repeat)
+
+        print(f"{'interpreter startup':<34}{baseline * 1000:10.1f} ms")
+        print(f"{'fits_header.py, one file':<34}{single * 1000:10.1f} ms")
+        try:
+            astropy = time_command(
+                [python, "-c", ASTROPY_GETVAL, files[0], "GAIN"], args.repeat
+            )
+            print(f"{'astropy fits.getval, one file':<34}{astropy * 1000:10.1f} ms")
+        except subprocess.CalledProcessError:
+            print(f"{'astropy fits.getval, one file':<34}{'n/a':>10}")
+        print(f"{f'fits_header.py -k, {args.files} files':<34}{batch * 1000:10.1f} ms")
+        per_file = (batch - single) / max(args.files - 1, 1)
+        print(f"{'per additional file':<34}{per_file * 1e6:10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark for frame file name parsing.
+
+Times the strptime-based parser archive_sources.py used before frame_names.py
+and the per-row target heuristic session_report.py used, against
+frame_names.parse_frame_name with a cold and a warm cache.
+
+Usage: python benchmarks/bench_frame_names.py [--names N] [--repeat R]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Tuple
+
+SCRIPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python")
+sys.path.append(SCRIPT_DIR)
+
+from frame_names import parse_frame_name  # noqa: E402
+
+TARGETS = ["Barnard 150", "M 31 Panel 1", "Pleiades", "NGC 7000", "IC 1805"]
+FILTERS = ["Ha", "OIII", "SII", "L", "UV-IR-cut"]
+
+
+def strptime_parse(file_name: str) -> Tuple[str, str, str, str]:
+    """The file name parser archive_sources.py used before frame_names.py."""
+    parts = file_name.split("_")
+    if len(parts) < 6:
+        raise ValueError(f"Invalid file name format: {file_name}")
+    observation = datetime.strptime(f"{parts[1]} {parts[2]}", "%Y-%m-%d %H-%M-%S")
+    if observation.hour < 12:
+        observation -= timedelta(days=1)
+    return (
+        parts[0].upper(),
+        observation.strftime("%Y-%m-%d"),
+        parts[3].replace("\\", " "),
+        parts[4],
+    )
+
+
+def heuristic_target(file_name: str, filter_name: str = "Ha") -> str:
+    """The target heuristic session_report.py used before frame_names.py."""
+    parts = file_name.replace(".xisf", "").split("_")
+    if len(parts) < 6:
+        return "Unknown Target"
+    filter_name_clean = filter_name.replace("/", "-").replace(" ", "-")
+    target_parts = []
+    for part in parts[3:]:
+        if (
+            part == filter_name_clean
+            or part in filter_name
+            or (part.startswith("-") and part[1:].replace(".", "").isdigit())
+            or part.endswith("s")
+            or part.isdigit()
+        ):
+            break
+        target_parts.append(part)
+    return " ".join(target_parts) if target_parts else "Unknown Target"
+
+
+def make_names(count: int) -> List[str]:
+    """Returns count distinct names spread over a year of nights."""
+    start = datetime(2025, 1, 1, 20)
+    names = []
+    for i in range(count):
+        taken = start + timedelta(days=i % 365, minutes=(i // 365) * 5 % 600)
+        names.append(
+            f"LIGHT_{taken:%Y-%m-%d_%H-%M-%S}_{TARGETS[i % len(TARGETS)]}_"
+            f"{FILTERS[i % len(FILTERS)]}_-10.00_300.00s_{i % 10000:04d}.xisf"
+        )
+    return names
+
+
+def best_time(
+    function: Callable[[str], object], names: List[str], repeat: int
+) -> float:
+    """Returns the best wall time of calling function on every name."""
+    best = float("inf")
+    for _ in range(repeat):
+        parse_frame_name.cache_clear()
+        start = time.perf_counter()
+        for name in names:
+            function(name)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--names", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    names = make_names(args.names)
+
+    def warm(name: str) -> object:
+        return parse_frame_name(name)
+
+    for name in names:
+        parse_frame_name(name)
+    warm_best = float("inf")
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        for name in names:
+            warm(name)
+        warm_best = min(warm_best, time.perf_counter() - start)
+
+    results = [
+        ("strptime parser", best_time(strptime_parse, names, args.repeat)),
+        ("session_report heuristic", best_time(heuristic_target, names, args.repeat)),
+        ("parse_frame_name, cold", best_time(parse_frame_name, names, args.repeat)),
+        ("parse_frame_name, cached", warm_best),
+    ]
+    for label, seconds in results:
+        print(f"{label:<28}{seconds / len(names) * 1e6:8.2f} us/name")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark of the archive and report pipeline on synthetic sessions.
+
+For each size, generates a single night folder and a tree of nightly session
+folders with generate_sessions.py in a temporary directory, then times
+archive_sources.sort_astrophotographs on the single folder,
+archive_sources.process_nightly_sessions on the tree, statistics.py header
+extraction over every frame and session_report.analyze_session_data (without
+its cache) on the single folder. Everything runs offline.
+
+Usage: python benchmarks/bench_pipeline.py [--sizes 1000,10000,100000]
+       [--repeat R] [--format xisf|fits] [--jobs N]
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+SCRIPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python")
+sys.path.append(SCRIPT_DIR)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from archive_sources import (  # noqa: E402
+    process_nightly_sessions,
+    sort_astrophotographs,
+)
+from copy_engine import CopyEngine  # noqa: E402
+from generate_sessions import FORMATS, generate_sessions  # noqa: E402
+from session_report import analyze_session_data  # noqa: E402
+
+STATISTICS = os.path.join(SCRIPT_DIR, "statistics.py")
+HEADERS = "IMAGETYP,FILTER,EXPTIME,CCD-TEMP,GAIN,DATE-OBS"
+
+
+def best_time(run: Callable[[], None], repeat: int, reset: Callable[[], None]) -> float:
+    """Returns the best wall time of run, calling reset before each run."""
+    best = float("inf")
+    for _ in range(repeat):
+        reset()
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_size(
+    tmp: str, frames: int, repeat: int, file_format: str, jobs: int
+) -> List[Tuple[str, float]]:
+    """Generates the sessions for one size and returns (case, seconds) pairs."""
+    night_root = os.path.join(tmp, "night")
+    tree_root = os.path.join(tmp, "tree")
+    destination = os.path.join(tmp, "archive")
+    (night,) = generate_sessions(night_root, frames, frames, file_format)
+    generate_sessions(tree_root, frames, 150, file_format)
+    files = sorted(glob.glob(os.path.join(night, f"LIGHT_*.{file_format}")))
+
+    def clean() -> None:
+        shutil.rmtree(destination, ignore_errors=True)
+
+    def no_reset() -> None:
+        pass
+
+    def sort() -> None:
+        with CopyEngine(jobs=jobs) as engine:
+            sort_astrophotographs(night, destination, engine)
+
+    def batch() -> None:
+        with CopyEngine(jobs=jobs) as engine:
+            process_nightly_sessions(tree_root, destination, engine)
+
+    list_path = os.path.join(tmp, "files.txt")
+    with open(list_path, "w") as f:
+        f.write("\n".join(files))
+
+    def extract() -> None:
+        subprocess.run(
+            [
+                sys.executable,
+                STATISTICS,
+                os.path.join(tmp, "headers.csv"),
+                HEADERS,
+                "--files-from",
+                list_path,
+                "--jobs",
+                str(jobs),
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+
+    def analyze() -> None:
+        analyze_session_data(Path(night), use_cache=False)
+
+    stdout = sys.stdout
+    results = []
+    try:
+        # The archive functions print a line per copied file
+        sys.stdout = open(os.devnull, "w")
+        results.append(("sort_astrophotographs", best_time(sort, repeat, clean)))
+        results.append(("process_nightly_sessions", best_time(batch, repeat, clean)))
+        results.append(("statistics.py headers", best_time(extract, repeat, no_reset)))
+        results.append(("analyze_session_data", best_time(analyze, repeat, no_reset)))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--format", choices=FORMATS, default="xisf")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--keep",
+        metavar="DIR",
+        help="generate into DIR and keep the sessions instead of a temporary "
+        "directory",
+    )
+    args = parser.parse_args()
+
+    print(f"{'case':<28}{'frames':>8}{'seconds':>10}{'frames/s':>12}")
+    for frames in (int(size) for size in args.sizes.split(",")):
+        if args.keep:
+            tmp = os.path.join(args.keep, str(frames))
+            results = bench_size(tmp, frames, args.repeat, args.format, args.jobs)
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                results = bench_size(tmp, frames, args.repeat, args.format, args.jobs)
+        for case, seconds in results:
+            print(f"{case:<28}{frames:>8}{seconds:>10.3f}{frames / seconds:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Generator for synthetic N.I.N.A. session trees.
+
+Writes YYYY-MM-DD session folders with LIGHT_ and FLAT_ frames named like
+N.I.N.A. names them, as small but valid XISF or FITS files with camera-like
+headers, together with ImageMetaData.csv, WeatherData.csv and
+AcquisitionDetails.csv rows modeled on the files in examples/. Output is
+deterministic for a given seed, so benchmark runs are comparable.
+
+Usage: python benchmarks/generate_sessions.py <directory> [--frames N]
+       [--frames-per-night N] [--format xisf|fits] [--seed S]
+"""
+
+import argparse
+import csv
+import math
+import os
+import random
+import struct
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+SCRIPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "python")
+sys.path.append(SCRIPT_DIR)
+
+from header_io import BLOCK_SIZE, format_card  # noqa: E402
+
+EXAMPLES_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "examples"
+)
+
+FORMATS = ("xisf", "fits")
+TARGETS = ["Barnard 150", "M 31 Panel 1", "NGC 7000", "IC 1805", "Sh2-129"]
+FILTERS = ["Ha", "OIII", "SII", "UV-IR-cut"]
+FLATS_PER_FILTER = 10
+EXPOSURE = 300.0
+# Frames start this often, so a night of 150 frames ends before dawn
+FRAME_INTERVAL = timedelta(minutes=2)
+
+# Tiny 8x8 16-bit image, enough for readers that look at the data
+_WIDTH = _HEIGHT = 8
+_IMAGE = bytes(_WIDTH * _HEIGHT * 2)
+
+
+def _template(file_name: str) -> Tuple[List[str], Dict[str, str]]:
+    """Returns the columns and first row of an example CSV file."""
+    with open(
+        os.path.join(EXAMPLES_DIR, file_name), newline="", encoding="utf-8-sig"
+    ) as f:
+        reader = csv.DictReader(f)
+        return list(reader.fieldnames or []), next(reader)
+
+
+def _headers(
+    frame_type: str, target: str, filter_name: str, taken: datetime, duration: float
+) -> List[Tuple[str, object]]:
+    return [
+        ("IMAGETYP", frame_type),
+        ("EXPOSURE", duration),
+        ("EXPTIME", duration),
+        ("DATE-OBS", taken.strftime("%Y-%m-%dT%H:%M:%S.000")),
+        ("XBINNING", 1),
+        ("YBINNING", 1),
+        ("GAIN", 100),
+        ("OFFSET", 50),
+        ("CCD-TEMP", -10.0),
+        ("SET-TEMP", -10.0),
+        ("INSTRUME", "ZWO ASI2600MM Pro"),
+        ("TELESCOP", "FLT-91"),
+        ("FOCALLEN", 432),
+        ("FILTER", filter_name),
+        ("OBJECT", target),
+    ]
+
+
+def write_fits(path: str, headers: List[Tuple[str, object]]) -> None:
+    """Writes a FITS file with the given headers and a tiny 16-bit image."""
+    cards = [
+        format_card("SIMPLE", True),
+        format_card("BITPIX", 16),
+        format_card("NAXIS", 2),
+        format_card("NAXIS1", _WIDTH),
+        format_card("NAXIS2", _HEIGHT),
+        format_card("BZERO", 32768),
+        format_card("BSCALE", 1),
+    ]
+    cards += [format_card(key, value) for key, value in headers]
+    header = "".join(cards) + "END".ljust(80)
+    header = header.ljust(-(-len(header) // BLOCK_SIZE) * BLOCK_SIZE)
+    with open(path, "wb") as f:
+        f.write(header.encode("ascii"))
+        f.write(_IMAGE.ljust(BLOCK_SIZE, b"\0"))
+
+
+def write_xisf(path: str, headers: List[Tuple[str, object]]) -> None:
+    """Writes a monolithic XISF file with FITS keywords and a tiny image."""
+    keywords = "".join(
+        f'<FITSKeyword name="{key}" value="{value!r}" comment=""/>'
+        if isinstance(value, str)
+        else f'<FITSKeyword name="{key}" value="{value}" comment=""/>'
+        for key, value in headers
+    )
+    # The attachment offset is written with a fixed width, so the header
+    # length does not depend on it
+    template = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<xisf version="1.0" xmlns="http://www.pixinsight.com/xisf">'
+        f'<Image geometry="{_WIDTH}:{_HEIGHT}:1" sampleFormat="UInt16" '
+        'colorSpace="Gray" location="attachment:{offset:010d}:'
+        f'{len(_IMAGE)}">{keywords}</Image></xisf>'
+    )
+    length = len(template.format(offset=0).encode("utf-8"))
+    offset = 16 + length
+    xml = template.format(offset=offset).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(b"XISF0100" + struct.pack("<II", length, 0) + xml + _IMAGE)
+
+
+def generate_sessions(
+    root: str,
+    frames: int,
+    frames_per_night: int = 150,
+    file_format: str = "xisf",
+    seed: int = 0,
+) -> List[str]:
+    """
+    Writes a tree of sessions with the given number of LIGHT frames in total,
+    plus FLATS_PER_FILTER flats per filter and night.
+
+    Args:
+        root (str): Directory to create the YYYY-MM-DD session folders in.
+        frames (int): Number of LIGHT frames.
+        frames_per_night (int): LIGHT frames per session folder.
+        file_format (str): "xisf" or "fits".
+        seed (int): Seed of the random metrics.
+
+    Returns:
+        list: The session folders, in date order.
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown format: {file_format}")
+    write = write_xisf if file_format == "xisf" else write_fits
+    rng = random.Random(seed)
+    meta_columns, meta_template = _template("ImageMetaData.csv")
+    weather_columns, weather_template = _template("WeatherData.csv")
+    acquisition_columns, acquisition_template = _template("AcquisitionDetails.csv")
+
+    nights = max(1, math.ceil(frames / frames_per_night))
+    start_date = datetime(2025, 1, 1, 21)
+    session_dirs = []
+    for night in range(nights):
+        count = min(frames_per_night, frames - night * frames_per_night)
+        evening = start_date + timedelta(days=night)
+        session_dir = os.path.join(root, f"{evening:%Y-%m-%d}")
+        os.makedirs(session_dir, exist_ok=True)
+        session_dirs.append(session_dir)
+        targets = [TARGETS[night % len(TARGETS)], TARGETS[(night + 1) % len(TARGETS)]]
+        used_filters = set()
+
+        with open(
+            os.path.join(session_dir, "ImageMetaData.csv"), "w", newline=""
+        ) as mfile, open(
+            os.path.join(session_dir, "WeatherData.csv"), "w", newline=""
+        ) as wfile:
+            metadata = csv.DictWriter(mfile, meta_columns)
+            weather = csv.DictWriter(wfile, weather_columns)
+            metadata.writeheader()
+            weather.writeheader()
+            humidity = rng.uniform(30, 60)
+            for i in range(count):
+                taken = evening + i * FRAME_INTERVAL
+                target = targets[i * len(targets) // max(count, 1)]
+                filter_name = FILTERS[(i // 10) % len(FILTERS)]
+                used_filters.add(filter_name)
+                name = (
+                    f"LIGHT_{taken:%Y-%m-%d_%H-%M-%S}_{target}_{filter_name}_"
+                    f"-10.00_{EXPOSURE:.2f}s_{i:04d}.{file_format}"
+                )
+                write(
+                    os.path.join(session_dir, name),
+                    _headers("LIGHT", target, filter_name, taken, EXPOSURE),
+                )
+
+                utc = (taken - timedelta(hours=2)).strftime(
+                    "%Y-%m-%dT%H:%M:%S.0000000Z"
+                )
+                humidity = min(99.0, max(10.0, humidity + rng.gauss(0.2, 1.0)))
+                hfr = rng.gauss(1.7, 0.15) + humidity / 200
+                meta = dict(meta_template)
+                meta.update(
+                    ExposureNumber=str(i),
+                    FilePath=f"C:/Users/astro/Documents/N.I.N.A/Images/"
+                    f"{evening:%Y-%m-%d}/{name}",
+                    FilterName=filter_name,
+                    ExposureStart=taken.strftime("%Y-%m-%d %H:%M"),
+                    Duration=f"{EXPOSURE:g}",
+                    HFR=f"{hfr:.4f}",
+                    DetectedStars=str(max(0, int(rng.gauss(2000, 250)))),
+                    GuidingRMSArcSec=f"{abs(rng.gauss(0.6, 0.1)):.3f}",
+                    ADUMedian=str(int(rng.gauss(1800, 60))),
+                    ExposureStartUTC=utc,
+                )
+                metadata.writerow(meta)
+                conditions = dict(weather_template)
+                conditions.update(
+                    ExposureNumber=str(i),
+                    ExposureStart=meta["ExposureStart"],
+                    Temperature=f"{rng.gauss(15, 1):.1f}",
+                    DewPoint=f"{rng.gauss(5, 1):.1f}",
+                    Humidity=f"{humidity:.0f}",
+                    CloudCover=str(rng.choice([0, 0, 0, 10, 50])),
+                    SkyQuality=f"{rng.gauss(20.5, 0.2):.2f}",
+                    ExposureStartUTC=utc,
+                )
+                weather.writerow(conditions)
+
+        # Flats the next morning, which still belong to this session
+        morning = evening + timedelta(hours=9)
+        for filter_name in sorted(used_filters):
+            for i in range(FLATS_PER_FILTER):
+                taken = morning + timedelta(seconds=i * 5)
+                name = (
+                    f"FLAT_{taken:%Y-%m-%d_%H-%M-%S}_FlatWizard_{filter_name}_"
+                    f"-10.00_1.00s_{i:04d}.{file_format}"
+                )
+                write(
+                    os.path.join(session_dir, name),
+                    _headers("FLAT", "FlatWizard", filter_name, taken, 1.0),
+                )
+
+        with open(
+            os.path.join(session_dir, "AcquisitionDetails.csv"), "w", newline=""
+        ) as afile:
+            acquisition = csv.DictWriter(afile, acquisition_columns)
+            acquisition.writeheader()
+            for target in targets:
+                row = dict(acquisition_template)
+                row["TargetName"] = target
+                acquisition.writerow(row)
+    return session_dirs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("directory")
+    parser.add_argument("--frames", type=int, default=1000)
+    parser.add_argument("--frames-per-night", type=int, default=150)
+    parser.add_argument("--format", choices=FORMATS, default="xisf")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    session_dirs = generate_sessions(
+        args.directory, args.frames, args.frames_per_night, args.format, args.seed
+    )
+    print(f"Wrote {args.frames} frames in {len(session_dirs)} sessions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+#!/usr/bin/env bash
+
+python3 "$(dirname "$0")/python/flat_store.py" "$@"
@@ -0,0 +1,108 @@
+"""
+Persistent manifest of archived files.
+
+The manifest is an append-only JSONL file in the destination directory with
+one line per archived file, keyed by source path, size and modification time.
+Loading it gives O(1) lookups, so re-running an archive over sessions that
+have not changed costs one stat per source file and no destination I/O, and
+an interrupted run resumes where it stopped.
+"""
+
+import json
+import os
+import threading
+from typing import IO, Dict, Optional, Tuple
+
+MANIFEST_FILE_NAME = ".archive_manifest.jsonl"
+
+
+class ArchiveManifest:
+    """
+    Append-only record of (source, destination) copies made into an archive.
+
+    Entries are written only after a copy has finished, so a crash leaves at
+    most a truncated last line, which is ignored on the next load.
+    """
+
+    def __init__(self, destination_dir: str) -> None:
+        self.destination_dir = destination_dir
+        self.path = os.path.join(destination_dir, MANIFEST_FILE_NAME)
+        self._entries: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self._pending: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self._file: Optional[IO[str]] = None
+        self._load()
+
+    def __enter__(self) -> "ArchiveManifest":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as mfile:
+            for line in mfile:
+                try:
+                    entry = json.loads(line)
+                    key = (entry["source"], entry["destination"])
+                    self._entries[key] = (entry["size"], entry["mtime_ns"])
+                except (ValueError, KeyError, TypeError):
+                    continue  # Truncated line from an interrupted run
+
+    def _key(self, source: str, destination: str) -> Tuple[str, str]:
+        return (
+            os.path.abspath(source),
+            os.path.relpath(destination, self.destination_dir),
+        )
+
+    def is_archived(self, source: str, destination: str) -> bool:
+        """
+        Returns True if source was already copied to destination and has not
+        changed since, judging by its size and modification time.
+        """
+        key = self._key(source, destination)
+        st = os.stat(source)
+        signature = (st.st_size, st.st_mtime_ns)
+        if self._entries.get(key) == signature:
+            return True
+        with self._lock:
+            self._pending[key] = signature
+        return False
+
+    def record(self, source: str, destination: str) -> None:
+        """Appends a finished copy of source to destination to the manifest."""
+        key = self._key(source, destination)
+        with self._lock:
+            signature = self._pending.pop(key, None)
+        if signature is None:
+            st = os.stat(source)
+            signature = (st.st_size, st.st_mtime_ns)
+        line = json.dumps(
+            {
+                "source": key[0],
+                "destination": key[1],
+                "size": signature[0],
+                "mtime_ns": signature[1],
+            }
+        )
+        with self._lock:
+            if self._file is None:
+                os.makedirs(self.destination_dir, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._entries[key] = signature
+
+    def close(self) -> None:
+        """Flushes the manifest to disk and closes it."""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
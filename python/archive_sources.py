@@ -1,149 +1,534 @@
+import argparse
 import os
-import shutil
-import sys
-from datetime import datetime, timedelta
-from typing import Dict, List, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date
+from functools import partial
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
+from archive_manifest import MANIFEST_FILE_NAME, ArchiveManifest
+from copy_engine import LINK_MODES, CopyEngine
+from flat_store import LINK_TYPES, STORE_DIR_NAME, FlatStore
+from frame_names import parse_frame_name
+from header_io import FRAME_EXTENSIONS
+from instrumentation import add_arguments, instrument, phase, progress
 
-def sort_astrophotographs(source_dir: str, destination_dir: str) -> None:
-    """
-    Sorts astrophotographs into folders with structure PREFIX/targetname/date/files
-    and includes flat calibration files, taking into account the filter used.
-    File names are used to extract metadata instead of FITS headers.
+# Special files to copy to each destination folder if present
+SPECIAL_FILES = ["WeatherData.csv", "ImageMetaData.csv", "AcquisitionDetails.csv"]
 
-    Args:
-        source_dir (str): Path to the directory containing raw astrophotographs.
-        destination_dir (str): Path to the directory where sorted files will be stored.
+
+@dataclass
+class CopyPlan:
+    """
+    In-memory plan of an archive run: the unique folders to create and the
+    (source, destination) pairs of every file to copy into them.
     """
-    if not os.path.exists(destination_dir):
-        os.makedirs(destination_dir)
 
-    # Dictionary to store flat files by date and filter
-    flats_by_date_and_filter: Dict[str, Dict[str, List[str]]] = {}
-    # Set to track (session_date, filter_name, target_name) combinations for
-    # LIGHT frames
-    used_combinations: Set[Tuple[str, str, str]] = set()
+    directories: Set[str] = field(default_factory=set)
+    lights: List[Tuple[str, str]] = field(default_factory=list)
+    flats: List[Tuple[str, str]] = field(default_factory=list)
+    special_files: List[Tuple[str, str]] = field(default_factory=list)
 
-    # List of special files to copy to each destination folder if present
-    special_files = ["WeatherData.csv", "ImageMetaData.csv", "AcquisitionDetails.csv"]
 
-    # Helper function to parse file names
-    def parse_file_name(file_name: str) -> Tuple[str, str, str, str]:
-        parts = file_name.split("_")
-        if len(parts) < 6:
-            raise ValueError(f"Invalid file name format: {file_name}")
+@dataclass
+class SessionIndex:
+    """Frames found in one source directory, parsed from their file names."""
 
-        frame_type = parts[0].upper()  # LIGHT or FLAT
-        date_str = parts[1]  # Observation date in YYYY-MM-DD format
-        time_str = parts[2]  # Observation time in HH-MM-SS format
-        target_name = parts[3].replace("\\", " ")  # Target name
-        filter_name = parts[4]  # Filter name
+    source_dir: str
+    # (source_file, session_date, target_name, filter_name) of every LIGHT frame
+    lights: List[Tuple[str, str, str, str]] = field(default_factory=list)
+    # Flat files by session date and filter
+    flats: Dict[str, Dict[str, List[str]]] = field(default_factory=dict)
+    special_files: List[str] = field(default_factory=list)
 
-        # Combine date and time to determine observation datetime
-        observation_datetime = datetime.strptime(
-            f"{date_str} {time_str}", "%Y-%m-%d %H-%M-%S"
-        )
 
-        # Adjust date to the session start date (evening to following noon)
-        if observation_datetime.hour < 12:
-            observation_datetime -= timedelta(days=1)
+def index_session(source_dir: str) -> SessionIndex:
+    """
+    Lists a source directory once and parses every frame file name once.
 
-        session_date = observation_datetime.strftime("%Y-%m-%d")
+    Args:
+        source_dir (str): Path to the directory containing raw astrophotographs.
 
-        return frame_type, session_date, target_name, filter_name
+    Returns:
+        SessionIndex: The LIGHT frames, FLAT frames and special files found.
+    """
+    index = SessionIndex(source_dir)
+
+    file_names = os.listdir(source_dir)
+    index.special_files = [f for f in SPECIAL_FILES if f in file_names]
 
-    # First pass: Process all files to collect flat frames and move light frames
-    for file_name in os.listdir(source_dir):
-        if not file_name.lower().endswith((".fits", ".fit", ".xisf")):
+    for file_name in file_names:
+        if not file_name.lower().endswith(FRAME_EXTENSIONS):
             continue  # Skip non-FITS files
 
         source_file = os.path.join(source_dir, file_name)
 
         try:
             # Parse metadata from the file name
-            frame_type, session_date, target_name, filter_name = parse_file_name(
-                file_name
+            frame = parse_frame_name(file_name)
+        except ValueError as e:
+            print(f"Error processing file {file_name}: {e}")
+            continue
+
+        if frame.frame_type == "FLAT":
+            # Store flat files by date and filter
+            index.flats.setdefault(frame.session_date, {}).setdefault(
+                frame.filter_name, []
+            ).append(source_file)
+        elif frame.frame_type == "LIGHT":
+            index.lights.append(
+                (source_file, frame.session_date, frame.target, frame.filter_name)
             )
+        else:
+            print(f"Skipping unsupported frame type: {file_name}")
+
+    return index
+
+
+def match_flats(
+    flats_by_date_and_filter: Dict[str, Dict[str, List[str]]],
+    session_date: str,
+    filter_name: str,
+    flat_tolerance: int = 0,
+) -> List[str]:
+    """
+    Returns the flats taken in the given session with the given filter. If
+    there are none, falls back to the flats of the nearest session with the
+    same filter that is at most flat_tolerance days away.
+    """
+    flat_files = flats_by_date_and_filter.get(session_date, {}).get(filter_name)
+    if flat_files or flat_tolerance <= 0:
+        return flat_files or []
 
-            is_flat = frame_type == "FLAT"
-            is_light = frame_type == "LIGHT"
+    light_day = date.fromisoformat(session_date)
+    candidates = []
+    for flat_date, flats_by_filter in flats_by_date_and_filter.items():
+        if filter_name not in flats_by_filter:
+            continue
+        distance = abs((date.fromisoformat(flat_date) - light_day).days)
+        if distance <= flat_tolerance:
+            candidates.append((distance, flat_date))
+    if not candidates:
+        return []
+    _, nearest_date = min(candidates)
+    return flats_by_date_and_filter[nearest_date][filter_name]
 
-            if is_flat:
-                # Store flat files by date and filter
+
+def build_plan(
+    indexes: List[SessionIndex], destination_dir: str, flat_tolerance: int = 0
+) -> CopyPlan:
+    """
+    Builds one copy plan from any number of indexed source directories. Flats
+    are matched against a global index by session date and filter, so lights
+    pick up flats exported into a different source directory.
+
+    Args:
+        indexes (list): Indexed source directories.
+        destination_dir (str): Path to the directory where sorted files will be stored.
+        flat_tolerance (int): Maximum number of days to look around the session
+            date for flats with the same filter when the session has none.
+
+    Returns:
+        CopyPlan: Folders to create and files to copy.
+    """
+    plan = CopyPlan()
+
+    # Global dictionary of flat files by date and filter
+    flats_by_date_and_filter: Dict[str, Dict[str, List[str]]] = {}
+    for index in indexes:
+        for session_date, flats_by_filter in index.flats.items():
+            for filter_name, flat_files in flats_by_filter.items():
                 flats_by_date_and_filter.setdefault(session_date, {}).setdefault(
                     filter_name, []
-                ).append(source_file)
-                continue
+                ).extend(flat_files)
 
-            if not is_light:
-                print(f"Skipping unsupported frame type: {file_name}")
-                continue
+    # Set to track (session_date, filter_name, target_name) combinations for
+    # LIGHT frames
+    used_combinations: Set[Tuple[str, str, str]] = set()
 
-            # Track used (session_date, filter_name, target_name) for LIGHT frames
+    # First pass: Plan light frame copies
+    for index in indexes:
+        for source_file, session_date, target_name, filter_name in index.lights:
             used_combinations.add((session_date, filter_name, target_name))
 
-            # Create target-specific folder structure
-            # PREFIX/targetname/SESSION_date/files
+            # Target-specific folder structure PREFIX/targetname/SESSION_date/files
             target_folder = os.path.join(
                 destination_dir, target_name, f"SESSION_{session_date}"
             )
-            if not os.path.exists(target_folder):
-                os.makedirs(target_folder)
-
-            # Copy the light frame to the target folder
-            destination_file = os.path.join(target_folder, file_name)
-            shutil.copy(source_file, destination_file)
+            if target_folder not in plan.directories:
+                plan.directories.add(target_folder)
+                # Special files are copied once per folder
+                for special_file in index.special_files:
+                    plan.special_files.append(
+                        (
+                            os.path.join(index.source_dir, special_file),
+                            os.path.join(target_folder, special_file),
+                        )
+                    )
 
-            # Copy special files if they exist and haven't been copied yet
-            for special_file in special_files:
-                special_source = os.path.join(source_dir, special_file)
-                special_dest = os.path.join(target_folder, special_file)
-                if os.path.exists(special_source) and not os.path.exists(special_dest):
-                    shutil.copy(special_source, special_dest)
-                    print(f"Copied {special_file} to {target_folder}")
-
-            print(f"Copied {file_name} to {target_folder}")
-
-        except Exception as e:
-            print(f"Error processing file {file_name}: {e}")
+            plan.lights.append(
+                (
+                    source_file,
+                    os.path.join(target_folder, os.path.basename(source_file)),
+                )
+            )
 
-    # Second pass: Copy only matching flat frames to their respective target folders
-    for session_date, filter_name, target_name in used_combinations:
+    # Second pass: Plan only matching flat frames for their target folders
+    for session_date, filter_name, target_name in sorted(used_combinations):
         target_folder = os.path.join(
             destination_dir, target_name, f"SESSION_{session_date}"
         )
-        if os.path.exists(target_folder):
-            flat_files = flats_by_date_and_filter.get(session_date, {}).get(
-                filter_name, []
+        flat_files = match_flats(
+            flats_by_date_and_filter, session_date, filter_name, flat_tolerance
+        )
+        for flat_file in flat_files:
+            plan.flats.append(
+                (flat_file, os.path.join(target_folder, os.path.basename(flat_file)))
             )
-            for flat_file in flat_files:
-                flat_file_name = os.path.basename(flat_file)
-                flat_destination_file = os.path.join(target_folder, flat_file_name)
-                if not os.path.exists(flat_destination_file):  # Avoid duplicate copies
-                    shutil.copy(flat_file, flat_destination_file)
-                    print(f"Copied flat {flat_file_name} to {target_folder}")
 
-def process_nightly_sessions(parent_dir, destination_dir):
+    return plan
+
+
+def plan_astrophotographs(
+    source_dir: str, destination_dir: str, flat_tolerance: int = 0
+) -> CopyPlan:
+    """
+    Builds the copy plan for one source directory without touching the
+    destination. The source directory is listed once and every file name is
+    parsed once.
+
+    Args:
+        source_dir (str): Path to the directory containing raw astrophotographs.
+        destination_dir (str): Path to the directory where sorted files will be stored.
+        flat_tolerance (int): Maximum number of days to look around the session
+            date for flats with the same filter when the session has none.
+
+    Returns:
+        CopyPlan: Folders to create and files to copy.
+    """
+    with phase("index"):
+        index = index_session(source_dir)
+    with phase("plan"):
+        return build_plan([index], destination_dir, flat_tolerance)
+
+
+def print_plan(plan: CopyPlan) -> None:
+    """Prints a copy plan grouped by destination folder."""
+    print(
+        f"Plan: {len(plan.directories)} folders, {len(plan.lights)} lights, "
+        f"{len(plan.flats)} flats, {len(plan.special_files)} special files"
+    )
+    by_folder: Dict[str, List[str]] = {folder: [] for folder in plan.directories}
+    for kind, copies in (
+        ("light", plan.lights),
+        ("flat", plan.flats),
+        ("file", plan.special_files),
+    ):
+        for source_file, destination_file in copies:
+            by_folder[os.path.dirname(destination_file)].append(
+                f"  {kind}: {source_file}"
+            )
+    for folder in sorted(by_folder):
+        print(folder)
+        for line in by_folder[folder]:
+            print(line)
+
+
+def filter_archived(plan: CopyPlan, manifest: ArchiveManifest) -> CopyPlan:
+    """
+    Returns a copy of plan without the files the manifest records as already
+    archived and unchanged. Folders that have nothing left to copy are dropped,
+    so an unchanged session costs no destination I/O at all.
+    """
+    remaining = CopyPlan()
+    for copies, remaining_copies in (
+        (plan.lights, remaining.lights),
+        (plan.flats, remaining.flats),
+        (plan.special_files, remaining.special_files),
+    ):
+        for source_file, destination_file in copies:
+            if not manifest.is_archived(source_file, destination_file):
+                remaining_copies.append((source_file, destination_file))
+                remaining.directories.add(os.path.dirname(destination_file))
+
+    skipped = sum(len(c) for c in (plan.lights, plan.flats, plan.special_files)) - sum(
+        len(c) for c in (remaining.lights, remaining.flats, remaining.special_files)
+    )
+    if skipped:
+        print(f"Skipping {skipped} files already in the archive manifest")
+    return remaining
+
+
+def execute_plan(
+    plan: CopyPlan,
+    engine: CopyEngine,
+    manifest: Optional[ArchiveManifest] = None,
+    flat_store: Optional[FlatStore] = None,
+) -> None:
+    """
+    Creates every planned folder once and queues the planned copies on the
+    engine. Existing folders are listed once, so only flats and special files
+    already in place are stat'ed, and they are not copied again when their
+    size matches the source.
+    Finished copies are recorded in the manifest if one is given. With a flat
+    store, flats are stored once by content and linked into target folders.
+    """
+    existing: Set[str] = set()
+    for folder in sorted(plan.directories):
+        if os.path.isdir(folder):
+            existing.update(os.path.join(folder, name) for name in os.listdir(folder))
+        else:
+            os.makedirs(folder)
+
+    def submit(
+        source_file: str,
+        destination_file: str,
+        message: str,
+        copier: Optional[Callable[[str, str], bool]] = None,
+    ) -> None:
+        on_success: Optional[Callable[[], None]] = None
+        if manifest is not None:
+            on_success = partial(manifest.record, source_file, destination_file)
+        engine.submit(source_file, destination_file, message, on_success, copier)
+
+    submitted: Set[str] = set()
+
+    def in_place(source_file: str, destination_file: str) -> bool:
+        """
+        Returns True if destination_file needs no copy: it is already being
+        copied in this run, or a complete copy exists from a run that
+        predates the manifest. A size mismatch means an interrupted or
+        damaged copy, which is copied again.
+        """
+        if destination_file in submitted:
+            return True
+        submitted.add(destination_file)
+        if destination_file not in existing:
+            return False
+        try:
+            complete = os.path.getsize(destination_file) == os.path.getsize(source_file)
+        except OSError:
+            return False
+        if complete and manifest is not None:
+            manifest.record(source_file, destination_file)
+        return complete
+
+    for source_file, destination_file in plan.special_files:
+        if in_place(source_file, destination_file):
+            continue
+        submit(
+            source_file,
+            destination_file,
+            f"Copied {os.path.basename(destination_file)} to "
+            f"{os.path.dirname(destination_file)}",
+        )
+
+    for source_file, destination_file in plan.lights:
+        submit(
+            source_file,
+            destination_file,
+            f"Copied {os.path.basename(destination_file)} to "
+            f"{os.path.dirname(destination_file)}",
+        )
+
+    for source_file, destination_file in plan.flats:
+        if in_place(source_file, destination_file):  # Avoid duplicate copies
+            continue
+        submit(
+            source_file,
+            destination_file,
+            f"Copied flat {os.path.basename(destination_file)} to "
+            f"{os.path.dirname(destination_file)}",
+            flat_store.place if flat_store is not None else None,
+        )
+
+
+def sort_astrophotographs(
+    source_dir: str,
+    destination_dir: str,
+    engine: Optional[CopyEngine] = None,
+    dry_run: bool = False,
+    manifest: Optional[ArchiveManifest] = None,
+    flat_tolerance: int = 0,
+    flat_store: Optional[FlatStore] = None,
+) -> None:
+    """
+    Sorts astrophotographs into folders with structure PREFIX/targetname/date/files
+    and includes flat calibration files, taking into account the filter used.
+    File names are used to extract metadata instead of FITS headers.
+
+    Args:
+        source_dir (str): Path to the directory containing raw astrophotographs.
+        destination_dir (str): Path to the directory where sorted files will be stored.
+        engine (CopyEngine): Copy engine to queue LIGHT and FLAT copies on. If
+            omitted, a default engine is created and drained before returning.
+        dry_run (bool): Print the copy plan instead of executing it.
+        manifest (ArchiveManifest): Manifest used to skip files that were already
+            archived and to record new copies.
+        flat_tolerance (int): Maximum number of days to look around the session
+            date for flats with the same filter when the session has none.
+        flat_store (FlatStore): Store flats once by content and link them into
+            target folders instead of copying them into each one.
+    """
+    plan = plan_astrophotographs(source_dir, destination_dir, flat_tolerance)
+    run_plan(plan, engine, dry_run, manifest, flat_store)
+
+
+def run_plan(
+    plan: CopyPlan,
+    engine: Optional[CopyEngine] = None,
+    dry_run: bool = False,
+    manifest: Optional[ArchiveManifest] = None,
+    flat_store: Optional[FlatStore] = None,
+) -> None:
+    """Prints or executes a copy plan, skipping files already archived."""
+    if manifest is not None:
+        with phase("check manifest"):
+            plan = filter_archived(plan, manifest)
+    if dry_run:
+        print_plan(plan)
+        return
+
+    files = len(plan.lights) + len(plan.flats) + len(plan.special_files)
+    if engine is None:
+        with phase("copy", files), CopyEngine() as own_engine:
+            execute_plan(plan, own_engine, manifest, flat_store)
+        print(own_engine.summary())
+        return
+
+    with phase("copy", files):
+        execute_plan(plan, engine, manifest, flat_store)
+        engine.wait()
+
+
+def process_nightly_sessions(
+    parent_dir: str,
+    destination_dir: str,
+    engine: Optional[CopyEngine] = None,
+    dry_run: bool = False,
+    manifest: Optional[ArchiveManifest] = None,
+    flat_tolerance: int = 0,
+    flat_store: Optional[FlatStore] = None,
+) -> None:
     """
     Processes all subdirectories in parent_dir as nightly sessions.
-    Each subdirectory is treated as a source_dir for sort_astrophotographs.
+
+    All sessions are indexed concurrently first and merged into one copy plan
+    with a global flat index, so flats exported into another session folder
+    (e.g. the morning after) still match their lights. The plan is then copied
+    on one engine, so copies run concurrently across sessions. A shared
+    manifest skips unchanged sessions and resumes interrupted batches.
     """
-    for entry in os.listdir(parent_dir):
-        session_path = os.path.join(parent_dir, entry)
-        if os.path.isdir(session_path):
-            print(f"Processing nightly session: {session_path}")
-            sort_astrophotographs(session_path, destination_dir)
+    session_paths = [
+        entry.path
+        for entry in sorted(os.scandir(parent_dir), key=lambda e: e.name)
+        if entry.is_dir()
+    ]
+    jobs = engine.jobs if engine is not None else 4
+    with phase("index"), ThreadPoolExecutor(max_workers=jobs) as executor:
+        indexes = list(executor.map(index_session, session_paths))
+    for index in indexes:
+        print(
+            f"Indexed nightly session: {index.source_dir} "
+            f"({len(index.lights)} lights, "
+            f"{sum(len(f) for d in index.flats.values() for f in d.values())} flats)"
+        )
+
+    with phase("plan"):
+        plan = build_plan(indexes, destination_dir, flat_tolerance)
+    run_plan(plan, engine, dry_run, manifest, flat_store)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Sort astrophotographs into PREFIX/targetname/SESSION_date "
+        "folders together with their matching flats."
+    )
+    parser.add_argument("source_directory")
+    parser.add_argument("destination_directory")
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="treat every subdirectory of source_directory as a nightly session",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=4,
+        help="number of files to copy concurrently (default: 4)",
+    )
+    parser.add_argument(
+        "--link",
+        choices=LINK_MODES,
+        default="copy",
+        help="hardlink or reflink files instead of copying them when source and "
+        "destination share a filesystem (default: copy)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="print the copy plan without creating folders or copying files",
+    )
+    parser.add_argument(
+        "--flat-tolerance",
+        type=int,
+        default=0,
+        metavar="DAYS",
+        help="use flats with the same filter from the nearest session at most "
+        "DAYS away when a session has none of its own (default: 0)",
+    )
+    parser.add_argument(
+        "--dedup-flats",
+        choices=LINK_TYPES,
+        help=f"store each flat once under {STORE_DIR_NAME}/ in the destination and "
+        "hardlink or symlink it into the target folders",
+    )
+    parser.add_argument(
+        "--no-manifest",
+        action="store_true",
+        help=f"do not read or update the {MANIFEST_FILE_NAME} manifest in the "
+        "destination, i.e. consider every source file",
+    )
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    run = process_nightly_sessions if args.batch else sort_astrophotographs
+    manifest = None
+    if not args.no_manifest:
+        manifest = ArchiveManifest(args.destination_directory)
+    flat_store = None
+    if args.dedup_flats:
+        flat_store = FlatStore(args.destination_directory, args.dedup_flats)
+
+    with instrument(args):
+        if args.dry_run:
+            run(
+                args.source_directory,
+                args.destination_directory,
+                dry_run=True,
+                manifest=manifest,
+                flat_tolerance=args.flat_tolerance,
+            )
+            return
+
+        bar = progress(args, "Copied")
+        try:
+            with CopyEngine(
+                jobs=args.jobs, link_mode=args.link, progress=bar
+            ) as engine:
+                run(
+                    args.source_directory,
+                    args.destination_directory,
+                    engine,
+                    manifest=manifest,
+                    flat_tolerance=args.flat_tolerance,
+                    flat_store=flat_store,
+                )
+        finally:
+            if manifest is not None:
+                manifest.close()
+        print(engine.summary())
+
 
 if __name__ == "__main__":
-    # Replace these paths with your actual source and destination directories
-    if len(sys.argv) < 3:
-        print("Usage: python archive_sources.py <source_directory> <destination_directory> [--batch]")
-        sys.exit(1)
-    source_directory = sys.argv[1]
-    destination_directory = sys.argv[2]
-    batch_mode = len(sys.argv) > 3 and sys.argv[3] == "--batch"
-
-    if batch_mode:
-        process_nightly_sessions(source_directory, destination_directory)
-    else:
-        sort_astrophotographs(source_directory, destination_directory)
+    main()
@@ -0,0 +1,406 @@
+"""
+Builds master calibration frames out of core.
+
+Flats are grouped by session date and filter, as archive_sources.py groups
+them; darks by exposure and set temperature; biases by set temperature, which
+is the sensor temperature in the file name rounded to a tolerance. Each group
+is stacked with a median or a sigma-clipped mean over bands of rows: every
+band is read from the memory-mapped frames, combined in a worker process and
+streamed into the master, so memory stays bounded however many frames a
+group has and all cores are used.
+
+Usage: python build_masters.py <source_directory> <output_directory>
+       [--method median|sigma-clip] [--temp-tolerance C] [--jobs N] [--dry-run]
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from frame_names import parse_frame_name
+from header_io import (
+    BLOCK_SIZE,
+    CARD_SIZE,
+    FRAME_EXTENSIONS,
+    format_card,
+    read_primary_header,
+)
+from pixel_stats import Image, map_image, pixel_stats
+
+METHODS = ("median", "sigma-clip")
+
+# Headers copied from the first frame of a group into the master
+COPIED_HEADERS = [
+    "INSTRUME",
+    "TELESCOP",
+    "GAIN",
+    "OFFSET",
+    "XBINNING",
+    "YBINNING",
+    "SET-TEMP",
+]
+
+_SIGMA_CLIP_ITERATIONS = 5
+
+# Sensor temperatures within this many degrees of a set point are grouped
+DEFAULT_TEMP_TOLERANCE = 1.0
+
+
+class MasterGroup(NamedTuple):
+    """Calibration frames that are stacked into one master."""
+
+    frame_type: str  # FLAT, DARK, DARKFLAT or BIAS
+    name: str  # File name of the master, without extension
+    filter_name: Optional[str]
+    duration: Optional[float]
+    temperature: Optional[float]  # Mean sensor temperature of the frames
+    paths: List[str]
+
+
+def _set_point(temperature: float, tolerance: float) -> float:
+    """Rounds a sensor temperature to the nearest multiple of tolerance."""
+    if tolerance <= 0:
+        return temperature
+    return round(temperature / tolerance) * tolerance + 0.0  # No -0.00C
+
+
+def group_calibration_frames(
+    source_dir: str, temp_tolerance: float = DEFAULT_TEMP_TOLERANCE
+) -> List[MasterGroup]:
+    """
+    Finds the calibration frames below a directory and groups them by their
+    file names.
+
+    Args:
+        source_dir (str): Directory to search recursively.
+        temp_tolerance (float): Darks and biases are grouped by their sensor
+            temperature rounded to a multiple of this, so the readings around
+            one set point (e.g. -9.90 and -10.10) form one group. 0 groups
+            by the exact temperature.
+
+    Returns:
+        list: Groups sorted by master name.
+    """
+    groups: Dict[Tuple[Any, ...], List[str]] = {}
+    temperatures: Dict[Tuple[Any, ...], List[float]] = {}
+    for dirpath, dirnames, file_names in os.walk(source_dir):
+        dirnames.sort()
+        for file_name in sorted(file_names):
+            if not file_name.lower().endswith(FRAME_EXTENSIONS):
+                continue
+            try:
+                frame = parse_frame_name(file_name)
+            except ValueError as e:
+                print(f"Error processing file {file_name}: {e}")
+                continue
+            path = os.path.join(dirpath, file_name)
+            if frame.frame_type == "FLAT":
+                key: Tuple[Any, ...] = (
+                    frame.frame_type,
+                    frame.session_date,
+                    frame.filter_name,
+                )
+            elif frame.frame_type in ("DARK", "DARKFLAT", "BIAS"):
+                if frame.temperature is None or frame.duration is None:
+                    print(f"Skipping {file_name}: no exposure or temperature in name")
+                    continue
+                duration = None if frame.frame_type == "BIAS" else frame.duration
+                set_point = _set_point(frame.temperature, temp_tolerance)
+                key = (frame.frame_type, duration, set_point)
+                temperatures.setdefault(key, []).append(frame.temperature)
+            else:
+                continue
+            groups.setdefault(key, []).append(path)
+
+    result = []
+    for key, paths in groups.items():
+        if key[0] == "FLAT":
+            frame_type, session_date, filter_name = key
+            name = f"MasterFlat_{session_date}_{filter_name}"
+            result.append(MasterGroup(frame_type, name, filter_name, None, None, paths))
+            continue
+        frame_type, duration, set_point = key
+        name = f"Master{frame_type.capitalize()}"
+        if duration is not None:
+            name += f"_{duration:.2f}s"
+        name += f"_{set_point:.2f}C"
+        temperature = round(float(np.mean(temperatures[key])), 2)
+        result.append(MasterGroup(frame_type, name, None, duration, temperature, paths))
+    return sorted(result, key=lambda g: g.name)
+
+
+@lru_cache(maxsize=1)
+def _mapped(paths: Tuple[str, ...]) -> List[Image]:
+    """
+    Keeps the frames of a group mapped while a worker stacks its bands. Only
+    the latest group is kept, so the maps and their file descriptors are
+    released when a worker moves on to the next group.
+    """
+    return [map_image(path) for path in paths]
+
+
+def sigma_clipped_mean(stack: np.ndarray, sigma: float) -> np.ndarray:
+    """
+    Averages a stack of frames along the first axis, iteratively rejecting
+    pixels more than sigma standard deviations from the median.
+    """
+    for _ in range(_SIGMA_CLIP_ITERATIONS):
+        center = np.nanmedian(stack, axis=0)
+        spread = np.nanstd(stack, axis=0)
+        clipped = np.abs(stack - center) > sigma * spread
+        if not clipped.any():
+            break
+        stack[clipped] = np.nan
+    mean: np.ndarray = np.nanmean(stack, axis=0)
+    return mean
+
+
+def stack_band(task: Tuple[List[str], List[float], int, int, str, float]) -> np.ndarray:
+    """
+    Combines rows [start, stop) of every frame of a group, each multiplied
+    by its scale factor.
+    """
+    paths, scales, start, stop, method, sigma = task
+    stack = None
+    for i, (image, scale) in enumerate(zip(_mapped(tuple(paths)), scales)):
+        data, bscale, bzero, _ = image
+        band = np.asarray(data[start:stop], np.float32)
+        if stack is None:
+            stack = np.empty((len(paths),) + band.shape, np.float32)
+        if bscale != 1.0:
+            band *= bscale
+        if bzero:
+            band += bzero
+        stack[i] = band * scale
+    assert stack is not None
+    if method == "median":
+        median: np.ndarray = np.median(stack, axis=0)
+        return median
+    return sigma_clipped_mean(stack, sigma)
+
+
+def _frame_shape(path: str) -> Tuple[int, int]:
+    data = map_image(path)[0]
+    shape = data.shape
+    del data
+    return shape[0], shape[1]
+
+
+def _history_cards(text: str) -> List[str]:
+    """Splits text over as many HISTORY cards as needed."""
+    width = CARD_SIZE - 8
+    return [
+        f"{'HISTORY':<8}{text[i : i + width]:<{width}}"
+        for i in range(0, len(text), width)
+    ]
+
+
+def master_header(
+    group: MasterGroup, shape: Tuple[int, int], method: str, sigma: float
+) -> List[str]:
+    """Returns the header cards of a master, with its provenance."""
+    height, width = shape
+    cards = [
+        format_card("SIMPLE", True, "conforms to FITS standard"),
+        format_card("BITPIX", -32, "array data type"),
+        format_card("NAXIS", 2, "number of array dimensions"),
+        format_card("NAXIS1", width),
+        format_card("NAXIS2", height),
+        format_card("IMAGETYP", f"Master {group.frame_type.capitalize()}"),
+    ]
+    first = read_primary_header(group.paths[0], COPIED_HEADERS)
+    for key in COPIED_HEADERS:
+        if key in first:
+            cards.append(format_card(key, first[key]))
+    if group.filter_name is not None:
+        cards.append(format_card("FILTER", group.filter_name, "filter"))
+    if group.duration is not None:
+        cards.append(format_card("EXPTIME", group.duration, "[s] exposure time"))
+    if group.temperature is not None:
+        cards.append(format_card("CCD-TEMP", group.temperature, "[C] mean sensor temp"))
+    cards.append(format_card("NCOMBINE", len(group.paths), "number of frames"))
+    cards.append(format_card("COMBMETH", method, "combination method"))
+    if method == "sigma-clip":
+        cards.append(format_card("CLIPSIG", sigma, "sigma clipping threshold"))
+    if group.frame_type == "FLAT":
+        cards.append(format_card("NORMALIZ", "median", "frames scaled to same median"))
+    cards.append(
+        format_card(
+            "DATE",
+            datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S"),
+            "UTC date the master was built",
+        )
+    )
+    for path in group.paths:
+        cards.extend(_history_cards(f"Input: {os.path.basename(path)}"))
+    cards.append(f"{'END':<{CARD_SIZE}}")
+    return cards
+
+
+def build_master(
+    group: MasterGroup,
+    output_path: str,
+    executor: Optional[ProcessPoolExecutor],
+    method: str = "median",
+    sigma: float = 3.0,
+    memory: int = 256,
+) -> None:
+    """
+    Stacks a group of frames into a 32-bit float master FITS file. Flats are
+    scaled to the mean of their medians before they are combined.
+
+    Args:
+        group (MasterGroup): Frames to stack.
+        output_path (str): Path of the master to write.
+        executor (ProcessPoolExecutor): Pool to stack bands on, or None to
+            stack them in this process.
+        method (str): "median" or "sigma-clip".
+        sigma (float): Rejection threshold for sigma clipping.
+        memory (int): Approximate memory per worker for one band, in MB.
+
+    Raises:
+        ValueError: If the frames do not all have the same size.
+    """
+    shape = _frame_shape(group.paths[0])
+    for path in group.paths[1:]:
+        if _frame_shape(path) != shape:
+            raise ValueError(f"{path} is not {shape[1]}x{shape[0]} like the others")
+
+    scales = [1.0] * len(group.paths)
+    if group.frame_type == "FLAT":
+        medians = [pixel_stats(path, 8)["PixelMedian"] for path in group.paths]
+        if not all(medians):
+            raise ValueError("A flat has a median of zero")
+        scales = [float(np.mean(medians)) / m for m in medians]
+
+    band_rows = max(1, (memory << 20) // (len(group.paths) * shape[1] * 4 * 2))
+    tasks = [
+        (group.paths, scales, start, min(start + band_rows, shape[0]), method, sigma)
+        for start in range(0, shape[0], band_rows)
+    ]
+    bands = executor.map(stack_band, tasks) if executor else map(stack_band, tasks)
+
+    tmp_path = output_path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as out:
+            header = "".join(master_header(group, shape, method, sigma)).encode("ascii")
+            out.write(header.ljust(-(-len(header) // BLOCK_SIZE) * BLOCK_SIZE, b" "))
+            written = 0
+            for band in bands:
+                data = band.astype(">f4").tobytes()
+                out.write(data)
+                written += len(data)
+            out.write(b"\0" * (-written % BLOCK_SIZE))
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    finally:
+        _mapped.cache_clear()  # Stacked in this process without an executor
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Build master flats, darks and biases from the calibration "
+        "frames below a directory."
+    )
+    parser.add_argument("source_directory")
+    parser.add_argument("output_directory")
+    parser.add_argument(
+        "--method",
+        choices=METHODS,
+        default="median",
+        help="how frames are combined (default: median)",
+    )
+    parser.add_argument(
+        "--sigma",
+        type=float,
+        default=3.0,
+        help="with --method sigma-clip, reject pixels more than this many "
+        "standard deviations from the median (default: 3.0)",
+    )
+    parser.add_argument(
+        "--temp-tolerance",
+        type=float,
+        default=DEFAULT_TEMP_TOLERANCE,
+        metavar="C",
+        help="group darks and biases whose sensor temperatures round to the same "
+        f"multiple of C degrees, 0 for exact matches (default: "
+        f"{DEFAULT_TEMP_TOLERANCE})",
+    )
+    parser.add_argument(
+        "--min-frames",
+        type=int,
+        default=3,
+        help="skip groups with fewer frames (default: 3)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--memory",
+        type=int,
+        default=256,
+        metavar="MB",
+        help="approximate memory each worker may use (default: 256)",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="rebuild masters that already exist",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="print the groups without building any master",
+    )
+    args = parser.parse_args()
+
+    if args.temp_tolerance < 0:
+        parser.error("--temp-tolerance must not be negative")
+    groups = group_calibration_frames(args.source_directory, args.temp_tolerance)
+    if not groups:
+        print("No calibration frames found")
+        return
+
+    executor = None
+    if args.jobs > 1 and not args.dry_run:
+        executor = ProcessPoolExecutor(max_workers=args.jobs)
+    failed = 0
+    try:
+        for group in groups:
+            output_path = os.path.join(args.output_directory, f"{group.name}.fits")
+            if len(group.paths) < args.min_frames:
+                print(f"Skipping {group.name}: only {len(group.paths)} frames")
+                continue
+            if os.path.exists(output_path) and not args.overwrite:
+                print(f"Skipping {group.name}: {output_path} already exists")
+                continue
+            print(f"Building {group.name} from {len(group.paths)} frames")
+            if args.dry_run:
+                continue
+            os.makedirs(args.output_directory, exist_ok=True)
+            try:
+                build_master(
+                    group, output_path, executor, args.method, args.sigma, args.memory
+                )
+            except (OSError, ValueError) as e:
+                print(f"Error building {group.name}: {e}")
+                failed += 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,222 @@
+import argparse
+import csv
+import os
+import shutil
 import sys
-from typing import List
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
 
-from astropy.io import fits
+from header_io import (
+    BLOCK_SIZE,
+    CARD_SIZE,
+    card_comment,
+    card_key,
+    continuation_end,
+    format_card,
+    read_header_cards,
+)
+from instrumentation import add_arguments, instrument, progress
 
-if len(sys.argv) < 4:
-    print("Usage: python bulk_edit_fits_headers.py [headername] [value] [files...]")
-    exit(1)
+# Columns of a statistics.py CSV that are not headers
+_CSV_PATH_COLUMNS = {"Path", "Dirname", "Basename"}
 
-header: str = sys.argv[1]
-value: str = sys.argv[2]
-files: List[str] = sys.argv[3:]
 
-print(f"Setting {header}={value} on {len(files)} files")
+def parse_value(text: str) -> Any:
+    """
+    Converts a value given on the command line or in a CSV file to the type
+    it is written with: ints, floats and True/False keep their type, anything
+    else (or anything in single quotes) is written as a string.
+    """
+    if len(text) >= 2 and text[0] == text[-1] == "'":
+        return text[1:-1]
+    if text in ("True", "False"):
+        return text == "True"
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
 
-for f in files:
-    fits.setval(f, header, value=value)
+
+def apply_edits(path: str, edits: List[Tuple[str, Any]]) -> bool:
+    """
+    Sets many headers of a FITS file in one open. Existing cards keep their
+    position and comment. The new header is written in place when it still
+    fits in the existing header blocks, including their padding; otherwise,
+    or when the file has other hardlinks, the file is rewritten to a
+    temporary file that atomically replaces it.
+
+    Args:
+        path (str): Path to the FITS file.
+        edits (list): (header, value) pairs to set.
+
+    Returns:
+        bool: True if the header was edited in place, False if the file was
+        rewritten.
+    """
+    cards, header_size = read_header_cards(path)
+
+    # Trailing blank cards are padding that new cards can take over
+    while cards and not cards[-1].strip():
+        cards.pop()
+
+    positions: Dict[str, int] = {}
+    for i, card in enumerate(cards):
+        positions.setdefault(card_key(card), i)
+
+    for key, value in edits:
+        key = key.upper()
+        if key in positions:
+            i = positions[key]
+            # A long string value continues on CONTINUE cards, the last of
+            # which holds the comment; they are all replaced by one card
+            end = continuation_end(cards, i)
+            cards[i:end] = [format_card(key, value, card_comment(cards[end - 1]))]
+            if end > i + 1:
+                removed = end - i - 1
+                positions = {
+                    k: p - removed if p > i else p for k, p in positions.items()
+                }
+        else:
+            positions[key] = len(cards)
+            cards.append(format_card(key, value))
+
+    header = "".join(cards) + "END".ljust(CARD_SIZE)
+    new_size = -(-len(header) // BLOCK_SIZE) * BLOCK_SIZE
+
+    # An in-place write would also change every other hardlink of the file,
+    # e.g. the raw frame behind an archive made with --link hard, or a flat
+    # shared through the flat store; the rewrite gives path its own copy
+    if new_size <= header_size and os.stat(path).st_nlink == 1:
+        with open(path, "r+b") as f:
+            f.write(header.ljust(header_size).encode("ascii"))
+        return True
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with open(path, "rb") as fsrc, os.fdopen(fd, "wb") as fdst:
+            fdst.write(header.ljust(new_size).encode("ascii"))
+            fsrc.seek(header_size)
+            shutil.copyfileobj(fsrc, fdst, 1 << 20)
+            fdst.flush()
+            os.fsync(fdst.fileno())
+        shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return False
+
+
+def read_csv_edits(csv_path: str) -> Dict[str, List[Tuple[str, Any]]]:
+    """
+    Reads per-file header values from a CSV file with a Path column and one
+    column per header, e.g. a CSV written by statistics.py. Empty and N/A
+    cells are skipped.
+    """
+    edits: Dict[str, List[Tuple[str, Any]]] = {}
+    with open(csv_path, "r", newline="") as cfile:
+        reader = csv.DictReader(cfile)
+        if not reader.fieldnames or "Path" not in reader.fieldnames:
+            raise ValueError(f"{csv_path} has no Path column")
+        for row in reader:
+            for key, text in row.items():
+                if key in _CSV_PATH_COLUMNS or text in ("", "N/A", None):
+                    continue
+                edits.setdefault(row["Path"], []).append((key, parse_value(text)))
+    return edits
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Add or replace FITS headers in many files.",
+        usage="%(prog)s [headername] [value] [files...]\n"
+        "       %(prog)s [--set KEY=VALUE ...] [--csv mapping.csv] [files...]",
+    )
+    parser.add_argument("args", nargs="*", help=argparse.SUPPRESS)
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="header to set on every file, can be given many times",
+    )
+    parser.add_argument(
+        "--csv",
+        help="CSV file with a Path column and one column of values per header",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=8,
+        help="number of files to edit concurrently (default: 8)",
+    )
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    edits: List[Tuple[str, Any]] = []
+    files: List[str] = args.args
+    if not args.set and not args.csv:
+        if len(args.args) < 3:
+            parser.print_usage()
+            sys.exit(1)
+        # Original form: a single header and value, always written as a string
+        edits = [(args.args[0], args.args[1])]
+        files = args.args[2:]
+    for pair in args.set:
+        key, sep, text = pair.partition("=")
+        if not sep or not key:
+            parser.error(f"--set expects KEY=VALUE, got {pair}")
+        value = parse_value(text)
+        try:
+            format_card(key, value)
+        except ValueError as e:
+            parser.error(str(e))
+        edits.append((key, value))
+
+    with instrument(args) as metrics:
+        edits_by_file: Dict[str, List[Tuple[str, Any]]] = {
+            f: list(edits) for f in files
+        }
+        if args.csv:
+            with metrics.phase("read CSV"):
+                for f, csv_edits in read_csv_edits(args.csv).items():
+                    edits_by_file.setdefault(f, list(edits)).extend(csv_edits)
+
+        keys = sorted({key.upper() for e in edits_by_file.values() for key, _ in e})
+        print(f"Setting {', '.join(keys)} on {len(edits_by_file)} files")
+        bar = progress(args, "Edited", len(edits_by_file))
+
+        def edit(item: Tuple[str, List[Tuple[str, Any]]]) -> str:
+            f, file_edits = item
+            try:
+                return "in place" if apply_edits(f, file_edits) else "rewritten"
+            except Exception as e:
+                print(f"Error editing {f}: {e}")
+                return "failed"
+            finally:
+                if bar is not None:
+                    bar.update()
+
+        with metrics.phase("edit", len(edits_by_file)), ThreadPoolExecutor(
+            max_workers=max(1, args.jobs)
+        ) as executor:
+            results = list(executor.map(edit, edits_by_file.items()))
+        if bar is not None:
+            bar.close()
+
+    print(
+        f"Edited {results.count('in place')} files in place, "
+        f"rewrote {results.count('rewritten')} files, "
+        f"{results.count('failed')} failed"
+    )
+    if results.count("failed"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
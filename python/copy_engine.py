@@ -0,0 +1,323 @@
+"""
+Copy engine for archiving astrophotographs.
+
+Copies files on a bounded thread pool. Data is moved with kernel-side copies
+(copy_file_range/sendfile) where the platform supports them, or not moved at
+all when hardlinks or reflinks (copy-on-write clones) can be used because the
+source and destination share a filesystem.
+"""
+
+import errno
+import hashlib
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from instrumentation import Progress
+
+LINK_MODES = ("copy", "hard", "reflink")
+
+# Buffer size of copies through user space
+CHUNK_SIZE = 1 << 20
+
+# Linux ioctl for cloning a whole file (FICLONE from linux/fs.h)
+FICLONE = 0x40049409
+
+# Errors that mean "this fast path is not available here, try the next one"
+_FALLBACK_ERRNOS = {
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+    errno.EPERM,
+    errno.EBADF,
+    errno.ENOTTY,
+    errno.EMLINK,
+}
+
+
+def _kernel_copy(source: str, destination: str) -> None:
+    """Copy file contents without pulling the data through user space."""
+    if not sys.platform.startswith("linux"):
+        # shutil uses fcopyfile on macOS, which is already kernel-side
+        shutil.copyfile(source, destination)
+        return
+
+    with open(source, "rb") as fsrc, open(destination, "wb") as fdst:
+        src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+        remaining = os.fstat(src_fd).st_size
+        use_copy_file_range = hasattr(os, "copy_file_range")
+        offset = 0
+        while remaining > 0:
+            chunk = min(remaining, 1 << 30)
+            try:
+                if use_copy_file_range:
+                    sent = os.copy_file_range(src_fd, dst_fd, chunk)
+                else:
+                    sent = os.sendfile(dst_fd, src_fd, offset, chunk)
+            except OSError as e:
+                if e.errno not in _FALLBACK_ERRNOS:
+                    raise
+                if use_copy_file_range:
+                    # e.g. cross-filesystem on older kernels, retry with sendfile
+                    use_copy_file_range = False
+                    continue
+                # Neither syscall works here, finish with a buffered copy
+                fsrc.seek(offset)
+                fdst.seek(offset)
+                shutil.copyfileobj(fsrc, fdst, CHUNK_SIZE)
+                return
+            if sent == 0:
+                break
+            offset += sent
+            remaining -= sent
+
+
+def _reflink(source: str, destination: str) -> None:
+    """Create a copy-on-write clone of source at destination."""
+    if sys.platform == "darwin":
+        import ctypes
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        if os.path.lexists(destination):
+            os.unlink(destination)
+        if libc.clonefile(source.encode(), destination.encode(), 0) != 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), destination)
+        return
+
+    import fcntl
+
+    with open(source, "rb") as fsrc, open(destination, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def write_atomically(
+    write: Callable[[str, str], None], source: str, destination: str
+) -> None:
+    """
+    Calls write(source, tmp_path) for a temporary file next to destination
+    and renames it into place when it succeeds, so an interrupted copy never
+    leaves a partial file at destination.
+    """
+    directory, name = os.path.split(destination)
+    tmp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex[:8]}.part")
+    try:
+        write(source, tmp_path)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        if os.path.lexists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def copy_and_hash(source: str, destination: str) -> str:
+    """
+    Copies source to destination through user space and hashes the data on
+    the way, so checking the copy needs no second read.
+
+    Returns:
+        str: The SHA-256 hex digest of the data.
+    """
+    digest = hashlib.sha256()
+    with open(source, "rb") as fsrc, open(destination, "wb") as fdst:
+        while True:
+            chunk = fsrc.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            fdst.write(chunk)
+    return digest.hexdigest()
+
+
+def _copy_data(source: str, destination: str) -> None:
+    _kernel_copy(source, destination)
+    shutil.copymode(source, destination)
+
+
+def _hardlink(source: str, destination: str) -> None:
+    """Hardlink source to destination, replacing an existing destination."""
+    try:
+        os.link(source, destination)
+    except FileExistsError:
+        os.unlink(destination)
+        os.link(source, destination)
+
+
+def copy_file(source: str, destination: str, link_mode: str = "copy") -> bool:
+    """
+    Copies a single file using the fastest method allowed by link_mode.
+
+    Hardlinks and reflinks fall back to a kernel-side copy when the
+    filesystem does not support them (e.g. source and destination are on
+    different devices). Copies and reflinks are written to a temporary file
+    that replaces destination only once it is complete.
+
+    Args:
+        source (str): Path of the file to copy.
+        destination (str): Path of the new file.
+        link_mode (str): One of "copy", "hard" or "reflink".
+
+    Returns:
+        bool: True if file data was copied, False if it was linked.
+    """
+    if link_mode not in LINK_MODES:
+        raise ValueError(f"Unknown link mode: {link_mode}")
+
+    if link_mode != "copy":
+        try:
+            if link_mode == "hard":
+                _hardlink(source, destination)
+            else:
+                write_atomically(_reflink, source, destination)
+            return False
+        except OSError as e:
+            if e.errno not in _FALLBACK_ERRNOS:
+                raise
+
+    write_atomically(_copy_data, source, destination)
+    return True
+
+
+class CopyEngine:
+    """
+    Copies files concurrently on a bounded thread pool and keeps aggregate
+    statistics for the final throughput report.
+    """
+
+    def __init__(
+        self,
+        jobs: int = 4,
+        link_mode: str = "copy",
+        progress: Optional[Progress] = None,
+    ) -> None:
+        if jobs < 1:
+            raise ValueError("jobs must be at least 1")
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"Unknown link mode: {link_mode}")
+        self.jobs = jobs
+        self.link_mode = link_mode
+        # Replaces the per-file messages when given
+        self.progress = progress
+        self.files_copied = 0
+        self.files_linked = 0
+        self.bytes_copied = 0
+        self.bytes_linked = 0
+        self.errors = 0
+        self._executor = ThreadPoolExecutor(max_workers=jobs)
+        # Bound the number of queued copies so huge batches don't pile up
+        self._slots = threading.BoundedSemaphore(jobs * 4)
+        self._lock = threading.Lock()
+        self._futures: List[Future] = []
+        self._started = time.monotonic()
+
+    def __enter__(self) -> "CopyEngine":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def submit(
+        self,
+        source: str,
+        destination: str,
+        message: Optional[str] = None,
+        on_success: Optional[Callable[[], None]] = None,
+        copier: Optional[Callable[[str, str], bool]] = None,
+    ) -> Future:
+        """
+        Queues a copy of source to destination.
+
+        Args:
+            source (str): Path of the file to copy.
+            destination (str): Path of the new file. Its folder must exist.
+            message (str): Printed when the copy has finished successfully.
+            on_success (callable): Called when the copy has finished successfully.
+            copier (callable): Replaces copy_file for this file. Takes source and
+                destination and returns True if file data was copied.
+        """
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(
+                self._copy, source, destination, message, on_success, copier
+            )
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        with self._lock:
+            self._futures.append(future)
+        return future
+
+    def _copy(
+        self,
+        source: str,
+        destination: str,
+        message: Optional[str],
+        on_success: Optional[Callable[[], None]],
+        copier: Optional[Callable[[str, str], bool]],
+    ) -> None:
+        try:
+            size = os.path.getsize(source)
+            if copier is not None:
+                copied = copier(source, destination)
+            else:
+                copied = copy_file(source, destination, self.link_mode)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            print(f"Error copying {source} to {destination}: {e}")
+            return
+
+        with self._lock:
+            if copied:
+                self.files_copied += 1
+                self.bytes_copied += size
+            else:
+                self.files_linked += 1
+                self.bytes_linked += size
+        if on_success is not None:
+            on_success()
+        if self.progress is not None:
+            self.progress.update()
+        elif message:
+            print(message)
+
+    def wait(self) -> None:
+        """Blocks until every queued copy has finished."""
+        while True:
+            with self._lock:
+                pending, self._futures = self._futures, []
+            if not pending:
+                return
+            for future in pending:
+                future.result()
+
+    def close(self) -> None:
+        """Waits for queued copies and shuts down the thread pool."""
+        self.wait()
+        self._executor.shutdown(wait=True)
+        if self.progress is not None:
+            self.progress.close()
+            self.progress = None
+
+    def summary(self) -> str:
+        """Returns a one-line report of the files handled and throughput."""
+        elapsed = max(time.monotonic() - self._started, 1e-6)
+        mb_copied = self.bytes_copied / (1024 * 1024)
+        mb_linked = self.bytes_linked / (1024 * 1024)
+        text = (
+            f"Copied {self.files_copied} files ({mb_copied:.1f} MB) "
+            f"in {elapsed:.1f}s, {mb_copied / elapsed:.1f} MB/s"
+        )
+        if self.files_linked:
+            text += f"; linked {self.files_linked} files ({mb_linked:.1f} MB)"
+        if self.errors:
+            text += f"; {self.errors} errors"
+        return text
@@ -1,30 +1,165 @@
+import argparse
+import os
 import sys
-from typing import Any
-
-from astropy.io import fits
-
-target: str = sys.argv[1]
-
-if len(sys.argv) == 2:
-    try:
-        hdul = fits.open(target)
-    except Exception as e:
-        print(f"Error opening the file: {e}")
-        exit(1)
-    headers = hdul[0].header
-    try:
-        print("\n".join(list(headers.keys())))
-    except Exception as e:
-        print(f"No such header: {e}")
-        exit(1)
-elif len(sys.argv) == 3:
-    header: str = sys.argv[2]
-    try:
-        value: Any = fits.getval(target, header)
-    except Exception as e:
-        print(f"Could not open file or no such header: {e}")
-        exit(1)
-    print(value)
-else:
-    print("Usage: python fits_header.py [file] [header]")
-    exit(1)
+from typing import Any, Dict, List, Optional
+
+from header_io import read_header_keys, read_primary_header
+from instrumentation import add_arguments, instrument
+
+# astropy and the catalog are imported lazily: importing astropy.io.fits costs
+# far more than reading a header, and this script is called from shell loops.
+
+
+def _astropy_header(target: str, hdu: int) -> Any:
+    from astropy.io import fits
+
+    with fits.open(target) as hdul:
+        return hdul[hdu].header
+
+
+def list_keys(target: str, catalog: str = "", hdu: int = 0) -> List[str]:
+    """Returns the header keywords of a file, from the catalog if given."""
+    if catalog:
+        from header_catalog import header_keys
+
+        return header_keys(catalog, target)
+    if hdu == 0:
+        try:
+            return read_header_keys(target)
+        except ValueError:
+            pass  # e.g. compressed FITS, let astropy handle it
+    return list(_astropy_header(target, hdu).keys())
+
+
+def get_values(
+    targets: List[str], header: str, catalog: str = "", hdu: int = 0
+) -> List[Optional[Any]]:
+    """
+    Returns the value of one header for each file, or None where the header
+    is missing. Reads the catalog if given, otherwise only the header blocks
+    of each file; astropy is only loaded for other HDUs and files the built-in
+    parser cannot read.
+    """
+    if catalog:
+        from header_catalog import query
+
+        found: Dict[str, Any] = {
+            path: value for path, value in query(catalog, [header], paths=targets)
+        }
+        return [found[os.path.abspath(t)] for t in targets]
+
+    values = []
+    for target in targets:
+        if hdu == 0:
+            try:
+                values.append(read_primary_header(target, [header]).get(header.upper()))
+                continue
+            except ValueError:
+                pass
+        hdr = _astropy_header(target, hdu)
+        values.append(hdr[header] if header in hdr else None)
+    return values
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Display FITS or XISF header information.",
+        usage="%(prog)s [file] [header]\n"
+        "       %(prog)s -k HEADER [files...]\n"
+        "       %(prog)s --catalog CATALOG --where EXPR [header]",
+    )
+    parser.add_argument("paths", nargs="*", help=argparse.SUPPRESS)
+    parser.add_argument(
+        "-k",
+        "--key",
+        help="print HEADER of every file as file<TAB>value lines",
+    )
+    parser.add_argument(
+        "--hdu",
+        type=int,
+        default=0,
+        help="HDU to read instead of the primary one (loads astropy)",
+    )
+    parser.add_argument(
+        "--catalog",
+        default="",
+        help="answer from a header catalog built by header_catalog.py",
+    )
+    parser.add_argument(
+        "--where",
+        help='with --catalog, list the files matching e.g. "FILTER=Ha AND '
+        'EXPTIME>=300", with the value of header if given',
+    )
+    add_arguments(parser, quiet=False)
+    args = parser.parse_intermixed_args()
+
+    with instrument(args) as metrics, metrics.phase("read headers", len(args.paths)):
+        run(parser, args)
+
+
+def run(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    """Prints what the parsed command line asks for."""
+
+    if args.where:
+        header = args.key or (args.paths[0] if args.paths else None)
+        if not args.catalog or len(args.paths) > (0 if args.key else 1):
+            parser.print_usage()
+            sys.exit(1)
+        from header_catalog import parse_where, query
+
+        try:
+            parse_where(args.where)
+        except ValueError as e:
+            parser.error(str(e))
+        try:
+            rows = query(args.catalog, [header] if header else [], args.where)
+        except Exception as e:
+            print(f"Could not query the catalog: {e}")
+            sys.exit(1)
+        for path, *values in rows:
+            print("\t".join([path] + ["N/A" if v is None else str(v) for v in values]))
+    elif args.key:
+        failed = False
+        if args.catalog:
+            try:
+                values = get_values(args.paths, args.key, args.catalog)
+            except Exception as e:
+                print(f"Could not query the catalog: {e}", file=sys.stderr)
+                sys.exit(1)
+            for path, value in zip(args.paths, values):
+                print(f"{path}\t{'N/A' if value is None else value}")
+        else:
+            for path in args.paths:
+                try:
+                    (value,) = get_values([path], args.key, hdu=args.hdu)
+                except Exception as e:
+                    print(f"Error opening {path}: {e}", file=sys.stderr)
+                    failed = True
+                    continue
+                print(f"{path}\t{'N/A' if value is None else value}")
+        if failed:
+            sys.exit(1)
+    elif len(args.paths) == 1:
+        try:
+            keys = list_keys(args.paths[0], args.catalog, args.hdu)
+        except Exception as e:
+            print(f"Error opening the file: {e}")
+            sys.exit(1)
+        print("\n".join(keys))
+    elif len(args.paths) == 2:
+        target, header = args.paths
+        try:
+            (value,) = get_values([target], header, args.catalog, args.hdu)
+            if value is None:
+                raise KeyError(f"Keyword '{header}' not found.")
+        except Exception as e:
+            print(f"Could not open file or no such header: {e}")
+            sys.exit(1)
+        print(value)
+    else:
+        print("Usage: python fits_header.py [file] [header]")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
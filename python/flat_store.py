@@ -0,0 +1,224 @@
+"""
+Content-addressed store for flat frames shared across targets.
+
+A flat set for one date and filter is often used by several targets in the
+same night. Instead of copying it into every target folder, each flat is
+hashed while it is copied into the store once, under .flats/<hash prefix>/,
+and every target folder gets a hardlink or symlink to it.
+
+Usage: python flat_store.py report <archive_directory>
+       python flat_store.py gc <archive_directory> [--dry-run]
+"""
+
+import argparse
+import os
+import stat
+import threading
+import uuid
+from typing import Dict, List, Tuple
+
+from copy_engine import copy_and_hash
+
+STORE_DIR_NAME = ".flats"
+LINK_TYPES = ("hard", "symlink")
+
+
+class FlatStore:
+    """
+    Stores flats once by content hash and links them into target folders.
+
+    A source file is hashed once per run, however many targets use it.
+    """
+
+    def __init__(self, archive_dir: str, link_type: str = "hard") -> None:
+        if link_type not in LINK_TYPES:
+            raise ValueError(f"Unknown link type: {link_type}")
+        self.archive_dir = archive_dir
+        self.link_type = link_type
+        self.store_dir = os.path.join(archive_dir, STORE_DIR_NAME)
+        self._tmp_dir = os.path.join(self.store_dir, "tmp")
+        self._blobs: Dict[Tuple[str, int, int], str] = {}
+        self._source_locks: Dict[Tuple[str, int, int], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def place(self, source: str, destination: str) -> bool:
+        """
+        Places source at destination as a link to its blob in the store,
+        copying it into the store first if needed. Has the signature of
+        copy_engine.copy_file, so it can be used as a CopyEngine copier.
+
+        Returns:
+            bool: True if file data was copied into the store, False if an
+            existing blob was linked.
+        """
+        st = os.stat(source)
+        key = (os.path.abspath(source), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            source_lock = self._source_locks.setdefault(key, threading.Lock())
+
+        copied = False
+        with source_lock:
+            blob = self._blobs.get(key)
+            if blob is None:
+                blob = self._ingest(source)
+                self._blobs[key] = blob
+                copied = True
+
+        self._link(blob, destination)
+        return copied
+
+    def _ingest(self, source: str) -> str:
+        """Copies source into the store, hashing it on the way."""
+        os.makedirs(self._tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(self._tmp_dir, uuid.uuid4().hex)
+        try:
+            digest = copy_and_hash(source, tmp_path)
+            blob = self.blob_path(digest, os.path.splitext(source)[1])
+            if os.path.exists(blob):
+                os.unlink(tmp_path)  # Same content stored by an earlier run
+            else:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                os.replace(tmp_path, blob)
+            return blob
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def blob_path(self, digest: str, extension: str) -> str:
+        """Returns the store path of the blob with the given hash."""
+        return os.path.join(self.store_dir, digest[:2], digest + extension.lower())
+
+    def _link(self, blob: str, destination: str) -> None:
+        """Links destination to blob with the requested link type."""
+        if os.path.lexists(destination):
+            os.unlink(destination)
+        if self.link_type == "symlink":
+            os.symlink(os.path.relpath(blob, os.path.dirname(destination)), destination)
+            return
+        try:
+            os.link(blob, destination)
+        except OSError as e:
+            # e.g. exFAT, which has no hardlinks. A symlink would make the
+            # target folder depend on the store, so only use one if asked to
+            raise OSError(
+                e.errno,
+                f"Cannot hardlink the flat store blob ({e.strerror}), "
+                "use --dedup-flats symlink on this filesystem",
+                destination,
+            ) from e
+
+
+def _scan(archive_dir: str) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """
+    Walks the archive once and returns the size and the number of references
+    from target folders for every blob in the store.
+    """
+    store_dir = os.path.realpath(os.path.join(archive_dir, STORE_DIR_NAME))
+    sizes: Dict[str, int] = {}
+    refs: Dict[str, int] = {}
+    blobs_by_inode: Dict[Tuple[int, int], str] = {}
+
+    for dirpath, dirnames, filenames in os.walk(store_dir):
+        if dirpath == store_dir and "tmp" in dirnames:
+            dirnames.remove("tmp")
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            st = os.lstat(path)
+            sizes[path] = st.st_size
+            refs[path] = 0
+            blobs_by_inode[(st.st_dev, st.st_ino)] = path
+
+    for dirpath, dirnames, filenames in os.walk(archive_dir):
+        if STORE_DIR_NAME in dirnames:
+            dirnames.remove(STORE_DIR_NAME)
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            st = os.lstat(path)
+            if stat.S_ISLNK(st.st_mode):
+                target = os.path.realpath(path)
+                if target in refs:
+                    refs[target] += 1
+            elif st.st_nlink > 1:
+                blob = blobs_by_inode.get((st.st_dev, st.st_ino))
+                if blob is not None:
+                    refs[blob] += 1
+
+    return sizes, refs
+
+
+def _format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def report(archive_dir: str) -> None:
+    """Prints the blobs in the store, their references and the space saved."""
+    sizes, refs = _scan(archive_dir)
+    links = sum(refs.values())
+    saved = sum(sizes[blob] * max(count - 1, 0) for blob, count in refs.items())
+    orphans = [blob for blob, count in refs.items() if count == 0]
+
+    print(f"Flat store: {os.path.join(archive_dir, STORE_DIR_NAME)}")
+    print(f"  Blobs: {len(sizes)} ({_format_size(sum(sizes.values()))})")
+    print(f"  Links from target folders: {links}")
+    print(f"  Space saved: {_format_size(saved)}")
+    print(
+        f"  Orphaned blobs: {len(orphans)} "
+        f"({_format_size(sum(sizes[blob] for blob in orphans))})"
+    )
+
+
+def gc(archive_dir: str, dry_run: bool = False) -> List[str]:
+    """
+    Removes blobs no target folder links to anymore, and temporary files
+    left behind by interrupted runs.
+
+    Returns:
+        list: Paths of the removed (or, with dry_run, removable) files.
+    """
+    sizes, refs = _scan(archive_dir)
+    removed = [blob for blob, count in refs.items() if count == 0]
+
+    tmp_dir = os.path.join(archive_dir, STORE_DIR_NAME, "tmp")
+    if os.path.isdir(tmp_dir):
+        removed.extend(os.path.join(tmp_dir, name) for name in os.listdir(tmp_dir))
+
+    for path in removed:
+        print(f"{'Would remove' if dry_run else 'Removing'} {path}")
+        if not dry_run:
+            os.unlink(path)
+            parent = os.path.dirname(path)
+            if not os.listdir(parent):
+                os.rmdir(parent)
+
+    freed = sum(sizes.get(path, 0) for path in removed)
+    print(f"{len(removed)} files, {_format_size(freed)} reclaimed")
+    return removed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Report on or garbage collect the deduplicated flat store "
+        "of an archive."
+    )
+    parser.add_argument("command", choices=("report", "gc"))
+    parser.add_argument("archive_directory")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="with gc, only list the files that would be removed",
+    )
+    args = parser.parse_args()
+
+    if args.command == "report":
+        report(args.archive_directory)
+    else:
+        gc(args.archive_directory, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Parser for N.I.N.A.-style frame file names.
+
+Frames are named TYPE_YYYY-MM-DD_HH-MM-SS_Target_Filter_Temp_Durations_NNNN.ext,
+e.g. LIGHT_2025-08-05_23-40-14_Barnard 150_UV-IR-cut_-10.00_300.00s_0000.xisf.
+Names are split at underscores and checked field by field, which is faster
+than matching one regular expression with a variable-length target. The
+session date is computed with integer arithmetic instead of strptime and
+cached per date and hour, and results are cached because the same names are
+parsed again by every script that looks at them.
+"""
+
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+_DATE_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_HOURS = frozenset(f"{hour:02d}" for hour in range(24))
+# A set lookup is cheaper than matching the minutes and seconds with a regex
+_MINUTES_SECONDS = frozenset(f"{i // 60:02d}-{i % 60:02d}" for i in range(3600))
+
+# Names that do not follow the full convention still need a date and time
+_LOOSE_NAME_RE = re.compile(
+    r"^(?P<type>[A-Za-z]+)_(?P<date>\d{4}-\d{2}-\d{2})_(?P<time>\d{2}-\d{2}-\d{2})"
+    r"_(?P<target>[^_]*)_(?P<filter>[^_]*)_"
+)
+
+_DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+class FrameName(NamedTuple):
+    """Fields of a parsed frame file name."""
+
+    frame_type: str  # Upper case, e.g. LIGHT or FLAT
+    session_date: str  # YYYY-MM-DD of the evening the night started
+    observation_date: str  # YYYY-MM-DD as written in the name
+    observation_time: str  # HH-MM-SS as written in the name
+    target: str
+    filter_name: str
+    temperature: Optional[float]
+    duration: Optional[float]
+    sequence: Optional[int]
+
+
+def _days_in_month(year: int, month: int) -> int:
+    if month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0):
+        return 29
+    return _DAYS_IN_MONTH[month - 1]
+
+
+@lru_cache(maxsize=16384)
+def _session_date(observation_date: str, hour: str) -> Optional[str]:
+    """
+    Returns the session date of a frame taken at the given HH hour of a date,
+    or None if the date is not in YYYY-MM-DD format.
+    """
+    if not _DATE_RE.fullmatch(observation_date):
+        return None
+    year = int(observation_date[0:4])
+    month = int(observation_date[5:7])
+    day = int(observation_date[8:10])
+    if not 1 <= month <= 12 or not 1 <= day <= _days_in_month(year, month):
+        raise ValueError(f"Invalid date: {observation_date}")
+    if hour >= "12":
+        return observation_date
+    if day > 1:
+        day -= 1
+    elif month > 1:
+        month -= 1
+        day = _days_in_month(year, month)
+    else:
+        year, month, day = year - 1, 12, 31
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+def _is_time(observation_time: str) -> bool:
+    """Returns True if observation_time is a valid HH-MM-SS time."""
+    return (
+        observation_time[0:2] in _HOURS
+        and observation_time[2:3] == "-"
+        and observation_time[3:] in _MINUTES_SECONDS
+    )
+
+
+def session_date(observation_date: str, observation_time: str) -> str:
+    """
+    Returns the session date of a frame: frames taken before noon belong to
+    the night that started on the previous evening.
+
+    Args:
+        observation_date (str): Date in YYYY-MM-DD format.
+        observation_time (str): Time in HH-MM-SS format.
+
+    Returns:
+        str: The session date in YYYY-MM-DD format.
+    """
+    if not _is_time(observation_time):
+        raise ValueError(f"Invalid time: {observation_time}")
+    date = _session_date(observation_date, observation_time[0:2])
+    if date is None:
+        raise ValueError(f"Invalid date: {observation_date}")
+    return date
+
+
+@lru_cache(maxsize=65536)
+def parse_frame_name(file_name: str) -> FrameName:
+    """
+    Parses a frame file name (without directory).
+
+    Names that only follow the convention up to the filter are still parsed,
+    with the target and filter taken from the fourth and fifth fields and no
+    temperature, duration or sequence number.
+
+    Raises:
+        ValueError: If the name has no type, date and time, or the date is
+        invalid.
+    """
+    fields = file_name.split("_")
+    if len(fields) >= 8:
+        frame_type, day, time, target = fields[:4]
+        filter_name, temp, duration, sequence = fields[-4:]
+        if len(fields) > 8:
+            # The target name may contain underscores; the filter, temperature,
+            # duration and sequence number are always the last four fields.
+            target = "_".join(fields[3:-4])
+        sequence, dot, extension = sequence.partition(".")
+        if (
+            frame_type.isalpha()
+            and frame_type.isascii()
+            and target
+            and duration[-1:] == "s"
+            and (not dot or extension and "." not in extension)
+            and _is_time(time)
+        ):
+            date = _session_date(day, time[0:2])
+            if date is not None:
+                try:
+                    return FrameName(
+                        frame_type.upper(),
+                        date,
+                        day,
+                        time,
+                        target.replace("\\", " "),
+                        filter_name,
+                        float(temp),
+                        float(duration[:-1]),
+                        int(sequence),
+                    )
+                except ValueError:
+                    pass  # Not numbers, parse the name up to the filter
+
+    match = _LOOSE_NAME_RE.match(file_name)
+    if not match:
+        raise ValueError(f"Invalid file name format: {file_name}")
+    frame_type, day, time, target, filter_name = match.groups()
+    return FrameName(
+        frame_type.upper(),
+        session_date(day, time),
+        day,
+        time,
+        target.replace("\\", " "),
+        filter_name,
+        None,
+        None,
+        None,
+    )
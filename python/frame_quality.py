@@ -0,0 +1,423 @@
+"""
+Columnar frame-quality analytics over N.I.N.A. ImageMetaData.csv files.
+
+Parses the CSV files once into NumPy arrays and computes, per target and
+filter, medians, percentiles and robust outlier flags for the quality columns
+(HFR, FWHM, eccentricity, star count, guiding RMS and median ADU) with
+vectorized operations, so a year of concatenated metadata is analyzed in well
+under a second.
+
+Usage: python frame_quality.py <ImageMetaData.csv> [...] [--reject-list PATH]
+"""
+
+import argparse
+import csv
+import io
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from frame_names import parse_frame_name
+
+# Quality columns, and whether a high value means a worse frame. ADUMedian
+# follows the sky brightness through the night, so it is summarized but
+# never used to flag frames.
+METRICS: Dict[str, Optional[bool]] = {
+    "HFR": True,
+    "FWHM": True,
+    "Eccentricity": True,
+    "DetectedStars": False,
+    "GuidingRMSArcSec": True,
+    "ADUMedian": None,
+}
+
+# Scale factor turning the median absolute deviation into a standard deviation
+MAD_SCALE = 1.4826
+
+DEFAULT_THRESHOLD = 3.0
+
+
+@dataclass
+class QualityGroup:
+    """Statistics of the LIGHT frames of one target and filter."""
+
+    target: str
+    filter_name: str
+    frames: int
+    medians: Dict[str, float] = field(default_factory=dict)
+    p10: Dict[str, float] = field(default_factory=dict)
+    p90: Dict[str, float] = field(default_factory=dict)
+    outliers: int = 0
+
+
+@dataclass
+class FrameQuality:
+    """Per-group statistics and per-frame outlier flags."""
+
+    groups: List[QualityGroup]
+    paths: np.ndarray
+    targets: np.ndarray
+    filters: np.ndarray
+    values: Dict[str, np.ndarray]
+    # Boolean array per metric, True where the frame is an outlier
+    flags: Dict[str, np.ndarray]
+
+    @property
+    def rejected(self) -> np.ndarray:
+        """Indices of the frames flagged on any metric."""
+        if not self.flags:
+            return np.zeros(0, dtype=np.intp)
+        return np.flatnonzero(np.logical_or.reduce(list(self.flags.values())))
+
+
+def _to_floats(column: np.ndarray) -> np.ndarray:
+    """Converts CSV text to floats, with NaN for empty or invalid cells."""
+    try:
+        return column.astype(np.float64)
+    except ValueError:
+        values = np.full(len(column), np.nan)
+        for i, text in enumerate(column):
+            try:
+                values[i] = float(text)
+            except ValueError:
+                pass
+        return values
+
+
+def _gather_field(buf: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Copies the bytes from starts to ends of every row into an S array."""
+    width = max(int((ends - starts).max(initial=0)), 1)
+    index = starts[:, None] + np.arange(width)
+    chars = buf[np.minimum(index, len(buf) - 1)]
+    chars[index >= ends[:, None]] = 0
+    fields: np.ndarray = chars.view(f"S{width}").ravel()
+    return fields
+
+
+# Columns kept as text; every other wanted column is numeric
+_TEXT_COLUMNS = ("FilePath", "FilterName")
+
+Columns = Dict[str, Union[np.ndarray, List[bytes]]]
+
+
+def _read_columns_fast(
+    data: bytes, wanted: Iterable[str]
+) -> Optional[Tuple[List[str], Columns]]:
+    """
+    Splits unquoted CSV data into the wanted columns with vectorized byte
+    operations, without creating a Python object per numeric cell.
+
+    Returns:
+        tuple: The header and the wanted columns, text columns as lists of
+        bytes and numeric columns as S arrays. None if the data has quoted
+        fields or ragged rows and needs the csv module.
+    """
+    if b'"' in data:
+        return None
+    data = data.replace(b"\r", b"")
+    if not data.endswith(b"\n"):
+        data += b"\n"
+    buf = np.frombuffer(data, dtype=np.uint8)
+    line_ends = np.flatnonzero(buf == ord("\n"))
+    line_starts = np.concatenate((np.zeros(1, np.intp), line_ends[:-1] + 1))
+    header_bytes = data[: line_ends[0]]
+    header = header_bytes.decode("utf-8").split(",")
+
+    # Skip empty lines and header lines repeated by concatenation
+    keep = line_ends > line_starts
+    keep[0] = False
+    for i in np.flatnonzero(keep & (line_ends - line_starts == len(header_bytes))):
+        if data[line_starts[i] : line_ends[i]] == header_bytes:
+            keep[i] = False
+    starts, ends = line_starts[keep], line_ends[keep]
+
+    commas = np.flatnonzero(buf == ord(","))
+    first_comma = np.searchsorted(commas, starts)
+    comma_counts = np.searchsorted(commas, ends) - first_comma
+    if (comma_counts != len(header) - 1).any():
+        return None
+
+    columns: Columns = {}
+    for name in wanted:
+        if name not in header:
+            continue
+        j = header.index(name)
+        field_starts = starts if j == 0 else commas[first_comma + j - 1] + 1
+        field_ends = ends if j == len(header) - 1 else commas[first_comma + j]
+        if name in _TEXT_COLUMNS:
+            columns[name] = [
+                data[start:end]
+                for start, end in zip(field_starts.tolist(), field_ends.tolist())
+            ]
+        else:
+            columns[name] = _gather_field(buf, field_starts, field_ends)
+    return header, columns
+
+
+def _read_columns_csv(data: bytes, wanted: Iterable[str]) -> Tuple[List[str], Columns]:
+    """Reads the wanted columns of any CSV data with the csv module."""
+    reader = csv.reader(io.StringIO(data.decode("utf-8"), newline=""))
+    header: List[str] = next(reader, [])
+    rows = [row for row in reader if row and row != header]
+    columns: Columns = {}
+    for name in wanted:
+        if name in header:
+            j = header.index(name)
+            cells = [row[j].encode("utf-8") if j < len(row) else b"" for row in rows]
+            columns[name] = cells if name in _TEXT_COLUMNS else np.array(cells)
+    return header, columns
+
+
+def load_metadata(paths: Iterable[str]) -> Dict[str, np.ndarray]:
+    """
+    Loads the LIGHT frames of one or more ImageMetaData.csv files into columns.
+    Columns are picked by name in every file, so files written by different
+    N.I.N.A. versions can be combined; metrics a file lacks are NaN, and a
+    file without a FilePath column is skipped with a warning. Header lines
+    repeated inside concatenated files are skipped.
+
+    Returns:
+        dict: FilePath, Target and FilterName as string arrays, and every
+        quality metric as a float array with NaN for missing values.
+    """
+    file_paths: List[bytes] = []
+    filters: List[bytes] = []
+    metrics: Dict[str, List[np.ndarray]] = {metric: [] for metric in METRICS}
+    for path in paths:
+        with open(path, "rb") as csvfile:
+            data = csvfile.read()
+        if data.startswith(b"\xef\xbb\xbf"):
+            data = data[3:]
+        if not data.strip():
+            continue
+        wanted = _TEXT_COLUMNS + tuple(METRICS)
+        _, columns = _read_columns_fast(data, wanted) or _read_columns_csv(data, wanted)
+        if "FilePath" not in columns:
+            print(f"Warning: Skipping {path}, it has no FilePath column")
+            continue
+        rows = len(columns["FilePath"])
+        file_paths.extend(columns["FilePath"])
+        filters.extend(columns.get("FilterName", [b""] * rows))
+        for metric in METRICS:
+            if metric in columns:
+                metrics[metric].append(_to_floats(np.asarray(columns[metric])))
+            else:
+                metrics[metric].append(np.full(rows, np.nan))
+
+    names = [p.replace(b"\\", b"/").rpartition(b"/")[2] for p in file_paths]
+    lights = [i for i, name in enumerate(names) if name.startswith(b"LIGHT_")]
+
+    # Frames of one target and filter share the name between the time and
+    # the temperature, so only one name per such key needs a full parse
+    targets_by_key: Dict[bytes, str] = {}
+    targets: List[str] = []
+    for i in lights:
+        key = names[i].split(b"_", 3)[-1].rsplit(b"_", 3)[0]
+        target = targets_by_key.get(key)
+        if target is None:
+            try:
+                name = names[i].decode("utf-8", errors="replace")
+                target = parse_frame_name(name).target or "Unknown Target"
+            except ValueError:
+                target = "Unknown Target"
+            targets_by_key[key] = target
+        targets.append(target)
+
+    filter_names = {
+        raw: raw.strip().decode("utf-8", errors="replace") or "No Filter"
+        for raw in set(filters)
+    }
+    index = np.array(lights, dtype=np.intp)
+    result = {
+        "FilePath": np.array(
+            [file_paths[i].decode("utf-8", errors="replace") for i in lights],
+            dtype=object,
+        ),
+        "Target": np.array(targets, dtype=object),
+        "FilterName": np.array(
+            [filter_names[filters[i]] for i in lights], dtype=object
+        ),
+    }
+    for metric, parts in metrics.items():
+        result[metric] = np.concatenate(parts or [np.zeros(0)])[index]
+    return result
+
+
+def analyze_quality(
+    columns: Dict[str, np.ndarray], threshold: float = DEFAULT_THRESHOLD
+) -> FrameQuality:
+    """
+    Computes per target and filter statistics, and flags frames whose metric is
+    more than threshold robust standard deviations (MAD × 1.4826) worse than
+    the median of their group.
+
+    Args:
+        columns (dict): Columns from load_metadata.
+        threshold (float): Outlier threshold in robust standard deviations.
+
+    Returns:
+        FrameQuality: Group statistics and per-frame outlier flags.
+    """
+    targets, filters = columns["Target"], columns["FilterName"]
+    count = len(targets)
+    keys = np.array(
+        [f"{t}\0{f}" for t, f in zip(targets, filters)], dtype=object
+    ).astype("U")
+    group_keys, inverse = np.unique(keys, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.searchsorted(inverse[order], np.arange(len(group_keys) + 1))
+
+    groups = []
+    for key in group_keys:
+        target, filter_name = str(key).split("\0", 1)
+        groups.append(QualityGroup(target, filter_name, 0))
+
+    flags: Dict[str, np.ndarray] = {}
+    for metric, high_is_bad in METRICS.items():
+        values = columns[metric]
+        if count == 0 or np.isnan(values).all():
+            continue
+        medians = np.full(len(group_keys), np.nan)
+        scales = np.full(len(group_keys), np.nan)
+        for g, group in enumerate(groups):
+            sample = values[order[bounds[g] : bounds[g + 1]]]
+            sample = sample[~np.isnan(sample)]
+            if not len(sample):
+                continue
+            median = float(np.median(sample))
+            p10, p90 = np.percentile(sample, [10, 90])
+            medians[g] = median
+            scales[g] = MAD_SCALE * np.median(np.abs(sample - median))
+            group.medians[metric] = median
+            group.p10[metric] = float(p10)
+            group.p90[metric] = float(p90)
+
+        if high_is_bad is None:
+            continue
+        # Deviation in robust standard deviations, mapped back to every frame
+        with np.errstate(divide="ignore", invalid="ignore"):
+            deviation = (values - medians[inverse]) / scales[inverse]
+        if not high_is_bad:
+            deviation = -deviation
+        flags[metric] = np.nan_to_num(deviation, nan=0.0, posinf=0.0) > threshold
+
+    for g, group in enumerate(groups):
+        group.frames = int(bounds[g + 1] - bounds[g])
+    quality = FrameQuality(
+        groups, columns["FilePath"], targets, filters, columns, flags
+    )
+    rejected = quality.rejected
+    if len(rejected):
+        per_group = np.bincount(inverse[rejected], minlength=len(groups))
+        for g, group in enumerate(groups):
+            group.outliers = int(per_group[g])
+    return quality
+
+
+def _weighted_median(values: Sequence[float], weights: Sequence[int]) -> float:
+    order = np.argsort(values)
+    cumulative = np.cumsum(np.asarray(weights)[order])
+    middle = np.searchsorted(cumulative, cumulative[-1] / 2)
+    return float(np.asarray(values)[order][middle])
+
+
+def merge_groups(group_lists: Iterable[List[QualityGroup]]) -> List[QualityGroup]:
+    """
+    Combines the groups of several analyses, e.g. one per night, into one
+    group per target and filter. Frame and outlier counts are summed, and the
+    medians and percentiles are the medians of the analyses' values weighted
+    by their number of frames.
+    """
+    parts: Dict[Tuple[str, str], List[QualityGroup]] = {}
+    for groups in group_lists:
+        for group in groups:
+            parts.setdefault((group.target, group.filter_name), []).append(group)
+
+    merged = []
+    for (target, filter_name), same in parts.items():
+        group = QualityGroup(
+            target,
+            filter_name,
+            sum(g.frames for g in same),
+            outliers=sum(g.outliers for g in same),
+        )
+        for statistic in ("medians", "p10", "p90"):
+            for metric in METRICS:
+                found = [
+                    (getattr(g, statistic)[metric], g.frames)
+                    for g in same
+                    if metric in getattr(g, statistic)
+                ]
+                if found:
+                    values, weights = zip(*found)
+                    getattr(group, statistic)[metric] = _weighted_median(
+                        values, weights
+                    )
+        merged.append(group)
+    return merged
+
+
+def write_reject_list(path: str, *qualities: FrameQuality) -> int:
+    """
+    Writes the outlier frames of one or more analyses to a CSV file with the
+    metrics they were flagged on.
+
+    Returns:
+        int: The number of rejected frames.
+    """
+    count = 0
+    with open(path, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["FilePath", "Target", "FilterName", "Reasons"] + list(METRICS))
+        for quality in qualities:
+            rejected = quality.rejected
+            for i in rejected:
+                reasons = [m for m, flagged in quality.flags.items() if flagged[i]]
+                writer.writerow(
+                    [quality.paths[i], quality.targets[i], quality.filters[i]]
+                    + [";".join(reasons)]
+                    + [quality.values[m][i] for m in METRICS]
+                )
+            count += len(rejected)
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Summarize frame quality per target and filter from "
+        "ImageMetaData.csv files."
+    )
+    parser.add_argument("csvfiles", nargs="+", help="ImageMetaData.csv files")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="flag frames this many robust standard deviations worse than the "
+        f"median (default: {DEFAULT_THRESHOLD})",
+    )
+    parser.add_argument("--reject-list", help="write the flagged frames to this CSV")
+    args = parser.parse_args()
+
+    try:
+        quality = analyze_quality(load_metadata(args.csvfiles), args.threshold)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    print(
+        f"{'Target':<24}{'Filter':<12}{'Frames':>7}{'HFR':>7}{'FWHM':>7}"
+        f"{'Stars':>8}{'RMS':>7}{'Outliers':>10}"
+    )
+    for group in quality.groups:
+        m = group.medians
+        print(
+            f"{group.target[:23]:<24}{group.filter_name[:11]:<12}{group.frames:>7}"
+            f"{m.get('HFR', np.nan):>7.2f}{m.get('FWHM', np.nan):>7.2f}"
+            f"{m.get('DetectedStars', np.nan):>8.0f}"
+            f"{m.get('GuidingRMSArcSec', np.nan):>7.2f}{group.outliers:>10}"
+        )
+    if args.reject_list:
+        rejected = write_reject_list(args.reject_list, quality)
+        print(f"Wrote {rejected} rejected frames to {args.reject_list}")
+
+
+if __name__ == "__main__":
+    main()
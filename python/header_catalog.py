@@ -0,0 +1,323 @@
+"""
+Persistent SQLite catalog of FITS and XISF headers.
+
+Indexes every primary header card of every frame in an archive once and
+refreshes only files whose size or modification time changed, so repeated
+queries from statistics.py and fits_header.py never reopen the frames.
+
+Usage: python header_catalog.py index <catalog.sqlite> <archive_directory>
+"""
+
+import argparse
+import errno
+import os
+import re
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from header_io import FRAME_EXTENSIONS, read_primary_header
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cards (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    value TEXT,
+    num REAL,
+    PRIMARY KEY (file_id, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cards_key_num ON cards (key, num, file_id);
+CREATE INDEX IF NOT EXISTS cards_key_value ON cards (key, value, file_id);
+"""
+
+# KEY OP VALUE, where an unquoted value may contain spaces but no quotes or
+# operators, so e.g. "A=1 OR B=2" or "A=>1" is rejected instead of compared
+# as text
+_CONDITION_RE = re.compile(
+    r"""^\s*([\w-]+)\s*(!=|>=|<=|=|>|<)\s*"""
+    r"""(?:'([^']*)'|"([^"]*)"|([^\s'"=!<>](?:[^'"=!<>]*[^\s'"=!<>])?))\s*$"""
+)
+_AND_RE = re.compile(r"\s+AND\s+", re.IGNORECASE)
+_CONNECTIVE_RE = re.compile(r"(?:^|\s)(?:AND|OR)(?:\s|$)", re.IGNORECASE)
+
+
+def connect(catalog_path: str, readonly: bool = False) -> sqlite3.Connection:
+    """
+    Opens a header catalog, creating it if needed unless readonly is set.
+
+    Raises:
+        FileNotFoundError: If readonly is set and the catalog does not exist.
+    """
+    if readonly:
+        # sqlite3.connect would create a mistyped catalog path as a new,
+        # empty database
+        if not os.path.isfile(catalog_path):
+            raise FileNotFoundError(
+                errno.ENOENT,
+                "No such header catalog, create it with header_catalog.py index",
+                catalog_path,
+            )
+        return sqlite3.connect(
+            f"{Path(catalog_path).resolve().as_uri()}?mode=ro", uri=True
+        )
+    conn = sqlite3.connect(catalog_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+CardRow = Tuple[str, int, Optional[str], Optional[float]]
+
+
+def _card_rows(header: Dict[str, Any]) -> List[CardRow]:
+    """
+    Converts header values to (key, position, text, number) catalog rows.
+    Logicals are stored as T or F, as they are written in FITS headers.
+    """
+    rows = []
+    for pos, (key, value) in enumerate(header.items()):
+        num = None
+        if isinstance(value, bool):
+            text: Optional[str] = "T" if value else "F"
+        else:
+            if isinstance(value, (int, float)):
+                num = float(value)
+            text = None if value is None else str(value)
+        rows.append((key, pos, text, num))
+    return rows
+
+
+def _read_cards(path: str) -> Tuple[str, Optional[List[CardRow]]]:
+    try:
+        return path, _card_rows(read_primary_header(path))
+    except Exception as e:
+        print(f"Error reading {path}: {e}")
+        return path, None
+
+
+def _walk_frames(archive_dir: str) -> Iterator[os.DirEntry]:
+    """Yields a directory entry for every frame below archive_dir."""
+    stack = [archive_dir]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if not entry.name.startswith("."):
+                        stack.append(entry.path)
+                elif entry.name.lower().endswith(FRAME_EXTENSIONS):
+                    yield entry
+
+
+def index_archive(catalog_path: str, archive_dir: str, jobs: int = 1) -> None:
+    """
+    Brings the catalog up to date with the frames below archive_dir. Only new
+    files and files whose size or modification time changed are read, and
+    files that no longer exist are removed from the catalog.
+
+    Args:
+        catalog_path (str): Path to the SQLite catalog.
+        archive_dir (str): Directory to index recursively.
+        jobs (int): Number of worker processes reading headers.
+    """
+    archive_dir = os.path.abspath(archive_dir)
+    conn = connect(catalog_path)
+    # Paths below archive_dir sort between "archive_dir/" and the same with
+    # the separator's successor. Unlike LIKE, this is case-sensitive, so
+    # indexing /x/Astro leaves /x/astro alone, and it uses the path index
+    prefix = archive_dir.rstrip(os.sep) + os.sep
+    known = {
+        path: (file_id, size, mtime_ns)
+        for file_id, path, size, mtime_ns in conn.execute(
+            "SELECT id, path, size, mtime_ns FROM files WHERE path >= ? AND path < ?",
+            (prefix, prefix[:-1] + chr(ord(os.sep) + 1)),
+        )
+    }
+
+    stale: Dict[str, Tuple[int, int]] = {}
+    seen = set()
+    for entry in _walk_frames(archive_dir):
+        st = entry.stat()
+        seen.add(entry.path)
+        previous = known.get(entry.path)
+        if previous is None or previous[1:] != (st.st_size, st.st_mtime_ns):
+            stale[entry.path] = (st.st_size, st.st_mtime_ns)
+
+    removed = [known[path][0] for path in known.keys() - seen]
+    print(
+        f"Indexing {len(stale)} new or changed files, "
+        f"removing {len(removed)}, {len(seen) - len(stale)} unchanged"
+    )
+
+    paths = sorted(stale)
+    if jobs > 1 and len(paths) > 1:
+        chunksize = max(1, min(256, len(paths) // (jobs * 4)))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(_read_cards, paths, chunksize=chunksize))
+    else:
+        results = list(map(_read_cards, paths))
+
+    with conn:
+        conn.executemany("DELETE FROM files WHERE id = ?", [(i,) for i in removed])
+        for path, rows in results:
+            if rows is None:
+                continue
+            size, mtime_ns = stale[path]
+            conn.execute("DELETE FROM files WHERE path = ?", (path,))
+            file_id = conn.execute(
+                "INSERT INTO files (path, size, mtime_ns) VALUES (?, ?, ?)",
+                (path, size, mtime_ns),
+            ).lastrowid
+            conn.executemany(
+                "INSERT OR IGNORE INTO cards (file_id, key, pos, value, num) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(file_id,) + row for row in rows],
+            )
+    conn.close()
+
+
+def parse_where(where: str) -> Tuple[str, List[Any]]:
+    """
+    Translates a filter like "FILTER=Ha AND EXPTIME>=300" to an SQL condition
+    on the files table. Conditions are KEY OP VALUE with OP one of
+    = != > >= < <=, joined with AND. Numeric values are compared as numbers,
+    anything else (or anything quoted) as text; logicals are T or F.
+
+    Returns:
+        tuple: The SQL condition and its parameters.
+
+    Raises:
+        ValueError: If a condition cannot be parsed.
+    """
+    clauses = []
+    params: List[Any] = []
+    for condition in _AND_RE.split(where.strip()):
+        match = _CONDITION_RE.match(condition)
+        if not match:
+            raise ValueError(
+                f"Invalid condition: {condition!r}, expected KEY OP VALUE with OP "
+                "one of = != > >= < <=, joined with AND"
+            )
+        key, op, single, double, bare = match.groups()
+        if bare is not None and _CONNECTIVE_RE.search(bare):
+            raise ValueError(
+                f"Invalid condition: {condition!r}, conditions can only be "
+                "joined with AND; quote a value that contains AND or OR"
+            )
+        column, value = "value", bare
+        if single is not None or double is not None:
+            value = single if single is not None else double
+        else:
+            try:
+                column, value = "num", float(bare)
+            except ValueError:
+                pass
+        # Driven by the (key, value/num, file_id) indexes
+        negate = op == "!="
+        clauses.append(
+            f"id {'NOT IN' if negate else 'IN'} (SELECT file_id FROM cards "
+            f"WHERE key = ? AND {column} {'=' if negate else op} ?)"
+        )
+        params.extend([key.upper(), value])
+    return " AND ".join(clauses), params
+
+
+def query(
+    catalog_path: str,
+    headers: Iterable[str],
+    where: Optional[str] = None,
+    paths: Optional[Iterable[str]] = None,
+) -> List[Tuple[Any, ...]]:
+    """
+    Looks up header values in the catalog.
+
+    Args:
+        catalog_path (str): Path to the SQLite catalog.
+        headers (iterable): Headers to return for each file.
+        where (str): Optional filter, see parse_where.
+        paths (iterable): Restrict the query to these files.
+
+    Returns:
+        list: (path, value, ...) tuples ordered by path, with None for
+        headers the file does not have.
+
+    Raises:
+        FileNotFoundError: If the catalog does not exist.
+        KeyError: If one of paths is not in the catalog.
+    """
+    headers = list(headers)
+    conn = connect(catalog_path, readonly=True)
+    columns = "".join(
+        ", (SELECT value FROM cards WHERE file_id = files.id AND key = ?)"
+        for _ in headers
+    )
+    params: List[Any] = [h.upper() for h in headers]
+    conditions = []
+    if where:
+        sql, where_params = parse_where(where)
+        conditions.append(sql)
+        params.extend(where_params)
+    if paths is not None:
+        conn.execute("CREATE TEMP TABLE wanted (path TEXT PRIMARY KEY)")
+        conn.executemany(
+            "INSERT OR IGNORE INTO wanted VALUES (?)",
+            [(os.path.abspath(p),) for p in paths],
+        )
+        conditions.append("path IN (SELECT path FROM wanted)")
+        missing = conn.execute(
+            "SELECT path FROM wanted WHERE path NOT IN (SELECT path FROM files) "
+            "ORDER BY path"
+        ).fetchone()
+        if missing is not None:
+            conn.close()
+            raise KeyError(f"{missing[0]} is not in the catalog")
+    sql = f"SELECT path{columns} FROM files"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    rows = conn.execute(sql + " ORDER BY path", params).fetchall()
+    conn.close()
+    return rows
+
+
+def header_keys(catalog_path: str, path: str) -> List[str]:
+    """Returns the keywords the catalog has for one file."""
+    conn = connect(catalog_path, readonly=True)
+    rows = conn.execute(
+        "SELECT key FROM cards JOIN files ON files.id = cards.file_id "
+        "WHERE files.path = ? ORDER BY pos",
+        (os.path.abspath(path),),
+    ).fetchall()
+    conn.close()
+    if not rows:
+        raise KeyError(f"{path} is not in the catalog")
+    return [key for (key,) in rows]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Maintain a SQLite catalog of FITS and XISF headers."
+    )
+    parser.add_argument("command", choices=("index",))
+    parser.add_argument("catalog", help="path to the SQLite catalog")
+    parser.add_argument("archive_directory", help="directory to index recursively")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of worker processes (default: number of CPUs)",
+    )
+    args = parser.parse_args()
+
+    index_archive(args.catalog, args.archive_directory, args.jobs)
+
+
+if __name__ == "__main__":
+    main()
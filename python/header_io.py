@@ -0,0 +1,286 @@
+"""
+Lightweight FITS header access without astropy.
+
+Reads only the 2880-byte header blocks of the primary HDU and parses the
+80-character cards directly, so extracting a few keywords from thousands of
+frames costs a few KB of I/O per file and no HDU setup. XISF files are
+handled behind the same interface by xisf_reader.
+"""
+
+import math
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+BLOCK_SIZE = 2880
+CARD_SIZE = 80
+
+# Headers are read this many blocks at a time, enough for most camera headers
+_READ_BLOCKS = 4
+
+_INT_RE = re.compile(r"^[+-]?\d+$")
+
+# Extensions of the FITS and XISF frames the scripts read
+FRAME_EXTENSIONS = (".fits", ".fit", ".fts", ".xisf")
+
+
+def read_header_cards(path: str) -> Tuple[List[str], int]:
+    """
+    Reads the raw cards of the primary header of a FITS file.
+
+    Args:
+        path (str): Path to the FITS file.
+
+    Returns:
+        tuple: The 80-character cards up to (not including) END, and the size
+        of the header in bytes, i.e. the offset of the primary data.
+    """
+    cards: List[str] = []
+    offset = 0
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            data = f.read(BLOCK_SIZE * _READ_BLOCKS)
+            if len(data) < BLOCK_SIZE:
+                raise ValueError(f"Missing END card in FITS header: {path}")
+            blocks = len(data) // BLOCK_SIZE
+            text = data[: blocks * BLOCK_SIZE].decode("ascii", errors="replace")
+            if offset == 0 and not text.startswith("SIMPLE  ="):
+                raise ValueError(f"Not a FITS file: {path}")
+            for block in range(blocks):
+                for start in range(
+                    block * BLOCK_SIZE, (block + 1) * BLOCK_SIZE, CARD_SIZE
+                ):
+                    card = text[start : start + CARD_SIZE]
+                    if card.startswith("END") and not card[3:].strip():
+                        return cards, offset + (block + 1) * BLOCK_SIZE
+                    cards.append(card)
+            offset += blocks * BLOCK_SIZE
+            if len(data) < BLOCK_SIZE * _READ_BLOCKS:
+                raise ValueError(f"Missing END card in FITS header: {path}")
+
+
+def card_key(card: str) -> str:
+    """Returns the keyword of a card, with HIERARCH keywords unprefixed."""
+    if card.startswith("HIERARCH "):
+        return card[9:].split("=", 1)[0].strip()
+    return card[:8].strip()
+
+
+def _split_value(card: str) -> Optional[str]:
+    """Returns the value and comment part of a card, or None for commentary."""
+    if card.startswith("HIERARCH "):
+        if "=" not in card:
+            return None
+        return card.split("=", 1)[1]
+    if card[8:10] != "= ":
+        return None
+    return card[10:]
+
+
+def parse_value(text: str) -> Any:
+    """
+    Converts the value part of a card to a Python value the way astropy does:
+    strings without trailing spaces, T/F as booleans, ints and floats.
+    """
+    text = text.strip()
+    if text.startswith("'"):
+        chars = []
+        i = 1
+        while i < len(text):
+            if text[i] == "'":
+                if text[i + 1 : i + 2] == "'":
+                    chars.append("'")
+                    i += 2
+                    continue
+                break
+            chars.append(text[i])
+            i += 1
+        return "".join(chars).rstrip()
+
+    value = text.split("/", 1)[0].strip()
+    if value == "T":
+        return True
+    if value == "F":
+        return False
+    if not value:
+        return None
+    if _INT_RE.match(value):
+        return int(value)
+    try:
+        return float(value.replace("D", "E"))
+    except ValueError:
+        return value
+
+
+def parse_cards(
+    cards: Iterable[str], keys: Optional[Iterable[str]] = None
+) -> Dict[str, Any]:
+    """
+    Parses keyword values from raw cards. Only the first occurrence of a
+    keyword is kept, and long strings split over CONTINUE cards are joined.
+
+    Args:
+        cards (iterable): Raw 80-character cards.
+        keys (iterable): Keywords to parse. All keywords are parsed if omitted.
+
+    Returns:
+        dict: Values by upper-case keyword.
+    """
+    wanted = None if keys is None else {k.upper() for k in keys}
+    header: Dict[str, Any] = {}
+    last_key = None
+    for card in cards:
+        key = card_key(card)
+        if key == "CONTINUE" and last_key is not None:
+            previous = header[last_key]
+            if isinstance(previous, str) and previous.endswith("&"):
+                header[last_key] = previous[:-1] + str(parse_value(card[8:]))
+            continue
+        last_key = None
+        if key in header or (wanted is not None and key not in wanted):
+            continue
+        value_text = _split_value(card)
+        if value_text is None:
+            continue
+        header[key] = parse_value(value_text)
+        last_key = key
+        if wanted is not None and len(header) == len(wanted):
+            # Every requested key has been found, unless it is continued
+            if not (isinstance(header[key], str) and header[key].endswith("&")):
+                break
+    return header
+
+
+def continuation_end(cards: List[str], index: int) -> int:
+    """
+    Returns the index after the CONTINUE cards that continue the long string
+    value of cards[index], or index + 1 if its value is not continued.
+    """
+    end = index + 1
+    text = _split_value(cards[index])
+    while text is not None and end < len(cards) and card_key(cards[end]) == "CONTINUE":
+        value = parse_value(text)
+        if not (isinstance(value, str) and value.endswith("&")):
+            break
+        text = cards[end][8:]
+        end += 1
+    return end
+
+
+def is_xisf(path: str) -> bool:
+    """Returns True if path has an XISF file extension."""
+    return path.lower().endswith(".xisf")
+
+
+def read_primary_header(
+    path: str, keys: Optional[Iterable[str]] = None
+) -> Dict[str, Any]:
+    """
+    Reads keyword values from the primary header of a FITS file, or the FITS
+    keywords and properties of an XISF file, without touching image data.
+
+    Args:
+        path (str): Path to the FITS or XISF file.
+        keys (iterable): Keywords to read. All keywords are read if omitted.
+
+    Returns:
+        dict: Values by upper-case keyword. Missing keywords are left out.
+    """
+    if is_xisf(path):
+        from xisf_reader import read_xisf_header
+
+        return read_xisf_header(path, keys)
+    cards, _ = read_header_cards(path)
+    return parse_cards(cards, keys)
+
+
+def read_header_keys(path: str) -> List[str]:
+    """Returns the keywords of a FITS or XISF header in order."""
+    if is_xisf(path):
+        from xisf_reader import read_xisf_keys
+
+        return read_xisf_keys(path)
+    cards, _ = read_header_cards(path)
+    return [card_key(card) for card in cards]
+
+
+def card_comment(card: str) -> str:
+    """Returns the comment of a keyword or CONTINUE card, or an empty string."""
+    if card_key(card) == "CONTINUE":
+        value_text: Optional[str] = card[8:]
+    else:
+        value_text = _split_value(card)
+    if value_text is None:
+        return ""
+    text = value_text.strip()
+    if text.startswith("'"):
+        # Skip over the quoted string, where '' is an escaped quote
+        i = 1
+        while i < len(text):
+            if text[i] == "'":
+                if text[i + 1 : i + 2] == "'":
+                    i += 2
+                    continue
+                break
+            i += 1
+        text = text[i + 1 :]
+    if "/" not in text:
+        return ""
+    return text.split("/", 1)[1].strip()
+
+
+def _format_float(value: float) -> str:
+    """Formats a float in at most 20 characters, as astropy does."""
+    text = str(value).replace("e", "E")
+    if "." not in text and "E" not in text:
+        text += ".0"
+    elif "E" in text:
+        significand, exponent = text.split("E")
+        sign = exponent[0] if exponent[0] in "+-" else ""
+        text = f"{significand}E{sign}{int(exponent.lstrip('+-')):02d}"
+    if len(text) > 20:
+        idx = text.find("E")
+        if idx < 0:
+            text = text[:20]
+        else:
+            text = text[: 20 - (len(text) - idx)] + text[idx:]
+    return text
+
+
+def format_card(key: str, value: Any, comment: str = "") -> str:
+    """
+    Formats a keyword card in the FITS fixed format: strings start in column
+    11, other values are right-justified to column 30.
+
+    Args:
+        key (str): Keyword. Longer keywords are written as HIERARCH cards.
+        value: String, bool, int or finite float value.
+        comment (str): Card comment, truncated to fit the card.
+
+    Returns:
+        str: The 80-character card.
+    """
+    key = key.upper()
+    if isinstance(value, str):
+        escaped = value.replace("'", "''")
+        value_text = f"'{escaped:<8}'".ljust(20)
+    elif isinstance(value, bool):
+        value_text = f"{'T' if value else 'F':>20}"
+    elif isinstance(value, int):
+        value_text = f"{value:>20}"
+    elif isinstance(value, float):
+        if not math.isfinite(value):
+            # FITS has no representation for NaN or infinity
+            raise ValueError(f"Value of {key} is not a finite number: {value}")
+        value_text = f"{_format_float(value):>20}"
+    else:
+        raise ValueError(f"Unsupported value type for {key}: {type(value).__name__}")
+
+    if len(key) > 8 or " " in key:
+        card = f"HIERARCH {key} = {value_text.strip()}"
+    else:
+        card = f"{key:<8}= {value_text}"
+    if len(card) > CARD_SIZE:
+        raise ValueError(f"Value of {key} does not fit in a single card")
+    if comment:
+        card = f"{card} / {comment}"[:CARD_SIZE]
+    return f"{card:<{CARD_SIZE}}"
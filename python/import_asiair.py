@@ -0,0 +1,271 @@
+"""
+Imports FITS files from an ASIAIR memory stick.
+
+The stick is walked once and every file is classified as a Light, Bias, Dark
+or Flat frame, and lights by target, in the same pass. Files are copied on a
+CopyEngine thread pool and hashed while they are copied, so the SHA256SUMS
+file written into the target needs no second read of the data.
+
+Usage: python import_asiair.py <source> <target> [--jobs N] [--yes]
+       python import_asiair.py --verify <target>
+"""
+
+import argparse
+import hashlib
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from copy_engine import CHUNK_SIZE, CopyEngine, copy_and_hash, write_atomically
+from header_io import FRAME_EXTENSIONS
+
+FRAME_TYPES = ("Light", "Bias", "Dark", "Flat")
+CHECKSUM_FILE_NAME = "SHA256SUMS"
+
+# ASIAIR names lights Light_<target>_<exposure>s_Bin1_..., and the target may
+# contain spaces and underscores
+_LIGHT_NAME_RE = re.compile(r"^Light_(?P<target>.+?)_\d+(?:\.\d+)?s_", re.IGNORECASE)
+
+
+@dataclass
+class ImportPlan:
+    """Files found on the stick, with their destinations in the target."""
+
+    # (source, destination) pairs by frame type
+    files: Dict[str, List[Tuple[str, str]]] = field(
+        default_factory=lambda: {t: [] for t in FRAME_TYPES}
+    )
+    targets: List[str] = field(default_factory=list)
+    # Sources skipped because a file of the same name and size is imported,
+    # or is already in the target
+    duplicates: List[str] = field(default_factory=list)
+
+
+def _light_target(dirpath: str, file_name: str) -> str:
+    """ASIAIR stores lights in Light/<target>/; the name is the fallback."""
+    parent = os.path.basename(dirpath)
+    if os.path.basename(os.path.dirname(dirpath)).lower() == "light" and parent:
+        return parent
+    match = _LIGHT_NAME_RE.match(file_name)
+    return match.group("target") if match else "Unknown"
+
+
+def _taken_size(destination: str, planned: Dict[str, int]) -> Optional[int]:
+    """
+    Returns the size of the file planned for, or already at, destination, or
+    None if it is free.
+    """
+    if destination in planned:
+        return planned[destination]
+    if os.path.exists(destination):
+        return os.path.getsize(destination)
+    return None
+
+
+def plan_import(source_dir: str, target_dir: str) -> ImportPlan:
+    """
+    Walks the source once and classifies every FITS file by the frame type
+    prefix of its name. When a file maps to a destination that another file
+    of the stick or an earlier import already takes, a file of the same size
+    is taken for a copy and skipped, and any other file gets a numbered name,
+    so no copy writes to, or replaces, another file.
+
+    Args:
+        source_dir (str): Root folder of the ASIAIR memory stick.
+        target_dir (str): Folder to import into, with Light/<target>, Bias,
+            Dark and Flat subfolders.
+
+    Returns:
+        ImportPlan: The files to copy by frame type and the light targets.
+    """
+    plan = ImportPlan()
+    prefixes = {t.lower(): t for t in FRAME_TYPES}
+    targets = set()
+    # Size of the source planned for each destination
+    planned: Dict[str, int] = {}
+    for dirpath, dirnames, file_names in os.walk(source_dir):
+        dirnames.sort()
+        for file_name in sorted(file_names):
+            if file_name.startswith(".") or not file_name.lower().endswith(
+                FRAME_EXTENSIONS
+            ):
+                continue  # Skip non-FITS files and macOS resource forks
+            frame_type = prefixes.get(file_name.split("_", 1)[0].lower())
+            if frame_type is None:
+                continue
+            if frame_type == "Light":
+                target = _light_target(dirpath, file_name)
+                targets.add(target)
+                destination_dir = os.path.join(target_dir, "Light", target)
+            else:
+                destination_dir = os.path.join(target_dir, frame_type)
+            source = os.path.join(dirpath, file_name)
+            destination = os.path.join(destination_dir, file_name)
+            size = os.path.getsize(source)
+            taken = _taken_size(destination, planned)
+            if taken is not None:
+                if taken == size:
+                    plan.duplicates.append(source)
+                    continue
+                stem, extension = os.path.splitext(destination)
+                n = 1
+                while _taken_size(f"{stem}_{n}{extension}", planned) is not None:
+                    n += 1
+                destination = f"{stem}_{n}{extension}"
+            planned[destination] = size
+            plan.files[frame_type].append((source, destination))
+    plan.targets = sorted(targets)
+    return plan
+
+
+def read_checksums(target_dir: str) -> Dict[str, str]:
+    """Reads the SHA256SUMS file of a target, by relative path."""
+    checksums: Dict[str, str] = {}
+    path = os.path.join(target_dir, CHECKSUM_FILE_NAME)
+    if not os.path.exists(path):
+        return checksums
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            digest, _, name = line.rstrip("\n").partition("  ")
+            if name:
+                checksums[name] = digest
+    return checksums
+
+
+def write_checksums(target_dir: str, digests: Dict[str, str]) -> None:
+    """
+    Adds the digests of the copied files to the SHA256SUMS file of a target,
+    in the format sha256sum -c reads.
+    """
+    checksums = read_checksums(target_dir)
+    for destination, digest in digests.items():
+        checksums[os.path.relpath(destination, target_dir)] = digest
+    path = os.path.join(target_dir, CHECKSUM_FILE_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        for name in sorted(checksums):
+            f.write(f"{checksums[name]}  {name}\n")
+    os.replace(path + ".tmp", path)
+
+
+def verify_checksums(target_dir: str) -> int:
+    """
+    Re-reads every file listed in the SHA256SUMS file of a target.
+
+    Returns:
+        int: The number of missing or mismatching files.
+    """
+    failures = 0
+    for name, expected in read_checksums(target_dir).items():
+        path = os.path.join(target_dir, name)
+        digest = hashlib.sha256()
+        try:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+        except OSError as e:
+            print(f"{name}: {e}")
+            failures += 1
+            continue
+        if digest.hexdigest() != expected:
+            print(f"{name}: checksum mismatch")
+            failures += 1
+    return failures
+
+
+def import_files(plan: ImportPlan, target_dir: str, jobs: int = 4) -> int:
+    """
+    Copies the planned files and records their checksums.
+
+    Returns:
+        int: The number of files that could not be copied.
+    """
+    digests: Dict[str, str] = {}
+
+    def copy(source: str, destination: str) -> bool:
+        def write(source: str, tmp_path: str) -> None:
+            digests[destination] = copy_and_hash(source, tmp_path)
+
+        try:
+            write_atomically(write, source, destination)
+        except BaseException:
+            digests.pop(destination, None)
+            raise
+        return True
+
+    with CopyEngine(jobs=jobs) as engine:
+        for frame_type in FRAME_TYPES:
+            for source, destination in plan.files[frame_type]:
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                engine.submit(source, destination, copier=copy)
+    print(engine.summary())
+    write_checksums(target_dir, digests)
+    return engine.errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Import and organize FITS files from an ASIAIR memory stick."
+    )
+    parser.add_argument(
+        "source",
+        nargs="?",
+        help="root folder of the ASIAIR memory stick",
+    )
+    parser.add_argument("target", help="destination folder")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=4,
+        help="number of files to copy concurrently (default: 4)",
+    )
+    parser.add_argument(
+        "--yes",
+        "-y",
+        action="store_true",
+        help="do not ask for confirmation before copying",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help=f"only check the files in target against its {CHECKSUM_FILE_NAME}",
+    )
+    args = parser.parse_args()
+
+    if args.verify:
+        failures = verify_checksums(args.target)
+        print("All files verified" if not failures else f"{failures} files failed")
+        raise SystemExit(1 if failures else 0)
+    if args.source is None:
+        parser.error("the source folder is required")
+
+    plan = plan_import(args.source, args.target)
+    counts = {t: len(plan.files[t]) for t in FRAME_TYPES}
+    print(
+        f"Found {counts['Light']} light, {counts['Bias']} bias, {counts['Dark']} "
+        f"dark and {counts['Flat']} flat source images."
+    )
+    if plan.targets:
+        print("Targets: " + ", ".join(plan.targets))
+    if plan.duplicates:
+        print(
+            f"Skipping {len(plan.duplicates)} files whose name and size match "
+            "another file on the stick or in the target"
+        )
+    if not sum(counts.values()):
+        return
+    print(f"Copying to {args.target}")
+
+    answer = "y"
+    if not args.yes:
+        answer = input("Continue? [Y/n] ").strip().lower() or "y"
+    if answer != "y":
+        raise SystemExit(1)
+
+    os.makedirs(args.target, exist_ok=True)
+    if import_files(plan, args.target, args.jobs):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Timing, I/O and profiling instrumentation shared by the command-line scripts.
+
+Scripts add the common options with add_arguments() and run their work inside
+instrument(), which records the wall time of named phases, counts file opens
+and stat calls, and measures the bytes read and written by the script and
+the disk I/O of its worker processes. On exit it prints a
+report to stderr (--timings), writes it as JSON (--metrics-json PATH) and
+dumps cProfile statistics (--profile PATH). --quiet replaces per-file
+messages with a single progress line.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+# Seconds between redraws of a progress line
+_PROGRESS_INTERVAL = 0.25
+
+# Metrics that open and stat calls are counted into, while instrument() runs
+_active: Optional["Metrics"] = None
+_hook_installed = False
+
+# Number of running phases that count stat calls, and the functions they
+# replaced
+_stat_depth = 0
+_stat_lock = threading.Lock()
+_saved_stats: Tuple[Callable[..., Any], Callable[..., Any]] = (os.stat, os.lstat)
+
+_IO_KEYS = ("bytes_read", "bytes_written", "worker_disk_read", "worker_disk_written")
+
+
+def _io_counters() -> Dict[str, Optional[int]]:
+    """
+    Returns the bytes read and written so far by this process, and the disk
+    blocks read and written by its finished worker processes, in bytes. The
+    first include reads answered from the page cache and the second do not,
+    so they are reported apart. Values are None where the platform does not
+    report them (only Linux does).
+    """
+    counters: Dict[str, Optional[int]] = dict.fromkeys(_IO_KEYS)
+    try:
+        with open("/proc/self/io", "r") as f:
+            io = dict(line.split(": ") for line in f.read().splitlines())
+    except OSError:
+        return counters
+    import resource
+
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    counters["bytes_read"] = int(io["rchar"])
+    counters["bytes_written"] = int(io["wchar"])
+    counters["worker_disk_read"] = children.ru_inblock * 512
+    counters["worker_disk_written"] = children.ru_oublock * 512
+    return counters
+
+
+class Metrics:
+    """Wall time per phase and counters of one script run."""
+
+    def __init__(self) -> None:
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = {"opens": 0, "stats": 0}
+        self._lock = threading.Lock()
+        # Set by instrument() when stat calls are counted in phases
+        self.count_stats = False
+        self._started = time.perf_counter()
+        self._io_started = _io_counters()
+
+    @contextmanager
+    def phase(self, name: str, files: int = 0) -> Iterator[Dict[str, float]]:
+        """
+        Times a phase of the run. Phases with the same name add up.
+
+        Args:
+            name (str): Phase name shown in the report.
+            files (int): Number of files the phase handles, for files/s.
+
+        Yields:
+            dict: The phase record, whose "files" can still be added to.
+        """
+        with self._lock:
+            record = self.phases.setdefault(name, {"seconds": 0.0, "files": 0})
+            record["files"] += files
+        counting = _counting_stats() if self.count_stats else nullcontext()
+        start = time.perf_counter()
+        try:
+            with counting:
+                yield record
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                record["seconds"] += seconds
+
+    def count(self, name: str, n: int = 1) -> None:
+        """Adds n to a counter."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the metrics as a JSON-serializable dict."""
+        phases = {}
+        for name, phase in self.phases.items():
+            phases[name] = dict(phase)
+            if phase["files"] and phase["seconds"] > 0:
+                phases[name]["files_per_second"] = phase["files"] / phase["seconds"]
+        io = _io_counters()
+        for key, started in self._io_started.items():
+            value = io[key]
+            io[key] = None if value is None or started is None else value - started
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            "wall_seconds": time.perf_counter() - self._started,
+            "phases": phases,
+            **io,
+            **counters,
+        }
+
+    def report(self) -> str:
+        """Returns a human-readable report of the metrics."""
+        data = self.to_dict()
+        lines = [f"Total: {data['wall_seconds']:.2f}s"]
+        for name, phase in data["phases"].items():
+            line = f"  {name}: {phase['seconds']:.2f}s"
+            if "files_per_second" in phase:
+                line += (
+                    f", {phase['files']:.0f} files, "
+                    f"{phase['files_per_second']:.1f} files/s"
+                )
+            lines.append(line)
+        for key in _IO_KEYS:
+            value = data[key]
+            text = "n/a" if value is None else f"{value / (1024 * 1024):.1f} MB"
+            lines.append(f"{key.replace('_', ' ').capitalize()}: {text}")
+        counters = [
+            f"{key} {value}"
+            for key, value in data.items()
+            if isinstance(value, int) and key not in _IO_KEYS
+        ]
+        lines.append("Calls: " + ", ".join(counters))
+        return "\n".join(lines)
+
+
+class Progress:
+    """
+    A progress line on stderr that replaces per-file messages. It is redrawn
+    in place on a terminal and only printed when closed otherwise.
+    """
+
+    def __init__(self, label: str, total: Optional[int] = None) -> None:
+        self.label = label
+        self.total = total
+        self.done = 0
+        self._lock = threading.Lock()
+        self._tty = sys.stderr.isatty()
+        self._drawn = 0.0
+
+    def update(self, n: int = 1) -> None:
+        """Records n more finished items."""
+        with self._lock:
+            self.done += n
+            now = time.monotonic()
+            if self._tty and now - self._drawn >= _PROGRESS_INTERVAL:
+                self._drawn = now
+                sys.stderr.write(f"\r{self._text()}")
+                sys.stderr.flush()
+
+    def _text(self) -> str:
+        if self.total is None:
+            return f"{self.label}: {self.done}"
+        return f"{self.label}: {self.done}/{self.total}"
+
+    def close(self) -> None:
+        """Prints the final count."""
+        with self._lock:
+            prefix = "\r" if self._tty else ""
+            sys.stderr.write(f"{prefix}{self._text()}\n")
+            sys.stderr.flush()
+
+
+def add_arguments(parser: argparse.ArgumentParser, quiet: bool = True) -> None:
+    """
+    Adds --timings, --metrics-json and --profile to a parser, and --quiet
+    for scripts that print a message per file.
+    """
+    group = parser.add_argument_group("instrumentation")
+    group.add_argument(
+        "--timings",
+        action="store_true",
+        help="print the time of each phase, files/s, bytes read and written and "
+        "file open and stat counts to stderr",
+    )
+    group.add_argument(
+        "--metrics-json",
+        metavar="PATH",
+        help="write the same metrics to a JSON file",
+    )
+    group.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="write cProfile statistics to PATH, e.g. for python -m pstats",
+    )
+    if quiet:
+        group.add_argument(
+            "--quiet",
+            action="store_true",
+            help="show a progress line instead of a message per file",
+        )
+
+
+def _audit(event: str, args: Tuple[Any, ...]) -> None:
+    if event == "open" and _active is not None:
+        _active.count("opens")
+
+
+def _counted(function: Callable[..., Any]) -> Callable[..., Any]:
+    @wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if _active is not None:
+            _active.count("stats")
+        return function(*args, **kwargs)
+
+    return wrapper
+
+
+@contextmanager
+def _counting_stats() -> Iterator[None]:
+    """
+    Counts os.stat and os.lstat calls while the block runs. Python raises no
+    audit event for them, so they are wrapped, but only while a timed phase
+    is running: the first phase to start replaces them and the last one to
+    end puts the originals back.
+    """
+    global _saved_stats, _stat_depth
+    with _stat_lock:
+        if _stat_depth == 0:
+            _saved_stats = os.stat, os.lstat
+            os.stat, os.lstat = _counted(os.stat), _counted(os.lstat)
+        _stat_depth += 1
+    try:
+        yield
+    finally:
+        with _stat_lock:
+            _stat_depth -= 1
+            if _stat_depth == 0:
+                os.stat, os.lstat = _saved_stats
+
+
+@contextmanager
+def phase(name: str, files: int = 0) -> Iterator[Dict[str, float]]:
+    """
+    Times a phase of the running instrument() block, so library functions can
+    report phases without being passed the metrics. Does nothing otherwise.
+    """
+    if _active is None:
+        yield {"seconds": 0.0, "files": files}
+        return
+    with _active.phase(name, files) as record:
+        yield record
+
+
+@contextmanager
+def instrument(args: argparse.Namespace) -> Iterator[Metrics]:
+    """
+    Collects metrics while the block runs, as requested by the options added
+    with add_arguments(). Open calls are counted in this process by an audit
+    hook, and stat calls in the timed phases of this process, so run with
+    one job to include the work done in worker processes. The report is also
+    written when the block exits with an error.
+    """
+    global _active, _hook_installed
+    metrics = Metrics()
+    enabled = args.timings or args.metrics_json
+    if enabled:
+        if not _hook_installed:
+            # Audit hooks cannot be removed, so one hook serves every run
+            sys.addaudithook(_audit)
+            _hook_installed = True
+        metrics.count_stats = True
+        _active = metrics
+    profiler = None
+    if args.profile:
+        # Imported here, like json, to keep startup fast for fits_header.py
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield metrics
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"Profile written to {args.profile}", file=sys.stderr)
+        if enabled:
+            _active = None
+            if args.timings:
+                print(metrics.report(), file=sys.stderr)
+            if args.metrics_json:
+                import json
+
+                with open(args.metrics_json, "w") as f:
+                    json.dump(metrics.to_dict(), f, indent=2)
+                    f.write("\n")
+
+
+def progress(
+    args: argparse.Namespace, label: str, total: Optional[int] = None
+) -> Optional[Progress]:
+    """Returns a progress line if --quiet was given, otherwise None."""
+    return Progress(label, total) if getattr(args, "quiet", False) else None
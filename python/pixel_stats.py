@@ -0,0 +1,206 @@
+"""
+Memory-mapped pixel statistics for FITS and XISF frames.
+
+The primary image is memory-mapped straight from the file (at the data offset
+found by header_io for FITS, or the attachment position of an XISF image) and
+read in row chunks of a strided subsample, so only a fraction of a
+26-megapixel frame is paged in and memory per worker stays small.
+"""
+
+import math
+import xml.etree.ElementTree as ET
+from typing import Dict, Tuple
+
+import numpy as np
+from frame_quality import MAD_SCALE
+from header_io import is_xisf, parse_cards, read_header_cards
+
+PIXEL_COLUMNS = ["PixelMedian", "PixelNoise", "PixelSaturated", "PixelGradient"]
+
+# Pixels at or above this fraction of full scale count as saturated
+SATURATION_LEVEL = 0.98
+
+# The background gradient is measured on a grid of this many tiles per side
+GRADIENT_GRID = 8
+
+_CHUNK_ROWS = 256
+
+_FITS_DTYPES = {8: "u1", 16: ">i2", 32: ">i4", 64: ">i8", -32: ">f4", -64: ">f8"}
+
+_XISF_DTYPES = {
+    "UInt8": "u1",
+    "UInt16": "u2",
+    "UInt32": "u4",
+    "Float32": "f4",
+    "Float64": "f8",
+}
+
+_XISF_NS = "{http://www.pixinsight.com/xisf}"
+
+
+Image = Tuple[np.ndarray, float, float, float]
+
+
+def _map_fits(path: str) -> Image:
+    """Returns the memory-mapped primary image, BSCALE, BZERO and full scale."""
+    cards, offset = read_header_cards(path)
+    header = parse_cards(
+        cards, ["BITPIX", "NAXIS", "NAXIS1", "NAXIS2", "BZERO", "BSCALE"]
+    )
+    if header.get("NAXIS", 0) < 2 or header.get("BITPIX") not in _FITS_DTYPES:
+        return _open_fits_astropy(path)
+    dtype = np.dtype(_FITS_DTYPES[header["BITPIX"]])
+    shape = (header["NAXIS2"], header["NAXIS1"])
+    data = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape)
+    bscale = float(header.get("BSCALE", 1.0))
+    bzero = float(header.get("BZERO", 0.0))
+    if dtype.kind == "f":
+        full_scale = np.nan  # Unknown, e.g. calibrated frames
+    else:
+        full_scale = np.iinfo(dtype).max * bscale + bzero
+    return data, bscale, bzero, full_scale
+
+
+def _open_fits_astropy(path: str) -> Image:
+    """
+    Falls back to astropy for FITS files whose image is not in the primary
+    HDU, e.g. tile-compressed FITS. Scaling is applied by astropy.
+    """
+    from astropy.io import fits
+
+    with fits.open(path, memmap=True) as hdul:
+        for hdu in hdul:
+            if hdu.data is not None and hdu.data.ndim >= 2:
+                data = hdu.data
+                while data.ndim > 2:
+                    data = data[0]
+                full_scale = np.nan
+                if hdu.header.get("BITPIX") == 16:
+                    full_scale = 65535.0 if hdu.header.get("BZERO") else 32767.0
+                return data, 1.0, 0.0, full_scale
+    raise ValueError(f"No image in FITS file: {path}")
+
+
+def _map_xisf(path: str) -> Image:
+    """Returns the first channel of the first image of an XISF file."""
+    from xisf_reader import read_xisf_xml
+
+    image = next(read_xisf_xml(path).iter(f"{_XISF_NS}Image"), None)
+    if image is None:
+        raise ValueError(f"No image in XISF file: {path}")
+    if image.get("compression"):
+        raise ValueError(f"Compressed XISF images are not supported: {path}")
+    location = image.get("location", "").split(":")
+    sample_format = image.get("sampleFormat", "")
+    if location[0] != "attachment" or sample_format not in _XISF_DTYPES:
+        raise ValueError(f"Unsupported XISF image storage: {path}")
+
+    width, height = (int(v) for v in image.get("geometry", "").split(":")[:2])
+    dtype = np.dtype(_XISF_DTYPES[sample_format])
+    if image.get("byteOrder") == "big":
+        dtype = dtype.newbyteorder(">")
+    # Planar pixel storage: the first channel comes first
+    data = np.memmap(
+        path, dtype=dtype, mode="r", offset=int(location[1]), shape=(height, width)
+    )
+    if dtype.kind == "f":
+        full_scale = _xisf_float_scale(image)
+    else:
+        full_scale = float(np.iinfo(dtype).max)
+    return data, 1.0, 0.0, full_scale
+
+
+def _xisf_float_scale(image: ET.Element) -> float:
+    """Floating point XISF images are normalized to [0, 1] unless bounded."""
+    bounds = image.get("bounds")
+    if bounds:
+        return float(bounds.split(":")[1])
+    return 1.0
+
+
+def map_image(path: str) -> Image:
+    """
+    Memory-maps the primary image of a FITS or XISF file.
+
+    Returns:
+        tuple: The 2-D raw pixel array (first channel of a color image),
+        BSCALE, BZERO and the full-scale physical value, NaN if unknown.
+    """
+    if is_xisf(path):
+        return _map_xisf(path)
+    return _map_fits(path)
+
+
+def read_subsample(path: str, stride: int = 4) -> Tuple[np.ndarray, float]:
+    """
+    Reads every stride-th pixel of every stride-th row in chunks of rows,
+    scaled to physical values.
+
+    Returns:
+        tuple: The subsample and the full-scale value, NaN if unknown.
+    """
+    data, bscale, bzero, full_scale = map_image(path)
+    rows = []
+    step = _CHUNK_ROWS * stride
+    for start in range(0, data.shape[0], step):
+        chunk = np.asarray(data[start : start + step : stride, ::stride], np.float32)
+        if bscale != 1.0:
+            chunk *= bscale
+        if bzero:
+            chunk += bzero
+        rows.append(chunk)
+    del data
+    sample = np.concatenate(rows) if rows else np.zeros((0, 0), np.float32)
+    return sample, full_scale
+
+
+def pixel_stats(path: str, stride: int = 4) -> Dict[str, float]:
+    """
+    Computes image statistics from a strided subsample of the primary image.
+
+    Returns:
+        dict: PixelMedian, the median; PixelNoise, the MAD noise estimate
+        from differences of neighbouring samples; PixelSaturated, the fraction of
+        pixels at or above 98% of full scale; PixelGradient, the spread of
+        the background over an 8x8 grid of tiles as a fraction of the median.
+    """
+    sample, full_scale = read_subsample(path, stride)
+    finite = sample[np.isfinite(sample)]
+    if not finite.size:
+        raise ValueError(f"No valid pixels: {path}")
+
+    median = float(np.median(finite))
+    # MAD of the differences between neighbouring samples, so that gradients
+    # and nebulosity do not count as noise
+    diffs = np.diff(sample, axis=1)
+    diffs = diffs[np.isfinite(diffs)]
+    noise = np.nan
+    if diffs.size:
+        spread = np.median(np.abs(diffs - np.median(diffs)))
+        noise = MAD_SCALE * float(spread) / math.sqrt(2)
+    if np.isnan(full_scale):
+        saturated = np.nan
+    else:
+        saturated = float(np.count_nonzero(finite >= SATURATION_LEVEL * full_scale))
+        saturated /= finite.size
+
+    # Background per tile, ignoring the incomplete tiles at the edges
+    height, width = sample.shape
+    tile_h, tile_w = height // GRADIENT_GRID, width // GRADIENT_GRID
+    gradient = np.nan
+    if tile_h and tile_w and median:
+        tiles = sample[: tile_h * GRADIENT_GRID, : tile_w * GRADIENT_GRID].reshape(
+            GRADIENT_GRID, tile_h, GRADIENT_GRID, tile_w
+        )
+        backgrounds = np.nanmedian(
+            tiles.transpose(0, 2, 1, 3).reshape(GRADIENT_GRID * GRADIENT_GRID, -1),
+            axis=1,
+        )
+        gradient = float((backgrounds.max() - backgrounds.min()) / median)
+
+    return {
+        "PixelMedian": round(median, 4),
+        "PixelNoise": round(noise, 4),
+        "PixelSaturated": round(saturated, 6),
+        "PixelGradient": round(gradient, 4),
+    }
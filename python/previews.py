@@ -0,0 +1,387 @@
+"""
+Stretched PNG previews and contact sheets of LIGHT frames.
+
+Each frame is memory-mapped and only every n-th row is read, so about 1/n
+of it leaves the disk (a selected row is paged in whole, even though only
+every n-th pixel of it is kept), then auto-stretched like a screen transfer
+function and written as an 8-bit grayscale PNG with NumPy and zlib. Frames
+are rendered on a process pool, and a preview is only rendered again when its
+frame is newer or it was rendered with other settings, so rerunning over a
+night is free. Contact sheets are likewise only tiled again when a preview,
+the columns or the set of frames changed.
+
+Usage: python previews.py <session_directory or frames...> [--output DIR]
+       [--size PX] [--contact-sheet] [--jobs N]
+"""
+
+import argparse
+import hashlib
+import math
+import os
+import struct
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from frame_names import parse_frame_name
+from frame_quality import MAD_SCALE
+from header_io import FRAME_EXTENSIONS, read_primary_header
+from instrumentation import add_arguments, instrument
+from pixel_stats import map_image
+
+PREVIEW_DIR_NAME = "previews"
+
+# Auto stretch: the background is clipped this many MADs below the median
+# and the median is moved to this brightness
+SHADOWS_CLIP = 2.8
+TARGET_BACKGROUND = 0.25
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# PNG text keyword of the settings a preview or contact sheet was made with
+_SETTINGS_KEYWORD = "Preview settings"
+
+
+def render_settings(size: int) -> str:
+    """
+    Returns the settings that determine a preview, which are stored in it so
+    that it is rendered again when they change.
+    """
+    return f"size={size} shadows={SHADOWS_CLIP} background={TARGET_BACKGROUND}"
+
+
+def sheet_settings(preview_paths: List[str], columns: int) -> str:
+    """
+    Returns the settings that determine a contact sheet: its columns and the
+    previews it tiles, in order.
+    """
+    names = "\n".join(os.path.basename(path) for path in preview_paths)
+    digest = hashlib.sha256(names.encode("utf-8")).hexdigest()[:16]
+    return f"columns={columns} frames={len(preview_paths)}:{digest}"
+
+
+def read_decimated(path: str, size: int) -> np.ndarray:
+    """
+    Reads every n-th pixel of every n-th row of the primary image, with n
+    chosen so that the longer side is at most size pixels. n is even for
+    Bayer frames (BAYERPAT), so that all pixels are of the same color.
+
+    Returns:
+        ndarray: The decimated image, normalized to full scale when known.
+    """
+    data, bscale, bzero, full_scale = map_image(path)
+    stride = max(1, math.ceil(max(data.shape) / size))
+    if stride % 2 and "BAYERPAT" in read_primary_header(path, ["BAYERPAT"]):
+        stride += 1
+    image = np.asarray(data[::stride, ::stride], np.float32)
+    del data
+    if bscale != 1.0:
+        image *= bscale
+    if bzero:
+        image += bzero
+    if not np.isnan(full_scale) and full_scale > 0:
+        image /= full_scale
+    return image
+
+
+def _mtf(midtones: float, x: np.ndarray) -> np.ndarray:
+    """Midtones transfer function: maps midtones to 0.5, keeps 0 and 1."""
+    return (midtones - 1) * x / ((2 * midtones - 1) * x - midtones)
+
+
+def stretch(image: np.ndarray) -> np.ndarray:
+    """
+    Auto-stretches an image to 8 bits: the shadows are clipped below the
+    background and a midtones transfer function brings the median to
+    TARGET_BACKGROUND.
+    """
+    finite = image[np.isfinite(image)]
+    if not finite.size:
+        return np.zeros(image.shape, np.uint8)
+    low, high = float(finite.min()), float(finite.max())
+    if high <= low:
+        return np.zeros(image.shape, np.uint8)
+    if high > 1 or low < 0:
+        # Unknown full scale, e.g. calibrated float frames
+        image = (image - low) / (high - low)
+        finite = (finite - low) / (high - low)
+
+    median = float(np.median(finite))
+    mad = MAD_SCALE * float(np.median(np.abs(finite - median)))
+    shadows = min(max(0.0, median - SHADOWS_CLIP * mad), 0.99)
+    stretched = np.clip((np.nan_to_num(image) - shadows) / (1 - shadows), 0, 1)
+    background = median - shadows
+    if 0 < background < 1:
+        midtones = float(_mtf(TARGET_BACKGROUND, np.asarray(background)))
+        stretched = _mtf(midtones, stretched)
+    pixels: np.ndarray = np.round(stretched * 255).astype(np.uint8)
+    return pixels
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(data))
+        + kind
+        + data
+        + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+    )
+
+
+def _png_chunks(data: bytes) -> Iterator[Tuple[bytes, bytes]]:
+    """Yields the type and data of the chunks of a PNG file."""
+    if data[:8] != _PNG_SIGNATURE:
+        raise ValueError("Not a PNG file")
+    offset = 8
+    while offset < len(data):
+        (length,) = struct.unpack(">I", data[offset : offset + 4])
+        yield data[offset + 4 : offset + 8], data[offset + 8 : offset + 8 + length]
+        offset += 12 + length
+
+
+def encode_png(image: np.ndarray, text: Optional[Dict[str, str]] = None) -> bytes:
+    """Encodes a 2-D uint8 array as a grayscale PNG with optional tEXt chunks."""
+    height, width = image.shape
+    # Every scanline starts with filter type 0 (none)
+    rows = np.zeros((height, width + 1), np.uint8)
+    rows[:, 1:] = image
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    texts = b"".join(
+        _png_chunk(b"tEXt", f"{key}\0{value}".encode("latin-1"))
+        for key, value in (text or {}).items()
+    )
+    return (
+        _PNG_SIGNATURE
+        + _png_chunk(b"IHDR", header)
+        + texts
+        + _png_chunk(b"IDAT", zlib.compress(rows.tobytes(), 6))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def png_text(data: bytes) -> Dict[str, str]:
+    """Returns the tEXt keywords and values of a PNG file."""
+    text = {}
+    for kind, chunk in _png_chunks(data):
+        if kind == b"tEXt":
+            key, _, value = chunk.decode("latin-1").partition("\0")
+            text[key] = value
+    return text
+
+
+def decode_png(data: bytes) -> np.ndarray:
+    """Decodes a grayscale PNG written by encode_png."""
+    idat = b""
+    width = height = 0
+    for kind, chunk in _png_chunks(data):
+        if kind == b"IHDR":
+            width, height, depth, color, _, _, interlace = struct.unpack(
+                ">IIBBBBB", chunk
+            )
+            if (depth, color, interlace) != (8, 0, 0):
+                raise ValueError("Only 8-bit grayscale PNGs are supported")
+        elif kind == b"IDAT":
+            idat += chunk
+    rows = np.frombuffer(zlib.decompress(idat), np.uint8).reshape(height, width + 1)
+    if rows[:, 0].any():
+        raise ValueError("Only unfiltered PNGs are supported")
+    return rows[:, 1:]
+
+
+def make_preview(task: Tuple[str, str, int]) -> Optional[str]:
+    """
+    Renders the preview of one frame, unless one newer than the frame was
+    rendered with the same settings.
+
+    Returns:
+        str: None if the preview was rendered, "cached" if it was up to
+        date, or an error message.
+    """
+    path, preview_path, size = task
+    settings = render_settings(size)
+    try:
+        if os.path.getmtime(preview_path) >= os.path.getmtime(path):
+            with open(preview_path, "rb") as f:
+                if png_text(f.read()).get(_SETTINGS_KEYWORD) == settings:
+                    return "cached"
+    except (OSError, ValueError):
+        pass  # No preview yet, or an unreadable one
+    try:
+        image = stretch(read_decimated(path, size))
+        png = encode_png(image, {_SETTINGS_KEYWORD: settings})
+        tmp_path = preview_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(png)
+        os.replace(tmp_path, preview_path)
+    except (OSError, ValueError) as e:
+        return f"Error previewing {path}: {e}"
+    return None
+
+
+def find_light_frames(paths: List[str]) -> Dict[str, List[str]]:
+    """
+    Returns the LIGHT frames among the given files and the files in the given
+    directories, by target.
+    """
+    frames: Dict[str, List[str]] = {}
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(os.listdir(path))
+            files = [os.path.join(path, name) for name in names]
+        else:
+            files = [path]
+        for file_path in files:
+            if not file_path.lower().endswith(FRAME_EXTENSIONS):
+                continue
+            try:
+                frame = parse_frame_name(os.path.basename(file_path))
+            except ValueError:
+                continue
+            if frame.frame_type == "LIGHT":
+                frames.setdefault(frame.target, []).append(file_path)
+    return frames
+
+
+def contact_sheet(
+    preview_paths: List[str], columns: int = 6, thumbnail: int = 192
+) -> np.ndarray:
+    """
+    Tiles previews, decimated to at most thumbnail pixels, in rows of columns
+    thumbnails with a 4-pixel gap, in the order given.
+    """
+    gap = 4
+    thumbnails = []
+    for path in preview_paths:
+        with open(path, "rb") as f:
+            image = decode_png(f.read())
+        stride = max(1, math.ceil(max(image.shape) / thumbnail))
+        thumbnails.append(image[::stride, ::stride])
+    cell_h = max(t.shape[0] for t in thumbnails)
+    cell_w = max(t.shape[1] for t in thumbnails)
+    columns = min(columns, len(thumbnails))
+    rows = math.ceil(len(thumbnails) / columns)
+    sheet = np.zeros(
+        (rows * (cell_h + gap) + gap, columns * (cell_w + gap) + gap), np.uint8
+    )
+    for i, image in enumerate(thumbnails):
+        top = gap + (i // columns) * (cell_h + gap)
+        left = gap + (i % columns) * (cell_w + gap)
+        sheet[top : top + image.shape[0], left : left + image.shape[1]] = image
+    return sheet
+
+
+def write_contact_sheets(
+    output: str, previews: Dict[str, List[str]], columns: int
+) -> None:
+    """
+    Writes a <target>.png contact sheet of the previews of each target into
+    output, unless one newer than all of them was tiled with the same
+    columns from the same previews.
+    """
+    for target, paths in previews.items():
+        paths = [p for p in paths if os.path.exists(p)]
+        if not paths:
+            continue
+        sheet_path = os.path.join(output, f"{target}.png")
+        settings = sheet_settings(paths, columns)
+        newest = max(os.path.getmtime(p) for p in paths)
+        try:
+            if os.path.getmtime(sheet_path) >= newest:
+                with open(sheet_path, "rb") as f:
+                    if png_text(f.read()).get(_SETTINGS_KEYWORD) == settings:
+                        continue
+        except (OSError, ValueError):
+            pass  # No contact sheet yet, or an unreadable one
+        png = encode_png(contact_sheet(paths, columns), {_SETTINGS_KEYWORD: settings})
+        tmp_path = sheet_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(png)
+        os.replace(tmp_path, sheet_path)
+        print(f"Wrote contact sheet {sheet_path}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Create stretched PNG previews of LIGHT frames."
+    )
+    parser.add_argument(
+        "paths", nargs="+", help="session directories or frames to preview"
+    )
+    parser.add_argument(
+        "--output",
+        help=f"directory for the previews (default: {PREVIEW_DIR_NAME}/ in the "
+        "first session directory, or next to the first frame)",
+    )
+    parser.add_argument(
+        "--size",
+        type=int,
+        default=512,
+        metavar="PX",
+        help="maximum width and height of a preview (default: 512)",
+    )
+    parser.add_argument(
+        "--contact-sheet",
+        action="store_true",
+        help="also tile the previews of each target into <target>.png",
+    )
+    parser.add_argument(
+        "--columns",
+        type=int,
+        default=6,
+        help="with --contact-sheet, previews per row (default: 6)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of worker processes (default: number of CPUs)",
+    )
+    add_arguments(parser, quiet=False)
+    args = parser.parse_args()
+
+    if args.size < 8:
+        parser.error("--size must be at least 8")
+    frames = find_light_frames(args.paths)
+    if not frames:
+        print("No LIGHT frames found")
+        return
+    first = args.paths[0]
+    output = args.output or os.path.join(
+        first if os.path.isdir(first) else os.path.dirname(first), PREVIEW_DIR_NAME
+    )
+
+    tasks = []
+    previews: Dict[str, List[str]] = {}
+    for target, paths in sorted(frames.items()):
+        target_dir = os.path.join(output, target)
+        os.makedirs(target_dir, exist_ok=True)
+        for path in paths:
+            name = os.path.splitext(os.path.basename(path))[0] + ".png"
+            preview_path = os.path.join(target_dir, name)
+            tasks.append((path, preview_path, args.size))
+            previews.setdefault(target, []).append(preview_path)
+
+    with instrument(args) as metrics:
+        with metrics.phase("render", len(tasks)):
+            if args.jobs > 1 and len(tasks) > 1:
+                with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+                    results = list(executor.map(make_preview, tasks, chunksize=4))
+            else:
+                results = list(map(make_preview, tasks))
+        errors = [r for r in results if r not in (None, "cached")]
+        for error in errors:
+            print(error)
+        rendered = results.count(None)
+        print(
+            f"Rendered {rendered} previews, {results.count('cached')} up to date, "
+            f"{len(errors)} failed, in {output}"
+        )
+        if args.contact_sheet:
+            with metrics.phase("contact sheets", len(previews)):
+                write_contact_sheets(output, previews, args.columns)
+    if errors:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
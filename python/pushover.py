@@ -0,0 +1,221 @@
+"""
+Resilient Pushover delivery.
+
+Reuses one HTTP connection for all messages, retries transient failures with
+exponential backoff, splits long messages at Pushover's 1024-character limit
+and keeps undeliverable messages in an on-disk spool that is flushed before
+the next message is sent.
+"""
+
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import requests
+
+PUSHOVER_URL = "https://api.pushover.net/1/messages.json"
+MESSAGE_LIMIT = 1024
+TITLE_LIMIT = 250
+
+
+def split_message(message: str, limit: int = MESSAGE_LIMIT) -> List[str]:
+    """
+    Splits a message into parts of at most limit characters, breaking at line
+    ends where possible.
+    """
+    parts: List[str] = []
+    current = ""
+    for line in message.splitlines(keepends=True):
+        while len(line) > limit:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:limit])
+            line = line[limit:]
+        if len(current) + len(line) > limit:
+            parts.append(current)
+            current = ""
+        current += line
+    if current or not parts:
+        parts.append(current)
+    return [part.rstrip("\n") for part in parts]
+
+
+class PushoverClient:
+    """
+    Sends Pushover messages over a shared requests.Session.
+
+    Args:
+        token (str): Pushover application token.
+        user (str): Pushover user key.
+        url (str): Messages endpoint, e.g. a local stub for testing.
+        spool_path (str): JSON Lines file keeping messages that could not be
+            delivered. Failed messages are dropped if omitted.
+        retries (int): Retries of a transient failure before spooling.
+        backoff (float): Seconds before the first retry, doubled every retry.
+        timeout (float): Seconds to wait for each request.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        user: str,
+        url: str = PUSHOVER_URL,
+        spool_path: Optional[str] = None,
+        retries: int = 4,
+        backoff: float = 1.0,
+        timeout: float = 10,
+    ):
+        self.token = token
+        self.user = user
+        self.url = url
+        self.spool_path = spool_path
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _post(self, data: Dict[str, str], retries: int) -> Optional[bool]:
+        """
+        Posts one message.
+
+        Returns:
+            True if it was delivered, False if Pushover rejected it, or None
+            if it could not be delivered because of a transient error.
+        """
+        payload = dict(data, token=self.token, user=self.user)
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                response = self.session.post(
+                    self.url, data=payload, timeout=self.timeout
+                )
+            except requests.exceptions.RequestException as e:
+                print(f"❌ Network error sending Pushover notification: {e}")
+                continue
+            if response.status_code == 429 or response.status_code >= 500:
+                print(f"❌ Pushover unavailable (HTTP {response.status_code})")
+                continue
+            try:
+                result = response.json()
+            except ValueError:
+                result = {"status": 0, "errors": [response.text[:200]]}
+            if response.ok and result.get("status") == 1:
+                return True
+            print(f"❌ Pushover API error: {result}")
+            return False
+        return None
+
+    def _spool(self, messages: List[Dict[str, str]]) -> None:
+        if not self.spool_path:
+            return
+        with open(self.spool_path, "a") as spool:
+            for data in messages:
+                spool.write(json.dumps(data) + "\n")
+
+    def flush_spool(self, retries: Optional[int] = None) -> int:
+        """
+        Sends spooled messages in order, stopping at the first one that still
+        cannot be delivered.
+
+        Returns:
+            int: Number of spooled messages delivered.
+        """
+        if not self.spool_path or not os.path.exists(self.spool_path):
+            return 0
+        with open(self.spool_path, "r") as spool:
+            pending = [json.loads(line) for line in spool if line.strip()]
+
+        sent = 0
+        while sent < len(pending):
+            result = self._post(
+                pending[sent], self.retries if retries is None else retries
+            )
+            if result is None:
+                break
+            sent += 1  # Delivered, or rejected and not worth keeping
+
+        remaining = pending[sent:]
+        if remaining:
+            directory = os.path.dirname(os.path.abspath(self.spool_path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as spool:
+                for data in remaining:
+                    spool.write(json.dumps(data) + "\n")
+            os.replace(tmp_path, self.spool_path)
+        else:
+            os.unlink(self.spool_path)
+        if sent:
+            print(f"📤 Sent {sent} spooled Pushover messages")
+        return sent
+
+    def has_spooled(self) -> bool:
+        """Returns True if messages are waiting in the spool."""
+        return bool(self.spool_path) and os.path.exists(str(self.spool_path))
+
+    def send(
+        self,
+        message: str,
+        title: str,
+        priority: int = 0,
+        retries: Optional[int] = None,
+    ) -> bool:
+        """
+        Sends a message, split into several if it is too long. Messages still
+        waiting in the spool are sent first, so the order is preserved.
+
+        Args:
+            message (str): Message text.
+            title (str): Message title.
+            priority (int): Pushover priority.
+            retries (int): Retries of a transient failure, for the spooled
+                messages and this one. Defaults to the client's retries; 0
+                spools the message at once while the uplink is down.
+
+        Returns:
+            bool: True if every part was delivered. Parts that failed with a
+            transient error are spooled.
+        """
+        parts = split_message(message)
+        messages = []
+        for i, part in enumerate(parts, 1):
+            part_title = title if len(parts) == 1 else f"{title} ({i}/{len(parts)})"
+            messages.append(
+                {
+                    "message": part,
+                    "title": part_title[:TITLE_LIMIT],
+                    "priority": str(priority),
+                }
+            )
+
+        if retries is None:
+            retries = self.retries
+        self.flush_spool(retries)
+        if self.has_spooled():
+            # The uplink is still down, queue up behind the older messages
+            self._spool(messages)
+            print("📥 Pushover unreachable, message spooled for the next run")
+            return False
+
+        delivered = True
+        for i, data in enumerate(messages):
+            result = self._post(data, retries)
+            if result is None:
+                self._spool(messages[i:])
+                if self.spool_path:
+                    print("📥 Pushover unreachable, message spooled for the next run")
+                return False
+            delivered = delivered and result
+        return delivered
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> "PushoverClient":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
@@ -2,64 +2,309 @@
 """
 Session Report Generator for Astrophotography
 
-Analyzes the latest imaging session directory and sends a summary
-via Pushover push notification. Works with .xisf files and CSV metadata.
+Analyzes the latest imaging session directory, or every session in a date
+range, and sends a summary via Pushover push notification. Works with .xisf
+files and CSV metadata.
 
 Usage: python session_report.py <root_directory> <pushover_token> <pushover_user>
+       [--all | --since YYYY-MM-DD] [--until YYYY-MM-DD] [--jobs N]
+       [--watch [--poll-interval SECONDS] [--summary-interval MINUTES]]
 """
 
+import argparse
 import csv
-import glob
+import json
+import os
+import re
 import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from dataclasses import asdict
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
 
-import requests
+from frame_names import parse_frame_name
+from frame_quality import (
+    DEFAULT_THRESHOLD,
+    FrameQuality,
+    QualityGroup,
+    analyze_quality,
+    load_metadata,
+    merge_groups,
+    write_reject_list,
+)
+from instrumentation import Metrics, Progress, add_arguments, instrument, progress
+from previews import PREVIEW_DIR_NAME
+from pushover import PUSHOVER_URL, PushoverClient
+from weather_join import WEATHER_METRICS, correlate_weather, correlation, merge_sums
+
+# Per-session analysis cache, invalidated by CSV and directory mtimes and by
+# the outlier threshold of the frame quality summary it includes
+SUMMARY_CACHE_NAME = ".session_report_cache.json"
+SUMMARY_CACHE_VERSION = 5
+
+# CSV files whose contents feed the analysis
+SESSION_CSV_FILES = ["ImageMetaData.csv", "AcquisitionDetails.csv", "WeatherData.csv"]
+
+# Undelivered Pushover messages, kept in the root directory by default
+PUSHOVER_SPOOL_NAME = ".pushover_spool.jsonl"
+
+_SESSION_DIR_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+# Watch mode: metrics checked for degradation, frames forming the baseline of
+# the night and the recent window compared to it, and the minimum time
+# between two alerts for the same metric, target and filter
+WATCH_METRICS = ("HFR", "GuidingRMSArcSec")
+WATCH_BASELINE_FRAMES = 10
+WATCH_WINDOW_FRAMES = 5
+WATCH_DEGRADE_FACTOR = 1.3
+WATCH_ALERT_INTERVAL = 30 * 60
+
+_FRAME_PREFIXES = (
+    ("LIGHT_", "Light"),
+    ("DARK_", "Dark"),
+    ("BIAS_", "Bias"),
+    ("FLAT_", "Flat"),
+)
 
 
 def find_latest_session_directory(root_dir: str) -> Optional[Path]:
     """Find the latest session directory with YYYY-MM-DD format."""
-    root_path = Path(root_dir)
-    if not root_path.exists():
+    if not os.path.isdir(root_dir):
         print(f"Error: Root directory '{root_dir}' does not exist")
         return None
 
     # Look for directories matching YYYY-MM-DD pattern
-    date_dirs = []
-    for item in root_path.iterdir():
-        if item.is_dir():
-            try:
-                # Try to parse as date
-                datetime.strptime(item.name, "%Y-%m-%d")
-                date_dirs.append(item)
-            except ValueError:
-                continue
+    with os.scandir(root_dir) as entries:
+        date_dirs = [
+            entry.name
+            for entry in entries
+            if _SESSION_DIR_RE.match(entry.name) and entry.is_dir()
+        ]
+
+    # Return the most recent one that is a valid date
+    for name in sorted(date_dirs, reverse=True):
+        try:
+            datetime.strptime(name, "%Y-%m-%d")
+        except ValueError:
+            continue
+        return Path(root_dir) / name
+
+    print("No session directories found with YYYY-MM-DD format")
+    return None
+
+
+def scan_session_frames(session_dir: Path) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """
+    Walks the session tree once, except the previews folder, counting .xisf
+    files by frame type.
+
+    Returns:
+        tuple: Frame counts by type, and the mtime of every directory walked
+        (relative to session_dir) for cache invalidation.
+    """
+    counts = {"Light": 0, "Dark": 0, "Bias": 0, "Flat": 0, "Unknown": 0}
+    dir_mtimes: Dict[str, int] = {}
+    stack = [str(session_dir)]
+    while stack:
+        directory = stack.pop()
+        dir_mtimes[os.path.relpath(directory, session_dir)] = os.stat(
+            directory
+        ).st_mtime_ns
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    # Previews written into the session must not invalidate
+                    # the cache
+                    if entry.name != PREVIEW_DIR_NAME:
+                        stack.append(entry.path)
+                    continue
+                if not entry.name.lower().endswith(".xisf"):
+                    continue
+                for prefix, frame_type in _FRAME_PREFIXES:
+                    if entry.name.startswith(prefix):
+                        counts[frame_type] += 1
+                        break
+                else:
+                    counts["Unknown"] += 1
+    return counts, dir_mtimes
+
+
+def _csv_signature(session_dir: Path) -> Dict[str, Optional[List[int]]]:
+    signature: Dict[str, Optional[List[int]]] = {}
+    for name in SESSION_CSV_FILES:
+        try:
+            st = os.stat(session_dir / name)
+            signature[name] = [st.st_size, st.st_mtime_ns]
+        except OSError:
+            signature[name] = None
+    return signature
+
+
+def _load_cached_analysis(session_dir: Path, threshold: float) -> Optional[Dict]:
+    """Returns the cached analysis if no CSV or directory changed since."""
+    try:
+        with open(session_dir / SUMMARY_CACHE_NAME, "r") as cache_file:
+            cache = json.load(cache_file)
+        if cache.get("version") != SUMMARY_CACHE_VERSION:
+            return None
+        if cache["threshold"] != threshold:
+            return None
+        if cache["csv"] != _csv_signature(session_dir):
+            return None
+        for relpath, mtime_ns in cache["dirs"].items():
+            if os.stat(session_dir / relpath).st_mtime_ns != mtime_ns:
+                return None
+        analysis: Dict = cache["analysis"]
+        return analysis
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
 
-    if not date_dirs:
-        print("No session directories found with YYYY-MM-DD format")
+
+def _load_session_quality(
+    session_dir: Path, threshold: float
+) -> Optional[FrameQuality]:
+    """Analyzes the frame quality of a session, if it has ImageMetaData.csv."""
+    metadata_csv = session_dir / "ImageMetaData.csv"
+    if not metadata_csv.exists():
+        return None
+    try:
+        return analyze_quality(load_metadata([str(metadata_csv)]), threshold)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not analyze frame quality: {e}")
         return None
 
-    # Return the most recent one
-    return max(date_dirs, key=lambda d: d.name)
 
+def analyze_session_data(
+    session_dir: Path, use_cache: bool = True, threshold: float = DEFAULT_THRESHOLD
+) -> Dict:
+    """
+    Analyze session data from .xisf files and CSV metadata, including the
+    frame quality groups of the session with the given outlier threshold.
+    The result is cached as JSON in the session directory and reused until a
+    CSV file or any directory in the session tree changes.
+    """
+    if use_cache:
+        cached = _load_cached_analysis(session_dir, threshold)
+        if cached is not None:
+            return cached
+        try:
+            # Create the cache file before walking, so that the directory
+            # mtimes recorded below already include it
+            (session_dir / SUMMARY_CACHE_NAME).touch()
+        except OSError:
+            use_cache = False  # e.g. a read-only archive
+
+    csv_signature = _csv_signature(session_dir)
+    analysis, dir_mtimes = _analyze_session_data(session_dir)
+    quality = _load_session_quality(session_dir, threshold)
+    analysis["quality"] = (
+        None if quality is None else [asdict(group) for group in quality.groups]
+    )
 
-def analyze_session_data(session_dir: Path) -> Dict:
-    """Analyze session data from .xisf files and CSV metadata."""
-    analysis = {
+    if use_cache:
+        try:
+            # Written in place, which leaves the directory mtime untouched
+            with open(session_dir / SUMMARY_CACHE_NAME, "w") as cache_file:
+                json.dump(
+                    {
+                        "version": SUMMARY_CACHE_VERSION,
+                        "threshold": threshold,
+                        "csv": csv_signature,
+                        "dirs": dir_mtimes,
+                        "analysis": analysis,
+                    },
+                    cache_file,
+                )
+        except OSError as e:
+            print(f"Warning: Could not write analysis cache: {e}")
+    return analysis
+
+
+def new_analysis() -> Dict[str, Any]:
+    """Return an empty analysis."""
+    return {
         "by_type": {},
         "by_filter": {},
         "by_target": {},
         "total_exposure_time": 0,
+        "integration": {},
         "date_range": {"start": None, "end": None},
         "targets_info": {},
+        "weather": {},
     }
 
-    # Find all .xisf files
-    xisf_patterns = ["*.xisf", "*.XISF"]
-    xisf_files = []
-    for pattern in xisf_patterns:
-        xisf_files.extend(glob.glob(str(session_dir / "**" / pattern), recursive=True))
+
+def add_metadata_row(analysis: Dict, row: Dict[str, str]) -> str:
+    """Add one ImageMetaData.csv row to an analysis, returning its target."""
+    # Extract image type from filename
+    filename = Path(row["FilePath"]).name
+    if filename.startswith("LIGHT_"):
+        img_type = "Light"
+    elif filename.startswith("DARK_"):
+        img_type = "Dark"
+    elif filename.startswith("BIAS_"):
+        img_type = "Bias"
+    elif filename.startswith("FLAT_"):
+        img_type = "Flat"
+    else:
+        img_type = "Unknown"
+
+    analysis["by_type"][img_type] = analysis["by_type"].get(img_type, 0) + 1
+
+    # Filter
+    filter_name = row.get("FilterName", "No Filter").strip()
+    analysis["by_filter"][filter_name] = analysis["by_filter"].get(filter_name, 0) + 1
+
+    # For calibration frames, use the image type as the target
+    if img_type in ["Dark", "Bias", "Flat"]:
+        target = f"{img_type} frames"
+    else:
+        # Extract target from filename for Light frames
+        try:
+            target = parse_frame_name(filename).target or "Unknown Target"
+        except ValueError:
+            target = "Unknown Target"
+
+    analysis["by_target"][target] = analysis["by_target"].get(target, 0) + 1
+
+    # Exposure time
+    try:
+        duration = float(row.get("Duration", 0))
+        analysis["total_exposure_time"] += duration
+        if img_type == "Light":
+            by_filter = analysis["integration"].setdefault(target, {})
+            by_filter[filter_name] = by_filter.get(filter_name, 0) + duration
+    except (ValueError, TypeError):
+        pass
+
+    # Date/Time
+    exposure_start = row.get("ExposureStartUTC")
+    if exposure_start:
+        if (
+            analysis["date_range"]["start"] is None
+            or exposure_start < analysis["date_range"]["start"]
+        ):
+            analysis["date_range"]["start"] = exposure_start
+        if (
+            analysis["date_range"]["end"] is None
+            or exposure_start > analysis["date_range"]["end"]
+        ):
+            analysis["date_range"]["end"] = exposure_start
+
+    return target
+
+
+def _analyze_session_data(session_dir: Path) -> Tuple[Dict, Dict[str, int]]:
+    """Analyze session data, returning the analysis and directory mtimes."""
+    analysis = new_analysis()
+
+    # Count all .xisf files by type in a single walk
+    file_type_counts, dir_mtimes = scan_session_frames(session_dir)
+    xisf_count = sum(file_type_counts.values())
 
     # Parse ImageMetaData.csv if it exists
     metadata_csv = session_dir / "ImageMetaData.csv"
@@ -68,95 +313,19 @@ def analyze_session_data(session_dir: Path) -> Dict:
             with open(metadata_csv, "r") as csvfile:
                 reader = csv.DictReader(csvfile)
                 for row in reader:
-                    # Extract image type from filename
-                    filename = Path(row["FilePath"]).name
-                    if filename.startswith("LIGHT_"):
-                        img_type = "Light"
-                    elif filename.startswith("DARK_"):
-                        img_type = "Dark"
-                    elif filename.startswith("BIAS_"):
-                        img_type = "Bias"
-                    elif filename.startswith("FLAT_"):
-                        img_type = "Flat"
-                    else:
-                        img_type = "Unknown"
-
-                    analysis["by_type"][img_type] = (
-                        analysis["by_type"].get(img_type, 0) + 1
-                    )
-
-                    # Filter
-                    filter_name = row.get("FilterName", "No Filter").strip()
-                    analysis["by_filter"][filter_name] = (
-                        analysis["by_filter"].get(filter_name, 0) + 1
-                    )
-
-                    # For calibration frames, use the image type as the target
-                    if img_type in ["Dark", "Bias", "Flat"]:
-                        target = f"{img_type} frames"
-                    else:
-                        # Extract target from filename for Light frames
-                        # Format: TYPE_YYYY-MM-DD_HH-MM-SS_TargetName_Filter_Temp_Duration_NNNN.xisf
-                        filename_parts = filename.replace(".xisf", "").split("_")
-                        if len(filename_parts) >= 6:
-                            # Target name starts after TIME (index 2) and ends before filter
-                            # Find where filter starts by matching against FilterName
-                            filter_name_clean = filter_name.replace("/", "-").replace(" ", "-")
-                            target_parts = []
-
-                            # Collect parts from index 3 onwards until we hit the filter
-                            for i in range(3, len(filename_parts)):
-                                part = filename_parts[i]
-                                # Check if this part starts the filter name
-                                if (
-                                    part == filter_name_clean
-                                    or part in filter_name
-                                    or (
-                                        part.startswith("-")
-                                        and part[1:].replace(".", "").isdigit()
-                                    )
-                                    or part.endswith("s")
-                                    or part.isdigit()
-                                ):
-                                    break
-                                target_parts.append(part)
-
-                            target = (
-                                " ".join(target_parts)
-                                if target_parts
-                                else "Unknown Target"
-                            )
-                        else:
-                            target = "Unknown Target"
-
-                    analysis["by_target"][target] = (
-                        analysis["by_target"].get(target, 0) + 1
-                    )
-
-                    # Exposure time
-                    try:
-                        duration = float(row.get("Duration", 0))
-                        analysis["total_exposure_time"] += duration
-                    except (ValueError, TypeError):
-                        pass
-
-                    # Date/Time
-                    exposure_start = row.get("ExposureStartUTC")
-                    if exposure_start:
-                        if (
-                            analysis["date_range"]["start"] is None
-                            or exposure_start < analysis["date_range"]["start"]
-                        ):
-                            analysis["date_range"]["start"] = exposure_start
-                        if (
-                            analysis["date_range"]["end"] is None
-                            or exposure_start > analysis["date_range"]["end"]
-                        ):
-                            analysis["date_range"]["end"] = exposure_start
+                    add_metadata_row(analysis, row)
 
         except Exception as e:
             print(f"Warning: Could not process ImageMetaData.csv: {e}")
 
+    # Join WeatherData.csv with the frames to correlate weather and quality
+    weather_csv = session_dir / "WeatherData.csv"
+    if metadata_csv.exists() and weather_csv.exists():
+        try:
+            analysis["weather"] = correlate_weather(str(metadata_csv), str(weather_csv))
+        except Exception as e:
+            print(f"Warning: Could not process WeatherData.csv: {e}")
+
     # Parse AcquisitionDetails.csv for target information
     acquisition_csv = session_dir / "AcquisitionDetails.csv"
     if acquisition_csv.exists():
@@ -177,23 +346,7 @@ def analyze_session_data(session_dir: Path) -> Dict:
             print(f"Warning: Could not process AcquisitionDetails.csv: {e}")
 
     # Also count any .xisf files that might not be in CSV (like calibration frames)
-    if len(xisf_files) > 0:
-        # Count files by type from actual filenames
-        file_type_counts = {"Light": 0, "Dark": 0, "Bias": 0, "Flat": 0, "Unknown": 0}
-
-        for xisf_file in xisf_files:
-            filename = Path(xisf_file).name
-            if filename.startswith("LIGHT_"):
-                file_type_counts["Light"] += 1
-            elif filename.startswith("DARK_"):
-                file_type_counts["Dark"] += 1
-            elif filename.startswith("BIAS_"):
-                file_type_counts["Bias"] += 1
-            elif filename.startswith("FLAT_"):
-                file_type_counts["Flat"] += 1
-            else:
-                file_type_counts["Unknown"] += 1
-
+    if xisf_count > 0:
         # Add calibration frames to targets if they exist but weren't in CSV
         for frame_type, count in file_type_counts.items():
             if count > 0 and frame_type in ["Dark", "Bias", "Flat"]:
@@ -211,9 +364,128 @@ def analyze_session_data(session_dir: Path) -> Dict:
                     else:
                         analysis["by_target"]["Unknown files"] = count
                     analysis["by_type"][frame_type] = count
-            print(f"Found {len(xisf_files)} .xisf files but no CSV metadata")
+            print(f"Found {xisf_count} .xisf files but no CSV metadata")
+
+    return analysis, dir_mtimes
+
+
+def find_session_directories(
+    root_dir: str, since: Optional[str] = None, until: Optional[str] = None
+) -> List[Path]:
+    """
+    Find all YYYY-MM-DD session directories, oldest first, optionally limited
+    to the dates from since to until (inclusive, both YYYY-MM-DD).
+    """
+    if not os.path.isdir(root_dir):
+        print(f"Error: Root directory '{root_dir}' does not exist")
+        return []
+
+    with os.scandir(root_dir) as entries:
+        date_dirs = [
+            entry.name
+            for entry in entries
+            if _SESSION_DIR_RE.match(entry.name) and entry.is_dir()
+        ]
+
+    sessions = []
+    for name in sorted(date_dirs):
+        # ISO dates compare correctly as strings
+        if (since and name < since) or (until and name > until):
+            continue
+        try:
+            datetime.strptime(name, "%Y-%m-%d")
+        except ValueError:
+            continue
+        sessions.append(Path(root_dir) / name)
+    return sessions
 
-    return analysis
+
+def _analyze_cached(task: Tuple[Path, bool, float]) -> Dict:
+    return analyze_session_data(*task)
+
+
+def analyze_sessions(
+    session_dirs: List[Path],
+    jobs: int = 1,
+    use_cache: bool = True,
+    threshold: float = DEFAULT_THRESHOLD,
+    progress: Optional[Progress] = None,
+) -> List[Dict]:
+    """
+    Analyze many sessions in a process pool. Unchanged sessions are answered
+    from their cache, so rerunning over a whole season only re-parses the
+    nights that changed.
+    """
+    tasks = [(session_dir, use_cache, threshold) for session_dir in session_dirs]
+    analyses = []
+    with ExitStack() as stack:
+        if jobs > 1 and len(tasks) > 1:
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=jobs))
+            results = executor.map(_analyze_cached, tasks)
+        else:
+            results = map(_analyze_cached, tasks)
+        for analysis in results:
+            analyses.append(analysis)
+            if progress is not None:
+                progress.update()
+    if progress is not None:
+        progress.close()
+    return analyses
+
+
+def merge_analyses(analyses: List[Dict]) -> Dict:
+    """Merge per-session analyses into one analysis covering all of them."""
+    merged = new_analysis()
+    for analysis in analyses:
+        for key in ("by_type", "by_filter", "by_target"):
+            for name, count in analysis[key].items():
+                merged[key][name] = merged[key].get(name, 0) + count
+        merged["total_exposure_time"] += analysis["total_exposure_time"]
+        for target, by_filter in analysis.get("integration", {}).items():
+            merged_by_filter = merged["integration"].setdefault(target, {})
+            for filter_name, seconds in by_filter.items():
+                merged_by_filter[filter_name] = (
+                    merged_by_filter.get(filter_name, 0) + seconds
+                )
+        start, end = analysis["date_range"]["start"], analysis["date_range"]["end"]
+        date_range = merged["date_range"]
+        if start and (date_range["start"] is None or start < date_range["start"]):
+            date_range["start"] = start
+        if end and (date_range["end"] is None or end > date_range["end"]):
+            date_range["end"] = end
+        merged["targets_info"].update(analysis["targets_info"])
+        merge_sums(merged["weather"], analysis.get("weather", {}))
+    return merged
+
+
+def analyze_frame_quality(
+    session_dirs: List[Path],
+    analyses: List[Dict],
+    threshold: float = DEFAULT_THRESHOLD,
+    reject_list: Optional[str] = None,
+) -> Optional[List[QualityGroup]]:
+    """
+    Combine the frame quality groups of the analyses of the sessions, in which
+    each frame was flagged against its own session, target and filter. Only
+    writing the flagged frames to reject_list reads ImageMetaData.csv again.
+    """
+    summaries = [a["quality"] for a in analyses if a.get("quality") is not None]
+    if not summaries:
+        return None
+    if reject_list:
+        qualities = [
+            quality
+            for quality in (
+                _load_session_quality(session_dir, threshold)
+                for session_dir in session_dirs
+            )
+            if quality is not None
+        ]
+        rejected = write_reject_list(reject_list, *qualities)
+        print(f"🗑️ Wrote {rejected} flagged frames to {reject_list}")
+    return merge_groups(
+        [QualityGroup(**group) for group in groups] for groups in summaries
+    )
 
 
 def format_time_duration(seconds: float) -> str:
@@ -230,7 +502,9 @@ def format_time_duration(seconds: float) -> str:
         return f"{remaining_seconds}s"
 
 
-def generate_report_message(session_dir: Path, analysis: Dict) -> str:
+def generate_report_message(
+    session_dir: Path, analysis: Dict, quality: Optional[List[QualityGroup]] = None
+) -> str:
     """Generate a formatted report message."""
     session_date = session_dir.name
 
@@ -241,11 +515,75 @@ def generate_report_message(session_dir: Path, analysis: Dict) -> str:
         message += "No session data found."
         return message
 
+    message += _format_frame_summary(analysis)
+
+    # Session duration
+    if analysis["date_range"]["start"] and analysis["date_range"]["end"]:
+        try:
+            start_time = datetime.fromisoformat(
+                analysis["date_range"]["start"].replace("T", " ").replace("Z", "")
+            )
+            end_time = datetime.fromisoformat(
+                analysis["date_range"]["end"].replace("T", " ").replace("Z", "")
+            )
+            duration = end_time - start_time
+            duration_str = format_time_duration(duration.total_seconds())
+            message += f"\n📅 Session Duration: {duration_str}\n"
+        except Exception:
+            pass
+
+    if quality is not None:
+        message += _format_quality(quality)
+    message += _format_weather(analysis)
+
+    return message
+
+
+def generate_range_report_message(
+    session_dirs: List[Path],
+    analysis: Dict,
+    quality: Optional[List[QualityGroup]] = None,
+) -> str:
+    """Generate a report message covering several sessions."""
+    first, last = session_dirs[0].name, session_dirs[-1].name
+    period = first if first == last else f"{first} to {last}"
+    sessions = f"{len(session_dirs)} session{'s' if len(session_dirs) > 1 else ''}"
+    message = f"🌟 Imaging Report - {period} ({sessions})\n\n"
+
+    if not analysis["by_target"] and not analysis["by_type"]:
+        message += "No session data found."
+        return message
+
+    message += _format_frame_summary(analysis)
+
+    # Integration per target and filter across the whole range
+    if analysis["integration"]:
+        message += "\n🔭 Integration by Target & Filter:\n"
+        for target, by_filter in sorted(
+            analysis["integration"].items(),
+            key=lambda x: sum(x[1].values()),
+            reverse=True,
+        ):
+            message += f"  • {target}:\n"
+            for filter_name, seconds in sorted(by_filter.items()):
+                message += f"      {filter_name}: {format_time_duration(seconds)}\n"
+
+    if quality is not None:
+        message += _format_quality(quality)
+    message += _format_weather(analysis)
+
+    return message
+
+
+def _format_frame_summary(analysis: Dict) -> str:
+    """Format the target, type, filter and exposure sections of a report."""
+    message = ""
+
     # Targets (main section)
     if analysis["by_target"]:
         message += "🎯 Targets & Files:\n"
         for target, count in sorted(
-            analysis["by_target"].items(), key=lambda x: x[1], reverse=True
+            analysis["by_target"].items(), key=lambda x: int(x[1]), reverse=True
         ):
             message += f"  • {target}: {count} frames\n"
 
@@ -266,104 +604,433 @@ def generate_report_message(session_dir: Path, analysis: Dict) -> str:
         formatted_time = format_time_duration(analysis["total_exposure_time"])
         message += f"\n⏱️ Total Exposure: {formatted_time}\n"
 
-    # Session duration
-    if analysis["date_range"]["start"] and analysis["date_range"]["end"]:
-        try:
-            start_time = datetime.fromisoformat(
-                analysis["date_range"]["start"].replace("T", " ").replace("Z", "")
-            )
-            end_time = datetime.fromisoformat(
-                analysis["date_range"]["end"].replace("T", " ").replace("Z", "")
-            )
-            duration = end_time - start_time
-            duration_str = format_time_duration(duration.total_seconds())
-            message += f"\n📅 Session Duration: {duration_str}\n"
-        except Exception:
-            pass
+    return message
 
+
+def _format_quality(groups: List[QualityGroup]) -> str:
+    """Format the frame quality section of a report."""
+    if not groups:
+        return ""
+    message = "\n📈 Frame Quality (median):\n"
+    for group in sorted(groups, key=lambda g: g.frames, reverse=True):
+        medians = group.medians
+        stats = []
+        if "HFR" in medians:
+            stats.append(f"HFR {medians['HFR']:.2f}")
+        if "FWHM" in medians:
+            stats.append(f"FWHM {medians['FWHM']:.2f}")
+        if "DetectedStars" in medians:
+            stats.append(f"{medians['DetectedStars']:.0f} stars")
+        if "GuidingRMSArcSec" in medians:
+            stats.append(f'RMS {medians["GuidingRMSArcSec"]:.2f}"')
+        stats.append(f"{group.outliers}/{group.frames} outliers")
+        message += f"  • {group.target} ({group.filter_name}): {', '.join(stats)}\n"
     return message
 
 
-def send_pushover_notification(
-    token: str,
-    user: str,
-    message: str,
-    title: str = "Astrophotography Session Report",
-) -> bool:
-    """Send notification via Pushover API."""
-    url = "https://api.pushover.net/1/messages.json"
-
-    data = {
-        "token": token,
-        "user": user,
-        "message": message,
-        "title": title,
-        "priority": 0,
-    }
+def _format_weather(analysis: Dict) -> str:
+    """Format the correlations of weather with frame quality."""
+    lines = []
+    for weather_metric in WEATHER_METRICS:
+        stats = []
+        for quality_metric, label in (("HFR", "HFR"), ("DetectedStars", "stars")):
+            sums = analysis.get("weather", {}).get(f"{weather_metric}|{quality_metric}")
+            r = correlation(sums) if sums else None
+            if r is not None:
+                stats.append(f"{label} {r:+.2f}")
+        if stats:
+            label = "Dew point spread" if weather_metric == "DewPointSpread" else ""
+            lines.append(f"  • {label or weather_metric}: {', '.join(stats)}\n")
+    if not lines:
+        return ""
+    return "\n🌦️ Weather vs Quality (correlation):\n" + "".join(lines)
 
-    try:
-        response = requests.post(url, data=data, timeout=10)
-        response.raise_for_status()
-        result = response.json()
 
-        if result.get("status") == 1:
-            print("✅ Pushover notification sent successfully")
-            return True
-        else:
-            print(f"❌ Pushover API error: {result}")
-            return False
+class MetadataTail:
+    """
+    Follows a growing CSV file such as ImageMetaData.csv. Each poll costs one
+    stat() when nothing changed and otherwise reads only the complete lines
+    appended since the byte offset of the previous poll.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.offset = 0
+        self.inode: Optional[int] = None
+        self.fieldnames: Optional[List[str]] = None
+
+    def poll(self) -> Tuple[List[Dict[str, str]], bool]:
+        """
+        Returns:
+            tuple: The rows appended since the last poll, and True if the
+            file was truncated or replaced and has been read from the start.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return [], False
+        size = stat.st_size
+        # A file replaced by one at least as large is only noticed by its inode
+        restarted = size < self.offset or (
+            self.inode is not None and stat.st_ino != self.inode
+        )
+        self.inode = stat.st_ino
+        if restarted:
+            self.offset = 0
+            self.fieldnames = None
+        if size == self.offset:
+            return [], restarted
 
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Network error sending Pushover notification: {e}")
-        return False
-    except Exception as e:
-        print(f"❌ Error sending Pushover notification: {e}")
-        return False
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+        # A partially written last line is left for the next poll
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            return [], restarted
+        encoding = "utf-8-sig" if self.offset == 0 else "utf-8"
+        lines = data[:end].decode(encoding, errors="replace").splitlines()
+        self.offset += end
+
+        rows = []
+        for values in csv.reader(lines):
+            if not values:
+                continue
+            if self.fieldnames is None:
+                self.fieldnames = values
+                continue
+            rows.append(dict(zip(self.fieldnames, values)))
+        return rows, restarted
+
+
+def _median(values: List[float]) -> float:
+    ordered = sorted(values)
+    mid = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[mid]
+    return (ordered[mid - 1] + ordered[mid]) / 2
+
+
+class SessionWatcher:
+    """
+    Keeps a running analysis of the active session from the rows appended to
+    its ImageMetaData.csv, and sends rate-limited progress summaries and
+    alerts when HFR or guiding RMS degrade against the start of the night.
+    """
+
+    def __init__(
+        self,
+        root_dir: str,
+        notify: Callable[[str, str], bool],
+        summary_interval: float = 3600,
+        degrade_factor: float = WATCH_DEGRADE_FACTOR,
+    ):
+        self.root_dir = root_dir
+        self.notify = notify
+        self.summary_interval = summary_interval
+        self.degrade_factor = degrade_factor
+        self.session_dir: Optional[Path] = None
+        self._root_mtime_ns: Optional[int] = None
+        self._start_session(None)
+
+    def _start_session(self, session_dir: Optional[Path]) -> None:
+        self.session_dir = session_dir
+        self.analysis = new_analysis()
+        self.tail = (
+            MetadataTail(session_dir / "ImageMetaData.csv") if session_dir else None
+        )
+        self.frames_since_summary = 0
+        self.last_summary = time.monotonic()
+        # Per (metric, target, filter): baseline and most recent values
+        self.baselines: Dict[Tuple[str, str, str], List[float]] = {}
+        self.recent: Dict[Tuple[str, str, str], Deque[float]] = {}
+        self.last_alert: Dict[Tuple[str, str, str], float] = {}
+
+    def _check_session(self) -> None:
+        """Switches to a newer session directory when one appears."""
+        try:
+            mtime_ns = os.stat(self.root_dir).st_mtime_ns
+        except OSError:
+            return
+        if mtime_ns == self._root_mtime_ns:
+            return
+        self._root_mtime_ns = mtime_ns
+        latest = find_latest_session_directory(self.root_dir)
+        if latest and latest != self.session_dir:
+            print(f"👀 Watching session: {latest}")
+            self._start_session(latest)
+
+    def _track_quality(self, row: Dict[str, str], target: str) -> None:
+        if not Path(row.get("FilePath", "")).name.startswith("LIGHT_"):
+            return
+        filter_name = row.get("FilterName", "No Filter").strip()
+        for metric in WATCH_METRICS:
+            try:
+                value = float(row.get(metric, "nan"))
+            except ValueError:
+                continue
+            if value != value:  # NaN
+                continue
+            key = (metric, target, filter_name)
+            baseline = self.baselines.setdefault(key, [])
+            if len(baseline) < WATCH_BASELINE_FRAMES:
+                baseline.append(value)
+            self.recent.setdefault(key, deque(maxlen=WATCH_WINDOW_FRAMES)).append(value)
+
+    def _quality_alerts(self, now: float) -> List[str]:
+        alerts = []
+        for key, recent in self.recent.items():
+            baseline = self.baselines[key]
+            if (
+                len(baseline) < WATCH_BASELINE_FRAMES
+                or len(recent) < WATCH_WINDOW_FRAMES
+            ):
+                continue
+            reference, current = _median(baseline), _median(list(recent))
+            if reference <= 0 or current < reference * self.degrade_factor:
+                continue
+            if now - self.last_alert.get(key, -WATCH_ALERT_INTERVAL) < (
+                WATCH_ALERT_INTERVAL
+            ):
+                continue
+            self.last_alert[key] = now
+            metric, target, filter_name = key
+            alerts.append(
+                f"⚠️ {metric} degraded on {target} ({filter_name}): "
+                f"{current:.2f} over the last {len(recent)} frames, "
+                f"{reference:.2f} at the start of the night"
+            )
+        return alerts
+
+    def poll(self) -> None:
+        """Reads new metadata and sends any due summary or alert."""
+        self._check_session()
+        if self.tail is None or self.session_dir is None:
+            return
+        rows, restarted = self.tail.poll()
+        if restarted:
+            print(f"{self.tail.path} was rewritten, re-reading it")
+            self._start_session(self.session_dir)
+            rows, _ = self.tail.poll()
+        for row in rows:
+            self._track_quality(row, add_metadata_row(self.analysis, row))
+        self.frames_since_summary += len(rows)
+
+        now = time.monotonic()
+        alerts = self._quality_alerts(now)
+        if alerts:
+            self.notify("\n".join(alerts), "Astrophotography Session Alert")
+        if self.frames_since_summary and now - self.last_summary >= (
+            self.summary_interval
+        ):
+            self.notify(
+                generate_report_message(self.session_dir, self.analysis),
+                "Astrophotography Session Progress",
+            )
+            self.last_summary = now
+            self.frames_since_summary = 0
+
+    def run(
+        self, poll_interval: float, on_poll: Optional[Callable[[], Any]] = None
+    ) -> None:
+        """Polls until interrupted, calling on_poll after every poll."""
+        try:
+            while True:
+                self.poll()
+                if on_poll is not None:
+                    on_poll()
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            print("Stopped watching")
 
 
 def main() -> None:
     """Main function."""
-    if len(sys.argv) != 4:
-        print(
-            "Usage: python session_report.py <root_directory> "
-            "<pushover_token> <pushover_user>"
+    parser = argparse.ArgumentParser(
+        description="Summarize imaging sessions and send the report via Pushover.",
+        epilog="By default the latest YYYY-MM-DD directory in root_directory is "
+        "reported.",
+    )
+    parser.add_argument("root_directory", help="directory of YYYY-MM-DD sessions")
+    parser.add_argument("pushover_token", help="Pushover application token")
+    parser.add_argument("pushover_user", help="Pushover user key")
+    parser.add_argument(
+        "--all", action="store_true", help="report on every session directory"
+    )
+    parser.add_argument(
+        "--since", metavar="YYYY-MM-DD", help="report on sessions from this date on"
+    )
+    parser.add_argument(
+        "--until", metavar="YYYY-MM-DD", help="report on sessions up to this date"
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of sessions analyzed in parallel (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="re-analyze every session instead of using the cached analysis",
+    )
+    parser.add_argument(
+        "--outlier-threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        metavar="K",
+        help="flag frames whose HFR, FWHM, eccentricity, star count or guiding "
+        "RMS is K robust standard deviations worse than the median of their "
+        f"target and filter (default: {DEFAULT_THRESHOLD})",
+    )
+    parser.add_argument(
+        "--reject-list",
+        metavar="PATH",
+        help="write the flagged frames of the reported sessions to this CSV file",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="follow the active session and send progress updates until interrupted",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=60,
+        metavar="SECONDS",
+        help="with --watch, seconds between checks for new frames (default: 60)",
+    )
+    parser.add_argument(
+        "--summary-interval",
+        type=float,
+        default=60,
+        metavar="MINUTES",
+        help="with --watch, minutes between progress summaries (default: 60)",
+    )
+    parser.add_argument(
+        "--degrade-factor",
+        type=float,
+        default=WATCH_DEGRADE_FACTOR,
+        help="with --watch, alert when the recent median HFR or guiding RMS "
+        "exceeds the start of the night by this factor "
+        f"(default: {WATCH_DEGRADE_FACTOR})",
+    )
+    parser.add_argument(
+        "--pushover-url",
+        default=PUSHOVER_URL,
+        metavar="URL",
+        help="Pushover messages endpoint (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--spool",
+        metavar="PATH",
+        help="file keeping messages that could not be delivered until the next "
+        f"run (default: {PUSHOVER_SPOOL_NAME} in root_directory)",
+    )
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    client = PushoverClient(
+        args.pushover_token,
+        args.pushover_user,
+        url=args.pushover_url,
+        spool_path=args.spool or os.path.join(args.root_directory, PUSHOVER_SPOOL_NAME),
+    )
+
+    if args.watch:
+        if args.all or args.since or args.until:
+            parser.error("--watch cannot be combined with --all, --since or --until")
+        # Alerts and spooled messages are tried once per poll and spooled
+        # otherwise, so an uplink outage does not block polling on backoff
+        watcher = SessionWatcher(
+            args.root_directory,
+            lambda message, title: client.send(message, title, retries=0),
+            summary_interval=args.summary_interval * 60,
+            degrade_factor=args.degrade_factor,
         )
-        print("\nExample:")
-        print("  python session_report.py /path/to/sessions abc123token xyz789user")
-        print(
-            "\nThe script will find the latest YYYY-MM-DD directory in <root_directory>"
+        # Retry spooled messages once per poll, without blocking on backoff
+        with instrument(args):
+            watcher.run(args.poll_interval, lambda: client.flush_spool(retries=0))
+        client.close()
+        return
+
+    for value in (args.since, args.until):
+        if value:
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                parser.error(f"invalid date {value}, expected YYYY-MM-DD")
+
+    with instrument(args) as metrics:
+        report(args, client, metrics)
+
+
+def report(args: argparse.Namespace, client: PushoverClient, metrics: Metrics) -> None:
+    """Analyzes the requested sessions and sends the report."""
+    use_cache = not args.no_cache
+    if args.all or args.since or args.until:
+        session_dirs = find_session_directories(
+            args.root_directory, args.since, args.until
         )
-        print("and send a summary report via Pushover.")
-        sys.exit(1)
+        if not session_dirs:
+            print("No session directories found in the requested range")
+            sys.exit(1)
 
-    root_directory = sys.argv[1]
-    pushover_token = sys.argv[2]
-    pushover_user = sys.argv[3]
+        print(f"📂 Analyzing {len(session_dirs)} sessions")
+        with metrics.phase("analyze sessions"):
+            analyses = analyze_sessions(
+                session_dirs,
+                args.jobs,
+                use_cache,
+                args.outlier_threshold,
+                progress(args, "Sessions", len(session_dirs)),
+            )
+        with metrics.phase("frame quality"):
+            quality = analyze_frame_quality(
+                session_dirs, analyses, args.outlier_threshold, args.reject_list
+            )
+        message = generate_range_report_message(
+            session_dirs, merge_analyses(analyses), quality
+        )
+    else:
+        # Find latest session directory
+        session_dir = find_latest_session_directory(args.root_directory)
+        if not session_dir:
+            sys.exit(1)
 
-    # Find latest session directory
-    session_dir = find_latest_session_directory(root_directory)
-    if not session_dir:
-        sys.exit(1)
+        print(f"📂 Analyzing session: {session_dir}")
 
-    print(f"📂 Analyzing session: {session_dir}")
+        # Analyze the session
+        with metrics.phase("analyze sessions"):
+            analysis = analyze_session_data(
+                session_dir, use_cache, args.outlier_threshold
+            )
 
-    # Analyze the session
-    analysis = analyze_session_data(session_dir)
+        with metrics.phase("frame quality"):
+            quality = analyze_frame_quality(
+                [session_dir], [analysis], args.outlier_threshold, args.reject_list
+            )
 
-    # Generate report message
-    message = generate_report_message(session_dir, analysis)
+        # Generate report message
+        message = generate_report_message(session_dir, analysis, quality)
 
-    print("\n" + "=" * 50)
-    print("REPORT PREVIEW:")
-    print("=" * 50)
-    print(message)
-    print("=" * 50 + "\n")
+    if not args.quiet:
+        print("\n" + "=" * 50)
+        print("REPORT PREVIEW:")
+        print("=" * 50)
+        print(message)
+        print("=" * 50 + "\n")
 
     # Send notification
-    success = send_pushover_notification(pushover_token, pushover_user, message)
+    with metrics.phase("send"):
+        success = client.send(message, "Astrophotography Session Report")
+    spooled = client.has_spooled()
+    client.close()
 
     if success:
         print("🎉 Session report sent successfully!")
+    elif spooled:
+        print("📥 Session report will be sent on the next run")
     else:
         print("💥 Failed to send session report")
         sys.exit(1)
@@ -1,30 +1,206 @@
-import csv
-import os
-import sys
-from typing import Any, List
-
-from astropy.io import fits
-
-if len(sys.argv) < 4:
-    print("Usage: python statistics.py [csvfile] [headers] [files...]")
-    exit(1)
-
-csvfile: str = sys.argv[1]
-headers: List[str] = sys.argv[2].split(",")
-files: List[str] = sys.argv[3:]
-
-print("Extracting headers " + ", ".join(headers) + f" from {len(files)} files")
-
-with open(csvfile, "w", newline="") as cfile:
-    writer = csv.writer(cfile)
-    writer.writerow(["Path", "Dirname", "Basename"] + headers)
-    for f in files:
-        hdul = fits.open(f)
-        hdr = hdul[0].header
-        row: List[Any] = [f, os.path.dirname(f), os.path.basename(f)]
-        for h in headers:
-            try:
-                row.append(hdr[h])
-            except KeyError:
-                row.append("N/A")
-        writer.writerow(row)
+import argparse
+import csv
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from header_catalog import parse_where, query
+from header_io import is_xisf, read_primary_header
+from instrumentation import Progress, add_arguments, instrument, progress
+
+
+def read_header_values(path: str, headers: List[str]) -> Dict[str, Any]:
+    """
+    Reads the requested headers from the primary HDU of a FITS file, or the
+    FITS keywords and properties of an XISF file. Only the header blocks are
+    read; FITS files the fast parser cannot handle (e.g. compressed FITS) are
+    opened with astropy instead.
+    """
+    try:
+        return read_primary_header(path, headers)
+    except ValueError:
+        if is_xisf(path):
+            raise
+        from astropy.io import fits
+
+        with fits.open(path) as hdul:
+            hdr = hdul[0].header
+            return {h.upper(): hdr[h] for h in headers if h in hdr}
+
+
+def extract_row(task: Tuple[str, List[str], int]) -> List[Any]:
+    """
+    Builds the CSV row for one file. With a pixel stride, the pixel statistics
+    of a subsample taking every stride-th pixel and row are appended.
+    """
+    f, headers, pixel_stride = task
+    row: List[Any] = [f, os.path.dirname(f), os.path.basename(f)]
+    try:
+        values = read_header_values(f, headers)
+    except Exception as e:
+        print(f"Error reading {f}: {e}")
+        values = {}
+    for h in headers:
+        row.append(values.get(h.upper(), "N/A"))
+    if pixel_stride:
+        from pixel_stats import PIXEL_COLUMNS, pixel_stats
+
+        try:
+            stats = pixel_stats(f, pixel_stride)
+        except Exception as e:
+            print(f"Error reading pixels of {f}: {e}")
+            stats = {}
+        for column in PIXEL_COLUMNS:
+            value = stats.get(column, math.nan)
+            row.append("N/A" if math.isnan(value) else value)
+    return row
+
+
+def _write_rows(
+    writer: Any, rows: Iterable[List[Any]], progress: Optional[Progress]
+) -> None:
+    for row in rows:
+        writer.writerow(row)
+        if progress is not None:
+            progress.update()
+
+
+def write_from_catalog(
+    csvfile: str,
+    headers: List[str],
+    catalog: str,
+    where: Optional[str] = None,
+    files: Optional[List[str]] = None,
+) -> None:
+    """
+    Writes the CSV from a header catalog without opening any frame. Like
+    fits_header.py, fails with KeyError if one of files is not cataloged.
+    """
+    rows = query(catalog, headers, where, files or None)
+    print(
+        "Extracting headers " + ", ".join(headers) + f" from {len(rows)} "
+        "cataloged files"
+    )
+    with open(csvfile, "w", newline="") as cfile:
+        writer = csv.writer(cfile)
+        writer.writerow(["Path", "Dirname", "Basename"] + headers)
+        for path, *values in rows:
+            writer.writerow(
+                [path, os.path.dirname(path), os.path.basename(path)]
+                + ["N/A" if v is None else v for v in values]
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Extract FITS headers from multiple files into a CSV file."
+    )
+    parser.add_argument("csvfile", help="path to the output CSV file")
+    parser.add_argument("headers", help="comma-separated list of FITS headers")
+    parser.add_argument(
+        "files",
+        nargs="*",
+        help="files to process; with --catalog, defaults to every cataloged file",
+    )
+    parser.add_argument(
+        "--files-from",
+        metavar="PATH",
+        help="also process the files listed in PATH, one per line (- for stdin), "
+        "for more files than fit on a command line",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--catalog",
+        help="answer from a header catalog built by header_catalog.py instead "
+        "of reading the files",
+    )
+    parser.add_argument(
+        "--where",
+        help='with --catalog, only include files matching e.g. "FILTER=Ha AND '
+        'EXPTIME>=300"',
+    )
+    parser.add_argument(
+        "--pixel-stats",
+        action="store_true",
+        help="also compute the median, MAD noise, saturated fraction and "
+        "background gradient of each image as extra columns",
+    )
+    parser.add_argument(
+        "--stride",
+        type=int,
+        default=4,
+        help="with --pixel-stats, sample every Nth pixel of every Nth row "
+        "(default: 4; 1 reads every pixel)",
+    )
+    add_arguments(parser)
+    args = parser.parse_intermixed_args()
+
+    headers: List[str] = args.headers.split(",")
+    files: List[str] = args.files
+    if args.files_from:
+        with open(args.files_from if args.files_from != "-" else 0) as listing:
+            files += [line.rstrip("\n") for line in listing if line.strip()]
+
+    if args.stride < 1:
+        parser.error("--stride must be at least 1")
+    if args.catalog:
+        if args.pixel_stats:
+            parser.error("--pixel-stats cannot be combined with --catalog")
+        if args.where:
+            try:
+                parse_where(args.where)
+            except ValueError as e:
+                parser.error(str(e))
+        try:
+            with instrument(args) as metrics, metrics.phase("query catalog"):
+                write_from_catalog(
+                    args.csvfile, headers, args.catalog, args.where, files
+                )
+        except (OSError, KeyError) as e:
+            raise SystemExit(f"Could not query the catalog: {e}")
+        return
+    if args.where:
+        parser.error("--where requires --catalog")
+    if not files:
+        parser.error("no files given")
+
+    print("Extracting headers " + ", ".join(headers) + f" from {len(files)} files")
+
+    columns = ["Path", "Dirname", "Basename"] + headers
+    if args.pixel_stats:
+        from pixel_stats import PIXEL_COLUMNS
+
+        columns += PIXEL_COLUMNS
+    pixel_stride = args.stride if args.pixel_stats else 0
+
+    tasks = [(f, headers, pixel_stride) for f in files]
+    bar = progress(args, "Files", len(files))
+    with instrument(args) as metrics, metrics.phase("extract", len(files)), open(
+        args.csvfile, "w", newline=""
+    ) as cfile:
+        writer = csv.writer(cfile)
+        writer.writerow(columns)
+        if args.jobs > 1 and len(files) > 1:
+            # map() yields rows in input order, so the CSV stays ordered
+            chunksize = max(1, min(256, len(files) // (args.jobs * 4)))
+            if pixel_stride:
+                # Pixel statistics take far longer than a header read, so
+                # hand out small batches to keep every worker busy
+                chunksize = min(chunksize, 4)
+            with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+                rows = executor.map(extract_row, tasks, chunksize=chunksize)
+                _write_rows(writer, rows, bar)
+        else:
+            _write_rows(writer, map(extract_row, tasks), bar)
+        if bar is not None:
+            bar.close()
+
+
+if __name__ == "__main__":
+    main()
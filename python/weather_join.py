@@ -0,0 +1,146 @@
+"""
+Joins N.I.N.A. WeatherData.csv with ImageMetaData.csv and correlates the
+weather with frame quality.
+
+Both files are written in exposure order, so they are joined with a streaming
+sorted merge join on ExposureNumber (or ExposureStartUTC) that holds one row
+of each file at a time. Correlations are kept as running Pearson sums, which
+add up across sessions, so a multi-season report stays linear in the number
+of rows and needs constant memory.
+"""
+
+import csv
+import math
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Weather and quality columns that are correlated. DewPointSpread is derived
+# as Temperature - DewPoint, the margin before dew forms.
+WEATHER_METRICS = ("SkyQuality", "Humidity", "DewPointSpread", "CloudCover")
+QUALITY_METRICS = ("HFR", "DetectedStars")
+
+# Pearson sums: n, sum x, sum y, sum x², sum y², sum xy
+Sums = List[float]
+
+
+def merge_join(
+    left: Iterable[Dict[str, str]],
+    right: Iterable[Dict[str, str]],
+    key: Callable[[Dict[str, str]], Any],
+) -> Iterator[Tuple[Dict[str, str], Dict[str, str]]]:
+    """
+    Yields the pairs of rows with equal keys from two inputs sorted by key.
+    Rows without a match are skipped.
+
+    Raises:
+        ValueError: If either input is not in ascending key order.
+    """
+    left_rows, right_rows = iter(left), iter(right)
+    left_row = next(left_rows, None)
+    right_row = next(right_rows, None)
+    left_key = right_key = None
+    while left_row is not None and right_row is not None:
+        previous_left, previous_right = left_key, right_key
+        left_key, right_key = key(left_row), key(right_row)
+        if (previous_left is not None and left_key < previous_left) or (
+            previous_right is not None and right_key < previous_right
+        ):
+            raise ValueError("Rows are not in ascending order")
+        if left_key < right_key:
+            left_row = next(left_rows, None)
+        elif right_key < left_key:
+            right_row = next(right_rows, None)
+        else:
+            yield left_row, right_row
+            left_row = next(left_rows, None)
+            right_row = next(right_rows, None)
+
+
+def _float(row: Dict[str, str], column: str) -> float:
+    try:
+        return float(row.get(column) or "nan")
+    except ValueError:
+        return math.nan
+
+
+def _weather_value(row: Dict[str, str], metric: str) -> float:
+    if metric == "DewPointSpread":
+        return _float(row, "Temperature") - _float(row, "DewPoint")
+    return _float(row, metric)
+
+
+def _join_key(column: str) -> Callable[[Dict[str, str]], Any]:
+    if column == "ExposureNumber":
+        return lambda row: int(row.get(column) or -1)
+    return lambda row: row.get(column) or ""
+
+
+def correlate_weather(metadata_csv: str, weather_csv: str) -> Dict[str, Sums]:
+    """
+    Joins the LIGHT frames of an ImageMetaData.csv with a WeatherData.csv and
+    accumulates Pearson sums for every weather and quality metric pair.
+
+    Returns:
+        dict: Sums by "weather|quality" metric pair.
+    """
+    for column in ("ExposureNumber", "ExposureStartUTC"):
+        sums: Dict[str, Sums] = {
+            f"{w}|{q}": [0.0] * 6 for w in WEATHER_METRICS for q in QUALITY_METRICS
+        }
+        with open(metadata_csv, "r", newline="", encoding="utf-8-sig") as mfile, open(
+            weather_csv, "r", newline="", encoding="utf-8-sig"
+        ) as wfile:
+            frames = csv.DictReader(mfile)
+            weather = csv.DictReader(wfile)
+            if column not in (frames.fieldnames or []) or column not in (
+                weather.fieldnames or []
+            ):
+                continue
+            lights = (
+                row
+                for row in frames
+                if row.get("FilePath", "")
+                .replace("\\", "/")
+                .rsplit("/", 1)[-1]
+                .startswith("LIGHT_")
+            )
+            try:
+                for frame, conditions in merge_join(lights, weather, _join_key(column)):
+                    quality = {q: _float(frame, q) for q in QUALITY_METRICS}
+                    for w in WEATHER_METRICS:
+                        x = _weather_value(conditions, w)
+                        if math.isnan(x):
+                            continue
+                        for q, y in quality.items():
+                            if math.isnan(y):
+                                continue
+                            s = sums[f"{w}|{q}"]
+                            s[0] += 1
+                            s[1] += x
+                            s[2] += y
+                            s[3] += x * x
+                            s[4] += y * y
+                            s[5] += x * y
+            except ValueError:
+                continue  # Not in order by this column, try the next one
+        return sums
+    return {}
+
+
+def merge_sums(total: Dict[str, Sums], sums: Dict[str, Sums]) -> None:
+    """Adds the Pearson sums of one session to a running total in place."""
+    for pair, values in sums.items():
+        current = total.setdefault(pair, [0.0] * 6)
+        for i, value in enumerate(values):
+            current[i] += value
+
+
+def correlation(sums: Sums) -> Optional[float]:
+    """Returns the Pearson correlation of the sums, or None if undefined."""
+    n, sx, sy, sxx, syy, sxy = sums
+    if n < 3:
+        return None
+    var_x = n * sxx - sx * sx
+    var_y = n * syy - sy * sy
+    if var_x <= 0 or var_y <= 0:
+        return None
+    return (n * sxy - sx * sy) / math.sqrt(var_x * var_y)
@@ -0,0 +1,100 @@
+"""
+Header-only XISF reader.
+
+Reads the XISF signature, the header length and the XML header block, and
+extracts FITSKeyword and Property elements. Attached image data is never
+read, so querying a 60 MB frame costs only a few KB of I/O.
+"""
+
+import struct
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from header_io import parse_value
+
+XISF_SIGNATURE = b"XISF0100"
+
+_NS = "{http://www.pixinsight.com/xisf}"
+
+
+def read_xisf_xml(path: str) -> ET.Element:
+    """
+    Reads and parses the XML header of an XISF file.
+
+    Args:
+        path (str): Path to the XISF file.
+
+    Returns:
+        Element: The root <xisf> element.
+    """
+    with open(path, "rb") as f:
+        preamble = f.read(16)
+        if len(preamble) < 16 or preamble[:8] != XISF_SIGNATURE:
+            raise ValueError(f"Not an XISF file: {path}")
+        (header_length,) = struct.unpack("<I", preamble[8:12])
+        xml = f.read(header_length)
+    if len(xml) < header_length:
+        raise ValueError(f"Truncated XISF header: {path}")
+    return ET.fromstring(xml.rstrip(b"\0"))
+
+
+def _property_value(element: ET.Element) -> Any:
+    """Converts a scalar or string Property element to a Python value."""
+    value_type = element.get("type", "String")
+    text = element.get("value")
+    if text is None:
+        text = element.text or ""
+    try:
+        if value_type.startswith(("Int", "UInt", "Byte", "Short")):
+            return int(text)
+        if value_type.startswith("Float"):
+            return float(text)
+        if value_type == "Boolean":
+            return text.strip().lower() in ("1", "true")
+    except ValueError:
+        pass
+    return text
+
+
+def xisf_items(root: ET.Element) -> List[Tuple[str, Any]]:
+    """
+    Returns (name, value) pairs for every FITSKeyword and Property in an XISF
+    header, in document order. FITSKeyword values are parsed like FITS cards.
+    """
+    items: List[Tuple[str, Any]] = []
+    for element in root.iter():
+        tag = element.tag.replace(_NS, "")
+        if tag == "FITSKeyword":
+            name = element.get("name", "")
+            items.append((name, parse_value(element.get("value", ""))))
+        elif tag == "Property" and element.get("id"):
+            items.append((element.get("id", ""), _property_value(element)))
+    return items
+
+
+def read_xisf_header(path: str, keys: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Reads FITS keyword and property values from an XISF file without touching
+    its image data.
+
+    Args:
+        path (str): Path to the XISF file.
+        keys (iterable): Keywords or property ids to read. All are read if omitted.
+
+    Returns:
+        dict: Values by upper-case keyword or property id. Only the first
+        occurrence of a repeated keyword is kept.
+    """
+    wanted = None if keys is None else {k.upper() for k in keys}
+    header: Dict[str, Any] = {}
+    for name, value in xisf_items(read_xisf_xml(path)):
+        key = name.upper()
+        if key in header or (wanted is not None and key not in wanted):
+            continue
+        header[key] = value
+    return header
+
+
+def read_xisf_keys(path: str) -> List[str]:
+    """Returns the FITS keyword names and property ids of an XISF file."""
+    return [name for name, _ in xisf_items(read_xisf_xml(path))]
@@ -0,0 +1,50 @@
+"""
+Makes the scripts in python/ and the synthetic session generator in
+benchmarks/ importable by the tests.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Appended rather than prepended, so python/statistics.py does not shadow the
+# standard library module
+sys.path.append(os.path.join(ROOT, "python"))
+sys.path.append(os.path.join(ROOT, "benchmarks"))
+
+from generate_sessions import generate_sessions  # noqa: E402
+
+
+@pytest.fixture
+def write_frame():
+    """
+    Returns a function that writes a FITS frame with the given data (a 2x2
+    uint16 image by default) and headers, and returns its path.
+    """
+
+    def write(path, data=None, **headers):
+        header = fits.Header()
+        for key, value in headers.items():
+            header[key] = value
+        if data is None:
+            data = np.zeros((2, 2), np.uint16)
+        fits.PrimaryHDU(data, header=header).writeto(path)
+        return str(path)
+
+    return write
+
+
+@pytest.fixture(params=["fits", "xisf"])
+def sessions(request, tmp_path):
+    """
+    Two synthetic N.I.N.A. nights of 20 LIGHT frames each, in FITS and XISF.
+    Each night has two targets, one per filter, and 10 flats per filter.
+    """
+    return generate_sessions(
+        str(tmp_path / "sessions"), 40, 20, file_format=request.param
+    )
@@ -0,0 +1,165 @@
+import os
+
+from archive_manifest import ArchiveManifest
+from archive_sources import (
+    build_plan,
+    index_session,
+    plan_astrophotographs,
+    process_nightly_sessions,
+    sort_astrophotographs,
+)
+from copy_engine import CopyEngine
+
+BARNARD_HA = "LIGHT_2025-01-01_21-00-00_Barnard 150_Ha_-10.00_300.00s_0000.fits"
+FLAT_HA = "FLAT_2025-01-02_06-00-00_FlatWizard_Ha_-10.00_1.00s_0000.fits"
+FLAT_OIII = "FLAT_2025-01-02_06-00-05_FlatWizard_OIII_-10.00_1.00s_0000.fits"
+
+NIGHT = [
+    BARNARD_HA,
+    "LIGHT_2025-01-01_23-00-00_Barnard 150_Ha_-10.00_300.00s_0001.fits",
+    # After midnight, so still in the session of 2025-01-01
+    "LIGHT_2025-01-02_01-00-00_M 31_OIII_-10.00_300.00s_0000.xisf",
+    FLAT_HA,
+    FLAT_OIII,
+    "FLAT_2025-01-02_06-00-10_FlatWizard_SII_-10.00_1.00s_0000.fits",
+    "DARK_2025-01-02_07-00-00_Dark__-10.00_300.00s_0000.fits",
+    "ImageMetaData.csv",
+    "WeatherData.csv",
+    "notes.txt",
+]
+
+
+def make_session(directory, names):
+    directory.mkdir(parents=True)
+    for name in names:
+        (directory / name).write_text(name)
+    return str(directory)
+
+
+def relative(pairs, root):
+    return sorted(os.path.relpath(destination, root) for _, destination in pairs)
+
+
+def test_plan_sorts_lights_and_their_flats_by_target(tmp_path):
+    source = make_session(tmp_path / "2025-01-01", NIGHT)
+    destination = str(tmp_path / "archive")
+
+    plan = plan_astrophotographs(source, destination)
+
+    barnard, m31 = "Barnard 150/SESSION_2025-01-01", "M 31/SESSION_2025-01-01"
+    assert sorted(os.path.relpath(d, destination) for d in plan.directories) == [
+        barnard,
+        m31,
+    ]
+    assert relative(plan.lights, destination) == sorted(
+        os.path.join(barnard if "Barnard" in name else m31, name) for name in NIGHT[:3]
+    )
+    # Only the flats of the filters the target used, and no SII flats
+    assert relative(plan.flats, destination) == [
+        os.path.join(barnard, FLAT_HA),
+        os.path.join(m31, FLAT_OIII),
+    ]
+    # The session CSV files are copied into every folder of the session
+    assert relative(plan.special_files, destination) == [
+        os.path.join(folder, name)
+        for folder in (barnard, m31)
+        for name in ("ImageMetaData.csv", "WeatherData.csv")
+    ]
+    assert not os.path.exists(destination)
+
+
+def test_sort_copies_the_planned_files(tmp_path):
+    source = make_session(tmp_path / "2025-01-01", NIGHT)
+    destination = tmp_path / "archive"
+
+    sort_astrophotographs(source, str(destination))
+
+    plan = plan_astrophotographs(source, str(destination))
+    copies = plan.lights + plan.flats + plan.special_files
+    copied = sorted(
+        os.path.relpath(os.path.join(directory, name), destination)
+        for directory, _, names in os.walk(destination)
+        for name in names
+    )
+    assert copied == relative(copies, str(destination))
+    for source_file, destination_file in copies:
+        with open(destination_file) as f:
+            assert f.read() == os.path.basename(source_file)
+
+
+def archive(source, destination):
+    """Archives a session with a manifest, and returns the drained engine."""
+    with ArchiveManifest(destination) as manifest, CopyEngine(2) as engine:
+        sort_astrophotographs(source, destination, engine, manifest=manifest)
+    return engine
+
+
+def test_rerun_copies_only_new_files(tmp_path):
+    source = make_session(tmp_path / "2025-01-01", NIGHT)
+    destination = str(tmp_path / "archive")
+
+    assert archive(source, destination).files_copied == 3 + 2 + 4
+    assert archive(source, destination).files_copied == 0
+
+    new_light = "LIGHT_2025-01-02_02-00-00_M 31_OIII_-10.00_300.00s_0001.xisf"
+    (tmp_path / "2025-01-01" / new_light).write_text(new_light)
+    assert archive(source, destination).files_copied == 1
+    assert os.path.exists(
+        os.path.join(destination, "M 31", "SESSION_2025-01-01", new_light)
+    )
+
+
+def test_rerun_repairs_damaged_copies(tmp_path):
+    source = make_session(tmp_path / "2025-01-01", NIGHT)
+    destination = str(tmp_path / "archive")
+    archive(source, destination)
+
+    # A flat truncated by an interrupted run of an older version, which is
+    # not in the manifest, is copied again
+    flat = os.path.join(destination, "Barnard 150", "SESSION_2025-01-01", FLAT_HA)
+    with open(flat, "r+b") as f:
+        f.truncate(4)
+    manifest_path = os.path.join(destination, ".archive_manifest.jsonl")
+    with open(manifest_path) as f:
+        lines = [line for line in f if FLAT_HA not in line]
+    with open(manifest_path, "w") as f:
+        f.writelines(lines)
+
+    assert archive(source, destination).files_copied == 1
+    with open(flat) as f:
+        assert f.read() == FLAT_HA
+    assert not [
+        name
+        for _, _, names in os.walk(destination)
+        for name in names
+        if name.endswith(".part")
+    ]
+
+
+def test_batch_matches_flats_exported_into_another_session(tmp_path):
+    parent = tmp_path / "export"
+    make_session(parent / "2025-01-01", NIGHT[:3] + ["ImageMetaData.csv"])
+    make_session(parent / "2025-01-02", [FLAT_HA, FLAT_OIII])
+    destination = str(tmp_path / "archive")
+
+    process_nightly_sessions(str(parent), destination)
+
+    for folder, flat in (("Barnard 150", FLAT_HA), ("M 31", FLAT_OIII)):
+        assert os.path.exists(
+            os.path.join(destination, folder, "SESSION_2025-01-01", flat)
+        )
+
+
+def test_flat_tolerance_falls_back_to_the_nearest_session(tmp_path):
+    later = "LIGHT_2025-01-03_22-00-00_Barnard 150_Ha_-10.00_300.00s_0000.fits"
+    flats = make_session(tmp_path / "flats", [FLAT_HA, FLAT_OIII])
+    lights = make_session(tmp_path / "2025-01-03", [later])
+    indexes = [index_session(flats), index_session(lights)]
+    destination = str(tmp_path / "archive")
+
+    # The flats belong to the session of 2025-01-01, two days earlier
+    assert build_plan(indexes, destination, flat_tolerance=1).flats == []
+    plan = build_plan(indexes, destination, flat_tolerance=2)
+    assert relative(plan.flats, destination) == [
+        os.path.join("Barnard 150", "SESSION_2025-01-03", FLAT_HA)
+    ]
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+from astropy.io import fits
+
+import build_masters
+from build_masters import build_master, group_calibration_frames
+
+NAMES = [
+    "DARK_2025-08-06_06-00-00_Dark__-9.90_300.00s_0000.fits",
+    "DARK_2025-08-06_06-05-00_Dark__-10.00_300.00s_0001.fits",
+    "DARK_2025-08-06_06-10-00_Dark__-10.10_300.00s_0002.fits",
+    "DARK_2025-08-06_06-15-00_Dark__-10.00_60.00s_0000.fits",
+    "DARK_2025-08-06_06-20-00_Dark__0.20_300.00s_0000.fits",
+    "BIAS_2025-08-06_06-30-00_Bias__-10.00_0.00s_0000.fits",
+    "BIAS_2025-08-06_06-30-01_Bias__-10.00_0.00s_0001.fits",
+    "FLAT_2025-08-06_06-40-00_FlatWizard_Ha_-10.00_1.00s_0000.fits",
+    "FLAT_2025-08-06_06-40-05_FlatWizard_OIII_-10.00_1.00s_0000.fits",
+    "LIGHT_2025-08-05_23-40-14_M 31_Ha_-10.00_300.00s_0000.fits",
+]
+
+
+def summary(groups):
+    return {g.name: (len(g.paths), g.temperature) for g in groups}
+
+
+def test_groups_darks_around_a_set_point(tmp_path):
+    for name in NAMES:
+        (tmp_path / name).touch()
+
+    assert summary(group_calibration_frames(str(tmp_path))) == {
+        "MasterBias_-10.00C": (2, -10.0),
+        "MasterDark_300.00s_-10.00C": (3, -10.0),
+        "MasterDark_300.00s_0.00C": (1, 0.2),
+        "MasterDark_60.00s_-10.00C": (1, -10.0),
+        "MasterFlat_2025-08-05_Ha": (1, None),
+        "MasterFlat_2025-08-05_OIII": (1, None),
+    }
+
+
+def test_groups_flats_of_several_nights_by_session_and_filter(tmp_path):
+    for night, morning in (("2025-01-01", "2025-01-02"), ("2025-01-02", "2025-01-03")):
+        (tmp_path / night).mkdir()
+        for filter_name in ("Ha", "OIII"):
+            for i in range(10):
+                name = f"FLAT_{morning}_06-00-{i:02d}_FlatWizard_{filter_name}"
+                (tmp_path / night / f"{name}_-10.00_1.00s_{i:04d}.fits").touch()
+
+    assert summary(group_calibration_frames(str(tmp_path))) == {
+        f"MasterFlat_{night}_{filter_name}": (10, None)
+        for night in ("2025-01-01", "2025-01-02")
+        for filter_name in ("Ha", "OIII")
+    }
+
+
+def test_zero_tolerance_groups_by_exact_temperature(tmp_path):
+    for name in NAMES[:3]:
+        (tmp_path / name).touch()
+
+    assert sorted(summary(group_calibration_frames(str(tmp_path), 0))) == [
+        "MasterDark_300.00s_-10.00C",
+        "MasterDark_300.00s_-10.10C",
+        "MasterDark_300.00s_-9.90C",
+    ]
+
+
+@pytest.mark.parametrize("method", ["median", "sigma-clip"])
+def test_builds_a_master_with_the_mean_temperature(write_frame, tmp_path, method):
+    source = tmp_path / "source"
+    source.mkdir()
+    for i, name in enumerate(NAMES[:3]):
+        write_frame(source / name, np.full((4, 6), 100 + i, np.uint16), GAIN=100)
+    (group,) = group_calibration_frames(str(source))
+    output = str(tmp_path / f"{group.name}.fits")
+
+    build_master(group, output, None, method, 3.0, 1)
+
+    with fits.open(output) as hdul:
+        hdul.verify("exception")
+        header, data = hdul[0].header, hdul[0].data
+        assert header["NCOMBINE"] == 3
+        assert header["CCD-TEMP"] == -10.0
+        assert header["EXPTIME"] == 300.0
+        assert header["GAIN"] == 100
+        np.testing.assert_allclose(data, np.full((4, 6), 101.0))
+    # The frames are no longer mapped
+    assert build_masters._mapped.cache_info().currsize == 0
+
+
+def test_removes_the_partial_master_when_stacking_fails(
+    write_frame, tmp_path, monkeypatch
+):
+    for name in NAMES[:3]:
+        write_frame(tmp_path / name)
+    (group,) = group_calibration_frames(str(tmp_path))
+
+    def stack_band(task):
+        raise MemoryError
+
+    monkeypatch.setattr(build_masters, "stack_band", stack_band)
+    output = tmp_path / "masters" / f"{group.name}.fits"
+    output.parent.mkdir()
+    with pytest.raises(MemoryError):
+        build_master(group, str(output), None)
+    assert list(output.parent.iterdir()) == []
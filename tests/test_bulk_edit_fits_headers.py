@@ -0,0 +1,133 @@
+import os
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from bulk_edit_fits_headers import apply_edits
+from header_io import BLOCK_SIZE, read_header_cards
+
+DATA = np.arange(12, dtype=np.int16).reshape(3, 4)
+
+
+def read_frame(path):
+    """Returns the header and data of a frame that passes astropy's checks."""
+    with fits.open(path) as hdul:
+        hdul.verify("exception")
+        return hdul[0].header.copy(), hdul[0].data.copy()
+
+
+def test_edits_in_place_within_the_header_blocks(write_frame, tmp_path):
+    path = write_frame(tmp_path / "frame.fits", DATA, FILTER=("Ha", "filter name"))
+    size = os.path.getsize(path)
+
+    assert apply_edits(path, [("FILTER", "OIII"), ("GAIN", 100), ("FOCRATIO", 5.4)])
+
+    assert os.path.getsize(path) == size
+    header, data = read_frame(path)
+    assert header["FILTER"] == "OIII"
+    assert header.comments["FILTER"] == "filter name"
+    assert header["GAIN"] == 100
+    assert header["FOCRATIO"] == 5.4
+    np.testing.assert_array_equal(data, DATA)
+
+
+def test_grows_the_header_into_a_new_block(write_frame, tmp_path):
+    path = write_frame(tmp_path / "frame.fits", DATA, OBJECT="M 31")
+    _, header_size = read_header_cards(path)
+    size = os.path.getsize(path)
+    edits = [(f"KEY{i}", i) for i in range(40)]
+
+    assert not apply_edits(path, edits)
+
+    assert os.path.getsize(path) == size + BLOCK_SIZE
+    assert read_header_cards(path)[1] == header_size + BLOCK_SIZE
+    header, data = read_frame(path)
+    assert header["OBJECT"] == "M 31"
+    assert [header[f"KEY{i}"] for i in range(40)] == list(range(40))
+    np.testing.assert_array_equal(data, DATA)
+    assert os.listdir(tmp_path) == ["frame.fits"]
+
+
+def test_replaces_a_continued_string_and_its_continue_cards(write_frame, tmp_path):
+    path = write_frame(
+        tmp_path / "frame.fits",
+        DATA,
+        NOTES=("x" * 150, "observing notes"),
+        AFTER=1,
+    )
+
+    assert apply_edits(path, [("NOTES", "short"), ("AFTER", 2)])
+
+    header, data = read_frame(path)
+    assert header["NOTES"] == "short"
+    assert header.comments["NOTES"] == "observing notes"
+    assert header["AFTER"] == 2
+    assert "CONTINUE" not in header
+    np.testing.assert_array_equal(data, DATA)
+
+
+def test_keeps_continue_cards_of_other_keywords(write_frame, tmp_path):
+    path = write_frame(tmp_path / "frame.fits", DATA, NOTES="y" * 150, AFTER=1)
+
+    assert apply_edits(path, [("AFTER", 2)])
+
+    header, _ = read_frame(path)
+    assert header["NOTES"] == "y" * 150
+    assert header["AFTER"] == 2
+
+
+@pytest.mark.parametrize("value", [float("nan"), float("inf")])
+def test_rejects_non_finite_values_without_touching_the_file(
+    write_frame, tmp_path, value
+):
+    path = write_frame(tmp_path / "frame.fits", DATA, OBJECT="M 31")
+    with open(path, "rb") as f:
+        original = f.read()
+
+    with pytest.raises(ValueError):
+        apply_edits(path, [("CCD-TEMP", value)])
+
+    with open(path, "rb") as f:
+        assert f.read() == original
+
+
+def test_round_trips_unsigned_frames(write_frame, tmp_path):
+    data = np.arange(64, dtype=np.uint16).reshape(8, 8) * 1000
+    for i in range(5):
+        path = write_frame(
+            tmp_path / f"LIGHT_{i:04d}.fits",
+            data,
+            IMAGETYP="LIGHT",
+            OBJECT="Barnard 150",
+            FILTER="Ha",
+            EXPTIME=300.0,
+        )
+        size = os.path.getsize(path)
+        edits = [("OBJECT", "M 31"), ("FRAMENO", i), ("NOTES", "x" * 60)]
+
+        assert apply_edits(path, edits)
+
+        assert os.path.getsize(path) == size
+        header, frame = read_frame(path)
+        assert (header["OBJECT"], header["FRAMENO"]) == ("M 31", i)
+        assert header["NOTES"] == "x" * 60
+        assert header["BZERO"] == 32768
+        np.testing.assert_array_equal(frame, data)
+
+
+def test_rewrites_hardlinked_files_instead_of_editing_every_link(write_frame, tmp_path):
+    raw = write_frame(tmp_path / "raw.fits", DATA, OBJECT="M 31")
+    archived = str(tmp_path / "archived.fits")
+    os.link(raw, archived)
+    with open(raw, "rb") as f:
+        original = f.read()
+
+    assert not apply_edits(archived, [("OBJECT", "M 33")])
+
+    with open(raw, "rb") as f:
+        assert f.read() == original
+    header, data = read_frame(archived)
+    assert header["OBJECT"] == "M 33"
+    np.testing.assert_array_equal(data, DATA)
+    assert os.stat(raw).st_nlink == 1
@@ -0,0 +1,58 @@
+import hashlib
+import os
+
+import pytest
+
+from flat_store import STORE_DIR_NAME, FlatStore, gc
+
+
+def store_flat(archive, link_type, name, content):
+    """Stores a flat with the given content and links it into a target."""
+    source = archive.parent / "export" / name
+    source.parent.mkdir(parents=True, exist_ok=True)
+    source.write_text(content)
+    destination = archive / "M 31" / "SESSION_2025-01-01" / name
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    FlatStore(str(archive), link_type).place(str(source), str(destination))
+    return destination
+
+
+def blob(archive, content):
+    digest = hashlib.sha256(content.encode()).hexdigest()
+    return FlatStore(str(archive)).blob_path(digest, ".fits")
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """
+    An archive with a blob linked by a hardlink, one linked by a symlink, an
+    orphaned blob and a leftover temporary file.
+    """
+    archive = tmp_path / "archive"
+    store_flat(archive, "hard", "FLAT_Ha.fits", "Ha")
+    store_flat(archive, "symlink", "FLAT_OIII.fits", "OIII")
+    store_flat(archive, "hard", "FLAT_SII.fits", "SII").unlink()
+    (archive / STORE_DIR_NAME / "tmp" / "0123abcd").write_text("partial")
+    return archive
+
+
+def test_gc_removes_only_unreferenced_blobs(archive):
+    removed = gc(str(archive))
+
+    tmp_file = os.path.join(archive, STORE_DIR_NAME, "tmp", "0123abcd")
+    assert sorted(removed) == sorted([blob(archive, "SII"), tmp_file])
+    assert not os.path.exists(blob(archive, "SII"))
+    assert not os.path.exists(tmp_file)
+    for name, content in (("FLAT_Ha.fits", "Ha"), ("FLAT_OIII.fits", "OIII")):
+        assert os.path.exists(blob(archive, content))
+        link = archive / "M 31" / "SESSION_2025-01-01" / name
+        assert link.read_text() == content
+    assert gc(str(archive)) == []
+
+
+def test_gc_dry_run_only_lists_the_candidates(archive, capsys):
+    removed = gc(str(archive), dry_run=True)
+
+    assert blob(archive, "SII") in removed
+    assert all(os.path.exists(path) for path in removed)
+    assert f"Would remove {blob(archive, 'SII')}" in capsys.readouterr().out
@@ -0,0 +1,110 @@
+import pytest
+
+from frame_names import FrameName, parse_frame_name, session_date
+
+
+def test_parses_a_light_frame_name():
+    name = "LIGHT_2025-08-05_23-40-14_Barnard 150_UV-IR-cut_-10.00_300.00s_0007.xisf"
+    assert parse_frame_name(name) == FrameName(
+        "LIGHT",
+        "2025-08-05",
+        "2025-08-05",
+        "23-40-14",
+        "Barnard 150",
+        "UV-IR-cut",
+        -10.0,
+        300.0,
+        7,
+    )
+
+
+@pytest.mark.parametrize(
+    "target",
+    ["M_31", "M 31_Panel_1", "Sh2_101_Ha"],
+)
+def test_keeps_underscores_in_the_target(target):
+    frame = parse_frame_name(
+        f"LIGHT_2025-01-01_21-00-00_{target}_OIII_-10.00_300.00s_0000.fits"
+    )
+    assert (frame.target, frame.filter_name) == (target, "OIII")
+    assert (frame.temperature, frame.duration, frame.sequence) == (-10.0, 300.0, 0)
+
+
+def test_parses_targets_that_look_like_a_duration():
+    # The old heuristic stopped at any field ending in "s"
+    frame = parse_frame_name("LIGHT_2025-01-01_21-00-00_Pleiades_L_-5.00_60.00s_0012")
+    assert (frame.target, frame.filter_name, frame.sequence) == ("Pleiades", "L", 12)
+
+
+def test_parses_names_that_only_follow_the_convention_up_to_the_filter():
+    frame = parse_frame_name("FLAT_2025-01-02_06-00-00_FlatWizard_Ha_extra.fits")
+    assert frame == FrameName(
+        "FLAT",
+        "2025-01-01",
+        "2025-01-02",
+        "06-00-00",
+        "FlatWizard",
+        "Ha",
+        None,
+        None,
+        None,
+    )
+
+
+@pytest.mark.parametrize(
+    "name",
+    [
+        "ImageMetaData.csv",
+        "LIGHT_2025-01-01_21-00-00.fits",
+        "LIGHT_20250101_21-00-00_M 31_Ha_-10.00_300.00s_0000.fits",
+    ],
+)
+def test_rejects_names_without_type_date_and_time(name):
+    with pytest.raises(ValueError, match="Invalid file name format"):
+        parse_frame_name(name)
+
+
+@pytest.mark.parametrize(
+    "time, expected",
+    [
+        ("00-00-00", "2025-06-14"),
+        ("11-59-59", "2025-06-14"),
+        ("12-00-00", "2025-06-15"),
+        ("23-59-59", "2025-06-15"),
+    ],
+)
+def test_frames_before_noon_belong_to_the_previous_night(time, expected):
+    assert session_date("2025-06-15", time) == expected
+    name = f"LIGHT_2025-06-15_{time}_M 31_Ha_-10.00_300.00s_0000.fits"
+    assert parse_frame_name(name).session_date == expected
+
+
+@pytest.mark.parametrize(
+    "day, expected",
+    [
+        ("2025-03-01", "2025-02-28"),
+        ("2024-03-01", "2024-02-29"),
+        ("2000-03-01", "2000-02-29"),
+        ("2100-03-01", "2100-02-28"),
+        ("2025-05-01", "2025-04-30"),
+        ("2025-08-01", "2025-07-31"),
+        ("2025-01-01", "2024-12-31"),
+    ],
+)
+def test_session_date_crosses_month_and_year_boundaries(day, expected):
+    assert session_date(day, "01-30-00") == expected
+
+
+@pytest.mark.parametrize(
+    "day, time, error",
+    [
+        ("2025-02-29", "21-00-00", "Invalid date"),
+        ("2025-13-01", "21-00-00", "Invalid date"),
+        ("2025-04-31", "21-00-00", "Invalid date"),
+        ("2025-01-01", "24-00-00", "Invalid time"),
+        ("2025-01-01", "21-60-00", "Invalid time"),
+    ],
+)
+def test_rejects_invalid_dates_and_times(day, time, error):
+    with pytest.raises(ValueError, match=error):
+        parse_frame_name(f"LIGHT_{day}_{time}_M 31_Ha_-10.00_300.00s_0000.fits")
@@ -0,0 +1,58 @@
+import csv
+
+import numpy as np
+
+from frame_quality import load_metadata
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+
+def frame(name, **metrics):
+    return dict(FilePath=f"C:/Images/{name}", FilterName="Ha", **metrics)
+
+
+def test_combines_files_with_different_columns(tmp_path):
+    old = write_csv(
+        tmp_path / "old.csv",
+        [
+            frame("LIGHT_2025-08-05_23-40-14_M 31_Ha_-10.00_300.00s_0000.xisf", HFR=2),
+            frame("FLAT_2025-08-06_06-00-00_FlatWizard_Ha_-10.00_1.00s_0000.xisf"),
+        ],
+    )
+    # A newer version with reordered, extra and quoted columns
+    new = write_csv(
+        tmp_path / "new.csv",
+        [
+            dict(
+                Extra="a, b",
+                HFR="1.5",
+                FWHM="3.0",
+                **frame("LIGHT_2025-08-06_23-40-14_M 31_Ha_-10.00_300.00s_0001.xisf"),
+            )
+        ],
+    )
+
+    columns = load_metadata([old, new])
+
+    assert list(columns["Target"]) == ["M 31", "M 31"]
+    assert list(columns["HFR"]) == [2.0, 1.5]
+    assert np.isnan(columns["FWHM"][0]) and columns["FWHM"][1] == 3.0
+
+
+def test_skips_files_without_file_paths(tmp_path, capsys):
+    good = write_csv(
+        tmp_path / "good.csv",
+        [frame("LIGHT_2025-08-05_23-40-14_M 31_Ha_-10.00_300.00s_0000.xisf", HFR=2)],
+    )
+    bad = write_csv(tmp_path / "bad.csv", [{"Name": "x", "HFR": "1"}])
+
+    columns = load_metadata([bad, good])
+
+    assert list(columns["HFR"]) == [2.0]
+    assert f"Skipping {bad}" in capsys.readouterr().out
@@ -0,0 +1,57 @@
+import csv
+import os
+
+from astropy.io import fits
+
+from frame_names import parse_frame_name
+from header_io import read_primary_header
+
+
+def frames(session_dir):
+    return sorted(f for f in os.listdir(session_dir) if not f.endswith(".csv"))
+
+
+def test_sessions_follow_the_nina_layout(sessions):
+    assert [os.path.basename(s) for s in sessions] == ["2025-01-01", "2025-01-02"]
+    for session_dir in sessions:
+        names = frames(session_dir)
+        lights = [name for name in names if name.startswith("LIGHT_")]
+        assert len(lights) == 20
+        # Ten lights per filter, so two filters, and ten flats of each
+        assert len(names) - len(lights) == 2 * 10
+        for name in names:
+            frame = parse_frame_name(name)
+            assert frame.session_date == os.path.basename(session_dir)
+        assert sorted(f for f in os.listdir(session_dir) if f.endswith(".csv")) == [
+            "AcquisitionDetails.csv",
+            "ImageMetaData.csv",
+            "WeatherData.csv",
+        ]
+
+
+def test_frame_headers_match_their_names(sessions):
+    for session_dir in sessions:
+        for name in frames(session_dir):
+            path = os.path.join(session_dir, name)
+            frame = parse_frame_name(name)
+            header = read_primary_header(path, ["IMAGETYP", "FILTER", "OBJECT"])
+            assert header == {
+                "IMAGETYP": frame.frame_type,
+                "FILTER": frame.filter_name,
+                "OBJECT": frame.target,
+            }
+            if name.endswith(".fits"):
+                with fits.open(path) as hdul:
+                    hdul.verify("exception")
+                    assert hdul[0].data.shape == (8, 8)
+
+
+def test_metadata_rows_describe_the_lights(sessions):
+    for session_dir in sessions:
+        with open(os.path.join(session_dir, "ImageMetaData.csv"), newline="") as f:
+            rows = list(csv.DictReader(f))
+        lights = [name for name in frames(session_dir) if name.startswith("LIGHT_")]
+        assert sorted(row["FilePath"].rsplit("/", 1)[1] for row in rows) == lights
+        assert all(float(row["HFR"]) > 0 for row in rows)
+        with open(os.path.join(session_dir, "WeatherData.csv"), newline="") as f:
+            assert len(list(csv.DictReader(f))) == len(rows)
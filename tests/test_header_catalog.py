@@ -0,0 +1,157 @@
+import pytest
+
+from header_catalog import index_archive, parse_where, query
+
+
+def condition(key, column, op):
+    return f"id IN (SELECT file_id FROM cards WHERE key = ? AND {column} {op} ?)"
+
+
+@pytest.mark.parametrize(
+    "where, sql, params",
+    [
+        ("EXPTIME>=300", condition("EXPTIME", "num", ">="), ["EXPTIME", 300.0]),
+        ("ccd-temp<-9.5", condition("CCD-TEMP", "num", "<"), ["CCD-TEMP", -9.5]),
+        ("FILTER=Ha", condition("FILTER", "value", "="), ["FILTER", "Ha"]),
+        ("OBJECT = M 31", condition("OBJECT", "value", "="), ["OBJECT", "M 31"]),
+        ("OBJECT='M 31'", condition("OBJECT", "value", "="), ["OBJECT", "M 31"]),
+        ('GAIN="100"', condition("GAIN", "value", "="), ["GAIN", "100"]),
+        ("SIMPLE=T", condition("SIMPLE", "value", "="), ["SIMPLE", "T"]),
+        (
+            "FILTER!=Ha",
+            "id NOT IN (SELECT file_id FROM cards WHERE key = ? AND value = ?)",
+            ["FILTER", "Ha"],
+        ),
+    ],
+)
+def test_parse_where(where, sql, params):
+    assert parse_where(where) == (sql, params)
+
+
+def test_parse_where_joins_conditions_with_and():
+    sql, params = parse_where("FILTER=Ha and EXPTIME>=300")
+    assert sql == (
+        condition("FILTER", "value", "=") + " AND " + condition("EXPTIME", "num", ">=")
+    )
+    assert params == ["FILTER", "Ha", "EXPTIME", 300.0]
+
+
+@pytest.mark.parametrize(
+    "where",
+    [
+        "FILTER=Ha OR FILTER=OIII",
+        "FILTER=Ha OR OIII",
+        "EXPTIME=>300",
+        "EXPTIME==300",
+        "FILTER=",
+        "FILTER",
+        "FILTER=Ha AND",
+        "OBJECT='M 31",
+    ],
+)
+def test_parse_where_rejects_invalid_conditions(where):
+    with pytest.raises(ValueError, match="Invalid condition"):
+        parse_where(where)
+
+
+def test_query_matches_logicals_as_fits_writes_them(write_frame, tmp_path):
+    archive = tmp_path / "archive"
+    archive.mkdir()
+    write_frame(archive / "a.fits", FILTER="Ha", EXPTIME=300.0, ROWORDER=False)
+    write_frame(archive / "b.fits", FILTER="OIII", EXPTIME=60.0, ROWORDER=True)
+    catalog = str(tmp_path / "catalog.sqlite")
+    index_archive(catalog, str(archive))
+
+    def names(where):
+        return [row[0].rsplit("/", 1)[1] for row in query(catalog, [], where)]
+
+    assert names("SIMPLE=T") == ["a.fits", "b.fits"]
+    assert names("ROWORDER=F") == ["a.fits"]
+    assert names("ROWORDER!=F") == ["b.fits"]
+    assert names("FILTER=Ha AND EXPTIME>=300") == ["a.fits"]
+    assert names("EXPTIME<300") == ["b.fits"]
+    assert query(catalog, ["ROWORDER", "FILTER"], "FILTER=OIII")[0][1:] == (
+        "T",
+        "OIII",
+    )
+
+
+def test_indexes_an_archive_and_refreshes_only_changed_files(
+    write_frame, tmp_path, capsys
+):
+    archive = tmp_path / "archive"
+    for night in ("2025-01-01", "2025-01-02"):
+        (archive / night).mkdir(parents=True)
+        for i, (target, filter_name) in enumerate(
+            [("Barnard 150", "Ha"), ("M 31", "Ha"), ("M 31", "OIII")] * 2
+        ):
+            write_frame(
+                archive / night / f"LIGHT_{i:04d}.fits",
+                IMAGETYP="LIGHT",
+                OBJECT=target,
+                FILTER=filter_name,
+                EXPTIME=300.0 if filter_name == "Ha" else 180.0,
+            )
+        write_frame(archive / night / "FLAT_0000.fits", IMAGETYP="FLAT", FILTER="Ha")
+    catalog = str(tmp_path / "catalog.sqlite")
+    index_archive(catalog, str(archive), jobs=2)
+
+    rows = query(catalog, ["OBJECT"], "IMAGETYP=LIGHT AND FILTER=Ha AND EXPTIME>=300")
+    assert len(rows) == 8
+    assert {row[1] for row in rows} == {"Barnard 150", "M 31"}
+    assert len(query(catalog, [], "IMAGETYP!=LIGHT")) == 2
+    assert len(query(catalog, [], "EXPTIME<300 AND FILTER='OIII'")) == 4
+
+    changed = archive / "2025-01-01" / "LIGHT_0000.fits"
+    changed.unlink()
+    write_frame(changed, IMAGETYP="LIGHT", OBJECT="NGC 7000", FILTER="Ha")
+    (archive / "2025-01-02" / "FLAT_0000.fits").unlink()
+    capsys.readouterr()
+    index_archive(catalog, str(archive))
+
+    assert "Indexing 1 new or changed files, removing 1, 12 unchanged" in (
+        capsys.readouterr().out
+    )
+    assert query(catalog, [], "OBJECT='NGC 7000'") == [(str(changed),)]
+    assert len(query(catalog, [], "IMAGETYP!=LIGHT")) == 1
+
+
+def test_indexing_an_archive_keeps_archives_differing_only_in_case(
+    write_frame, tmp_path, capsys
+):
+    catalog = str(tmp_path / "catalog.sqlite")
+    for name in ("Astro", "astro"):
+        (tmp_path / name).mkdir()
+        write_frame(tmp_path / name / "a.fits", OBJECT=name)
+        index_archive(catalog, str(tmp_path / name))
+    capsys.readouterr()
+
+    index_archive(catalog, str(tmp_path / "Astro"))
+
+    assert "removing 0" in capsys.readouterr().out
+    assert sorted(row[1] for row in query(catalog, ["OBJECT"], None)) == [
+        "Astro",
+        "astro",
+    ]
+
+
+def test_query_does_not_create_a_missing_catalog(tmp_path):
+    catalog = tmp_path / "catalog.sqlite"
+
+    with pytest.raises(FileNotFoundError, match="No such header catalog"):
+        query(str(catalog), ["EXPTIME"], None)
+    assert not catalog.exists()
+
+
+def test_query_rejects_files_that_are_not_cataloged(write_frame, tmp_path):
+    archive = tmp_path / "archive"
+    archive.mkdir()
+    cataloged = write_frame(archive / "a.fits", FILTER="Ha")
+    catalog = str(tmp_path / "catalog.sqlite")
+    index_archive(catalog, str(archive))
+
+    # A cataloged file excluded by the conditions is not an error
+    assert query(catalog, ["FILTER"], "FILTER=OIII", [cataloged]) == []
+    missing = str(tmp_path / "b.fits")
+    with pytest.raises(KeyError, match="is not in the catalog"):
+        query(catalog, ["FILTER"], None, [cataloged, missing])
@@ -0,0 +1,47 @@
+import math
+
+import pytest
+
+from header_io import card_comment, continuation_end, format_card, parse_cards
+
+
+@pytest.mark.parametrize(
+    "value",
+    ["M 31", "it's", True, False, 42, -7, 300.0, 1.5e-05, 6.02e23],
+)
+def test_format_card_round_trip(value):
+    card = format_card("KEY", value, "a comment")
+    assert len(card) == 80
+    assert parse_cards([card]) == {"KEY": value}
+    assert card_comment(card) == "a comment"
+
+
+def test_format_card_writes_hierarch_for_long_keys():
+    card = format_card("CAMERA GAIN", 100)
+    assert card.startswith("HIERARCH CAMERA GAIN = 100")
+    assert parse_cards([card]) == {"CAMERA GAIN": 100}
+
+
+@pytest.mark.parametrize("value", [math.nan, math.inf, -math.inf])
+def test_format_card_rejects_non_finite_floats(value):
+    with pytest.raises(ValueError, match="not a finite number"):
+        format_card("KEY", value)
+
+
+def test_format_card_rejects_strings_longer_than_a_card():
+    with pytest.raises(ValueError, match="does not fit"):
+        format_card("KEY", "x" * 80)
+
+
+def test_continuation_end():
+    cards = [
+        "LONGSTR = 'abc&'".ljust(80),
+        "CONTINUE  'def&'".ljust(80),
+        "CONTINUE  'ghi' / the comment".ljust(80),
+        "CONTINUE  'stray'".ljust(80),
+        format_card("AFTER", 1),
+    ]
+    assert continuation_end(cards, 0) == 3
+    assert continuation_end(cards, 4) == 5
+    assert card_comment(cards[2]) == "the comment"
+    assert parse_cards(cards) == {"LONGSTR": "abcdefghi", "AFTER": 1}
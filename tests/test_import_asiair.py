@@ -0,0 +1,83 @@
+import os
+
+from import_asiair import import_files, plan_import, read_checksums, verify_checksums
+
+LIGHT = "Light_M 31_300.0s_Bin1_2600MC_gain100_20250101-210000_-10.0C_0001.fit"
+FLAT = "Flat_1.0ms_Bin1_2600MC_gain100_20250102-060000_-10.0C_0001.fit"
+
+
+def write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+def relative(pairs, root):
+    return [os.path.relpath(destination, root) for _, destination in pairs]
+
+
+def test_plan_classifies_frames_by_type_and_target(tmp_path):
+    stick = tmp_path / "stick"
+    write(stick / "Autorun" / "Light" / "M 31" / LIGHT, b"light")
+    write(stick / "Autorun" / "Flat" / FLAT, b"flat")
+    write(stick / "Autorun" / "Flat" / ("._" + FLAT), b"resource fork")
+    write(stick / "Autorun" / "Log" / "Autorun_Log.txt", b"log")
+
+    plan = plan_import(str(stick), str(tmp_path / "target"))
+
+    assert plan.targets == ["M 31"]
+    assert relative(plan.files["Light"], tmp_path / "target") == [
+        os.path.join("Light", "M 31", LIGHT)
+    ]
+    assert relative(plan.files["Flat"], tmp_path / "target") == [
+        os.path.join("Flat", FLAT)
+    ]
+    assert plan.files["Bias"] == plan.files["Dark"] == []
+
+
+def test_plan_never_writes_two_files_to_one_destination(tmp_path):
+    stick = tmp_path / "stick"
+    write(stick / "Autorun" / "Flat" / FLAT, b"flat")
+    write(stick / "Plan" / "Flat" / FLAT, b"flat")
+    write(stick / "Preview" / "Flat" / FLAT, b"other flat")
+
+    plan = plan_import(str(stick), str(tmp_path / "target"))
+
+    assert plan.duplicates == [str(stick / "Plan" / "Flat" / FLAT)]
+    stem = FLAT[: -len(".fit")]
+    assert relative(plan.files["Flat"], tmp_path / "target") == [
+        os.path.join("Flat", FLAT),
+        os.path.join("Flat", stem + "_1.fit"),
+    ]
+
+
+def test_plan_skips_or_renames_files_already_in_the_target(tmp_path):
+    stick, target = tmp_path / "stick", tmp_path / "target"
+    write(stick / "Autorun" / "Flat" / FLAT, b"flat")
+    write(target / "Flat" / FLAT, b"flat")
+
+    plan = plan_import(str(stick), str(target))
+    assert plan.duplicates == [str(stick / "Autorun" / "Flat" / FLAT)]
+    assert plan.files["Flat"] == []
+
+    # A different file of the same name is not overwritten
+    write(target / "Flat" / FLAT, b"an earlier flat")
+    plan = plan_import(str(stick), str(target))
+    assert relative(plan.files["Flat"], target) == [
+        os.path.join("Flat", FLAT[: -len(".fit")] + "_1.fit")
+    ]
+
+
+def test_import_records_checksums_that_verify(tmp_path):
+    stick, target = tmp_path / "stick", tmp_path / "target"
+    write(stick / "Autorun" / "Light" / "M 31" / LIGHT, b"light")
+    write(stick / "Autorun" / "Flat" / FLAT, b"flat")
+
+    assert import_files(plan_import(str(stick), str(target)), str(target), 2) == 0
+
+    assert sorted(read_checksums(str(target))) == [
+        os.path.join("Flat", FLAT),
+        os.path.join("Light", "M 31", LIGHT),
+    ]
+    assert verify_checksums(str(target)) == 0
+    (target / "Flat" / FLAT).write_bytes(b"damaged")
+    assert verify_checksums(str(target)) == 1
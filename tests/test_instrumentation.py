@@ -0,0 +1,46 @@
+import argparse
+import json
+import os
+
+from instrumentation import add_arguments, instrument, phase
+
+
+def parse(*args):
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    return parser.parse_args(list(args))
+
+
+def test_counts_opens_and_stats_in_timed_phases(tmp_path):
+    path = tmp_path / "frame.fits"
+    path.write_bytes(b"x" * 100)
+    metrics_path = tmp_path / "metrics.json"
+    stat = os.stat
+
+    with instrument(parse("--metrics-json", str(metrics_path))):
+        os.path.getsize(path)  # Outside a phase, so not counted
+        assert os.stat is stat
+        with phase("read", 1):
+            assert os.stat is not stat
+            with phase("read"):
+                os.path.getsize(path)
+            os.lstat(path)
+            with open(path, "rb") as f:
+                f.read()
+        assert os.stat is stat
+
+    with open(metrics_path) as f:
+        metrics = json.load(f)
+    assert (metrics["stats"], metrics["opens"]) == (2, 1)
+    assert metrics["phases"]["read"]["files"] == 1
+    if metrics["bytes_read"] is not None:
+        assert metrics["bytes_read"] >= 100
+        assert metrics["worker_disk_read"] >= 0
+
+
+def test_leaves_os_stat_alone_without_timings(tmp_path):
+    stat = os.stat
+    with instrument(parse()) as metrics, metrics.phase("read"):
+        assert os.stat is stat
+        os.stat(tmp_path)
+    assert metrics.counters == {"opens": 0, "stats": 0}
@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+
+from previews import (
+    decode_png,
+    make_preview,
+    png_text,
+    read_decimated,
+    write_contact_sheets,
+)
+
+
+def test_reads_a_single_bayer_color_with_an_even_stride(write_frame, tmp_path):
+    # An RGGB mosaic: red 1000, green 2000, blue 3000
+    data = np.full((30, 30), 2000, np.uint16)
+    data[::2, ::2] = 1000
+    data[1::2, 1::2] = 3000
+    mono = write_frame(tmp_path / "mono.fits", data)
+    color = write_frame(tmp_path / "color.fits", data, BAYERPAT="RGGB")
+
+    # A stride of 3 for a 10-pixel preview
+    assert np.unique(read_decimated(mono, 10) * 65535).size > 1
+    image = read_decimated(color, 10)
+    assert image.shape == (8, 8)
+    np.testing.assert_allclose(image * 65535, 1000)
+
+
+def test_renders_again_when_the_size_changes(write_frame, tmp_path):
+    data = np.arange(64 * 64, dtype=np.uint16).reshape(64, 64)
+    frame = write_frame(tmp_path / "frame.fits", data)
+    preview = str(tmp_path / "frame.png")
+
+    assert make_preview((frame, preview, 32)) is None
+    assert make_preview((frame, preview, 32)) == "cached"
+    assert make_preview((frame, preview, 16)) is None
+
+    with open(preview, "rb") as f:
+        png = f.read()
+    assert decode_png(png).shape == (16, 16)
+    assert "size=16" in png_text(png)["Preview settings"]
+    assert not os.path.exists(preview + ".tmp")
+
+
+def test_tiles_the_contact_sheet_again_when_columns_or_frames_change(
+    write_frame, tmp_path, capsys
+):
+    previews = []
+    for i in range(3):
+        frame = write_frame(tmp_path / f"frame{i}.fits", np.full((8, 8), i, np.uint16))
+        previews.append(str(tmp_path / f"frame{i}.png"))
+        make_preview((frame, previews[-1], 8))
+    sheet = tmp_path / "M 31.png"
+
+    def tile(paths, columns):
+        write_contact_sheets(str(tmp_path), {"M 31": paths}, columns)
+        return "Wrote contact sheet" in capsys.readouterr().out
+
+    assert tile(previews, 3)
+    assert not tile(previews, 3)
+    assert tile(previews, 2)
+    assert decode_png(sheet.read_bytes()).shape == (2 * 12 + 4, 2 * 12 + 4)
+    assert tile(previews[:2], 2)
+    assert not tile(previews[:2], 2)
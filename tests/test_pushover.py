@@ -0,0 +1,131 @@
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+from pushover import MESSAGE_LIMIT, PushoverClient, split_message
+
+
+class StubPushover(HTTPServer):
+    """A local Pushover endpoint answering with the given status codes."""
+
+    def __init__(self, statuses):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.statuses = list(statuses)
+        self.received = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/1/messages.json"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        data = parse_qs(self.rfile.read(length).decode())
+        self.server.received.append({key: data[key][0] for key in data})
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        body = json.dumps({"status": 1 if status == 200 else 0}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(*statuses):
+        server = StubPushover(statuses)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def unreachable_url():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}/1/messages.json"
+
+
+def client(url, tmp_path, **kwargs):
+    spool = str(tmp_path / "spool.jsonl")
+    return PushoverClient("token", "user", url, spool, backoff=0, timeout=2, **kwargs)
+
+
+def test_retries_a_server_error(stub, tmp_path):
+    server = stub(503)
+    with client(server.url, tmp_path) as pushover:
+        assert pushover.send("Session done", "Report")
+    assert [data["message"] for data in server.received] == ["Session done"] * 2
+    assert server.received[0]["token"] == "token"
+    assert not pushover.has_spooled()
+
+
+def test_does_not_retry_a_rejected_message(stub, tmp_path):
+    server = stub(400)
+    with client(server.url, tmp_path) as pushover:
+        assert not pushover.send("Session done", "Report")
+    assert len(server.received) == 1
+    assert not pushover.has_spooled()
+
+
+def test_spools_messages_until_the_server_is_reachable(stub, tmp_path):
+    with client(unreachable_url(), tmp_path, retries=1) as pushover:
+        assert not pushover.send("First", "Report")
+        assert not pushover.send("Second", "Report")
+        assert pushover.has_spooled()
+
+    server = stub()
+    with client(server.url, tmp_path) as pushover:
+        assert pushover.flush_spool() == 2
+        assert not pushover.has_spooled()
+    assert [data["message"] for data in server.received] == ["First", "Second"]
+
+
+def test_sends_spooled_messages_before_a_new_one(stub, tmp_path):
+    with client(unreachable_url(), tmp_path, retries=0) as pushover:
+        pushover.send("Spooled", "Report")
+
+    server = stub()
+    with client(server.url, tmp_path) as pushover:
+        assert pushover.send("New", "Report")
+    assert [data["message"] for data in server.received] == ["Spooled", "New"]
+
+
+def test_sends_long_messages_in_numbered_parts(stub, tmp_path):
+    server = stub()
+    line = "x" * 99 + "\n"
+    with client(server.url, tmp_path) as pushover:
+        assert pushover.send(line * 15, "Report")
+    assert [data["title"] for data in server.received] == [
+        "Report (1/2)",
+        "Report (2/2)",
+    ]
+
+
+def test_split_message_breaks_at_line_ends():
+    line = "x" * 99 + "\n"
+    parts = split_message(line * 15)
+    assert [len(part) for part in parts] == [10 * 100 - 1, 5 * 100 - 1]
+    assert "\n".join(parts) == (line * 15).rstrip("\n")
+
+
+def test_split_message_cuts_lines_longer_than_the_limit():
+    parts = split_message("a" * (MESSAGE_LIMIT + 10) + "\nb")
+    assert parts == ["a" * MESSAGE_LIMIT, "a" * 10 + "\nb"]
+    assert split_message("") == [""]
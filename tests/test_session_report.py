@@ -0,0 +1,126 @@
+import csv
+import os
+
+import session_report
+from session_report import (
+    MetadataTail,
+    analyze_frame_quality,
+    analyze_sessions,
+    scan_session_frames,
+)
+
+HEADER = "ExposureStart,FilterName,HFR\n"
+
+
+def test_tail_reads_only_complete_appended_lines(tmp_path):
+    path = tmp_path / "ImageMetaData.csv"
+    path.write_text(HEADER + "2025-01-01T21:00:00,Ha,2.1\n2025-01-01T21:05")
+    tail = MetadataTail(path)
+
+    rows, restarted = tail.poll()
+    assert rows == [
+        {"ExposureStart": "2025-01-01T21:00:00", "FilterName": "Ha", "HFR": "2.1"}
+    ]
+    assert not restarted
+    assert tail.poll() == ([], False)
+
+    # The partial line is returned once it is complete
+    with open(path, "a") as f:
+        f.write(":00,Ha,2.3\n2025-01-01T21:10:00,O")
+    rows, _ = tail.poll()
+    assert [row["HFR"] for row in rows] == ["2.3"]
+    with open(path, "a") as f:
+        f.write("III,2.5\n")
+    rows, _ = tail.poll()
+    assert [(row["FilterName"], row["HFR"]) for row in rows] == [("OIII", "2.5")]
+
+
+def test_tail_restarts_when_the_file_is_truncated(tmp_path):
+    path = tmp_path / "ImageMetaData.csv"
+    path.write_text(HEADER + "2025-01-01T21:00:00,Ha,2.1\n")
+    tail = MetadataTail(path)
+    tail.poll()
+
+    path.write_text(HEADER)
+    assert tail.poll() == ([], True)
+    with open(path, "a") as f:
+        f.write("2025-01-02T21:00:00,Ha,1.9\n")
+    rows, restarted = tail.poll()
+    assert [row["HFR"] for row in rows] == ["1.9"]
+    assert not restarted
+
+
+def test_tail_restarts_when_the_file_is_replaced_by_a_larger_one(tmp_path):
+    path = tmp_path / "ImageMetaData.csv"
+    path.write_text(HEADER + "2025-01-01T21:00:00,Ha,2.1\n")
+    tail = MetadataTail(path)
+    tail.poll()
+
+    # A new session's file, already longer than the one read so far
+    replacement = tmp_path / "new.csv"
+    replacement.write_text(
+        HEADER + "2025-01-02T21:00:00,Ha,1.9\n2025-01-02T21:05:00,Ha,2.0\n"
+    )
+    os.replace(replacement, path)
+
+    rows, restarted = tail.poll()
+    assert [row["HFR"] for row in rows] == ["1.9", "2.0"]
+    assert restarted
+
+
+def test_frame_scan_skips_the_previews_folder(tmp_path):
+    (tmp_path / "LIGHT_2025-01-01_21-00-00_M 31_Ha_-10.00_300.00s_0000.xisf").touch()
+    (tmp_path / "previews" / "M 31").mkdir(parents=True)
+
+    counts, dir_mtimes = scan_session_frames(tmp_path)
+    assert counts["Light"] == 1
+    assert list(dir_mtimes) == ["."]
+
+
+def write_metadata(session_dir, hfrs):
+    session_dir.mkdir(parents=True)
+    with open(session_dir / "ImageMetaData.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["FilePath", "FilterName", "Duration", "HFR"])
+        for i, hfr in enumerate(hfrs):
+            name = f"LIGHT_{session_dir.name}_21-{i:02d}-00_M 31_Ha_-10.00_300.00s"
+            writer.writerow([f"C:/Images/{name}_{i:04d}.xisf", "Ha", 300, hfr])
+
+
+def test_range_quality_is_answered_from_the_session_cache(tmp_path, monkeypatch):
+    sessions = [tmp_path / "2025-01-01", tmp_path / "2025-01-02"]
+    # The last frame of the first night is an outlier
+    write_metadata(sessions[0], [2.0, 2.1, 1.9, 2.0, 2.2, 1.8, 2.0, 2.1, 1.9, 6.0])
+    write_metadata(sessions[1], [3.0] * 5)
+    analyze_sessions(sessions)
+
+    def load_metadata(paths):
+        raise AssertionError(f"{paths} parsed again")
+
+    monkeypatch.setattr(session_report, "load_metadata", load_metadata)
+    (group,) = analyze_frame_quality(sessions, analyze_sessions(sessions))
+
+    assert (group.target, group.filter_name) == ("M 31", "Ha")
+    assert (group.frames, group.outliers) == (15, 1)
+    # The median of the nightly medians, weighted by their frames
+    assert group.medians["HFR"] == 2.0
+
+
+def test_outlier_threshold_and_reject_list_of_a_range(tmp_path):
+    sessions = [tmp_path / "2025-01-01", tmp_path / "2025-01-02"]
+    write_metadata(sessions[0], [2.0, 2.1, 1.9, 2.0, 2.2, 1.8, 2.0, 2.1, 1.9, 6.0])
+    write_metadata(sessions[1], [3.0, 3.1, 2.9, 3.0, 9.0])
+    reject_list = tmp_path / "rejected.csv"
+
+    analyses = analyze_sessions(sessions)
+    (group,) = analyze_frame_quality(sessions, analyses, reject_list=str(reject_list))
+    assert group.outliers == 2
+    with open(reject_list) as f:
+        rows = list(csv.DictReader(f))
+    assert [row["FilePath"][-9:] for row in rows] == ["0009.xisf", "0004.xisf"]
+    assert {row["Reasons"] for row in rows} == {"HFR"}
+
+    # The cached analyses were made with another threshold
+    analyses = analyze_sessions(sessions, threshold=100.0)
+    (group,) = analyze_frame_quality(sessions, analyses, 100.0)
+    assert group.outliers == 0